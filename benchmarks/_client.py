@@ -0,0 +1,90 @@
+import base64
+import json
+import os
+import time
+import websockets
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import x25519
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+class BenchClient:
+    def __init__(self, url: str):
+        self.url = url
+        self.websocket = None
+        self.aesgcm = None
+
+    async def connect(self):
+        self.websocket = await websockets.connect(self.url, max_size=None)
+        private_key = x25519.X25519PrivateKey.generate()
+        public_key = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw,
+        )
+        hello = {"action": "public_key", "key": base64.b64encode(public_key).decode()}
+        await self.websocket.send(json.dumps(hello))
+        reply = json.loads(await self.websocket.recv())
+        shared = private_key.exchange(
+            x25519.X25519PublicKey.from_public_bytes(
+                base64.b64decode(reply["server_public_key"])
+            )
+        )
+        key = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"quillion-aes-key"
+        ).derive(shared)
+        self.aesgcm = AESGCM(key)
+        return await self.recv()
+
+    async def send(self, message):
+        nonce = os.urandom(12)
+        data = self.aesgcm.encrypt(nonce, json.dumps(message).encode(), None)
+        await self.websocket.send(
+            json.dumps(
+                {
+                    "action": "encrypted_message",
+                    "data": base64.b64encode(data).decode(),
+                    "nonce": base64.b64encode(nonce).decode(),
+                }
+            )
+        )
+
+    async def recv(self):
+        frame = json.loads(await self.websocket.recv())
+        plaintext = self.aesgcm.decrypt(
+            base64.b64decode(frame["nonce"]),
+            base64.b64decode(frame["encrypted_payload"]),
+            None,
+        )
+        return json.loads(plaintext)
+
+    async def close(self):
+        await self.websocket.close()
+
+
+def find_callback(node, event="onclick"):
+    if isinstance(node, list):
+        for child in node:
+            found = find_callback(child, event)
+            if found:
+                return found
+        return None
+    if not isinstance(node, dict):
+        return None
+    if event in node.get("attributes", {}):
+        return node["attributes"][event]
+    return find_callback(node.get("children", []), event)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": sum(samples) / len(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[int(len(samples) * 0.99) - 1] * 1000,
+    }
+
+
+def now():
+    return time.perf_counter()
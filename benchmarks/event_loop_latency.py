@@ -0,0 +1,122 @@
+"""Callback -> render round-trip latency on the asyncio and uvloop loops.
+
+    python benchmarks/event_loop_latency.py [--requests 2000] [--clients 8]
+
+Each loop gets a fresh server process; the client side always runs on
+the default asyncio loop so only the server loop differs.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _client import BenchClient, find_callback, now, summarize
+
+SERVER = """
+import sys
+sys.path.insert(0, {root!r})
+from quillion import app, page
+from quillion.components import button, container, text
+
+count = 0
+
+
+def increment():
+    global count
+    count += 1
+
+
+@page("/")
+def home():
+    return container(
+        text(f"Count: {{count}}"),
+        button("Increment", on_click=increment),
+        *[text(f"row {{i}}") for i in range(50)],
+    )
+
+
+app.start(host="127.0.0.1", port={port}, assets_port={assets_port}, event_loop={loop!r})
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def run_client(url: str, requests: int):
+    client = BenchClient(url)
+    first = await client.connect()
+    callback_id = find_callback(first["content"])
+    samples = []
+    for _ in range(requests):
+        started = now()
+        await client.send({"action": "callback", "id": callback_id})
+        message = await client.recv()
+        while message.get("action") != "render_page":
+            message = await client.recv()
+        samples.append(now() - started)
+        callback_id = find_callback(message["content"])
+    await client.close()
+    return samples
+
+
+async def measure(url: str, requests: int, clients: int):
+    per_client = max(requests // clients, 1)
+    results = await asyncio.gather(
+        *[run_client(url, per_client) for _ in range(clients)]
+    )
+    return [sample for samples in results for sample in samples]
+
+
+def bench(loop: str, requests: int, clients: int):
+    port, assets_port = free_port(), free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    source = SERVER.format(root=root, port=port, assets_port=assets_port, loop=loop)
+    server = subprocess.Popen([sys.executable, "-c", source])
+    try:
+        wait_for_port(port)
+        samples = asyncio.run(measure(f"ws://127.0.0.1:{port}/", requests, clients))
+        return summarize(samples)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--loops", nargs="+", default=["asyncio", "uvloop"])
+    args = parser.parse_args()
+
+    results = {}
+    for loop in args.loops:
+        try:
+            results[loop] = bench(loop, args.requests, args.clients)
+        except Exception as e:
+            results[loop] = {"error": str(e)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
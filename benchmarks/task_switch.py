@@ -0,0 +1,109 @@
+"""Task-switch throughput with and without nest_asyncio patching.
+
+    python benchmarks/task_switch.py [--switches 200000] [--tasks 100]
+
+"nested" reproduces the old import-time nest_asyncio.apply(), "asyncio"
+is the plain loop app.start now runs by default, "uvloop" the optional
+loop. Each variant runs in a fresh interpreter.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+WORKLOAD = """
+import asyncio
+import json
+import time
+
+variant, switches, tasks = {variant!r}, {switches}, {tasks}
+if variant == "nested":
+    import nest_asyncio
+
+    nest_asyncio.apply()
+elif variant == "uvloop":
+    import uvloop
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+async def yielder(count):
+    for _ in range(count):
+        await asyncio.sleep(0)
+
+
+async def noop():
+    pass
+
+
+async def ping_pong(count):
+    ping, pong = asyncio.Queue(), asyncio.Queue()
+
+    async def responder():
+        for _ in range(count):
+            pong.put_nowait(await ping.get())
+
+    task = asyncio.create_task(responder())
+    for i in range(count):
+        ping.put_nowait(i)
+        await pong.get()
+    await task
+
+
+async def main():
+    results = {{}}
+
+    started = time.perf_counter()
+    await asyncio.gather(*[yielder(switches // tasks) for _ in range(tasks)])
+    results["sleep0_per_s"] = switches / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(switches // 10):
+        await asyncio.create_task(noop())
+    results["create_task_per_s"] = (switches // 10) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await ping_pong(switches // 10)
+    results["queue_round_trips_per_s"] = (switches // 10) / (
+        time.perf_counter() - started
+    )
+    return results
+
+
+print(json.dumps(asyncio.run(main())))
+"""
+
+
+def run(variant: str, switches: int, tasks: int):
+    source = WORKLOAD.format(variant=variant, switches=switches, tasks=tasks)
+    result = subprocess.run(
+        [sys.executable, "-c", source], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return {key: round(value) for key, value in json.loads(result.stdout).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--switches", type=int, default=200_000)
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument(
+        "--variants", nargs="+", default=["nested", "asyncio", "uvloop"]
+    )
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            {
+                variant: run(variant, args.switches, args.tasks)
+                for variant in args.variants
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
 from .base import State, StateMeta
+from .backends import StateBackend, InProcessStateBackend, SharedMemoryStateBackend
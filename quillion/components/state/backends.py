@@ -0,0 +1,201 @@
+import asyncio
+import fcntl
+import os
+import pickle
+import struct
+import tempfile
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ChangeCallback = Callable[[str], None]
+
+
+class StateBackend:
+    def __init__(self):
+        self._subscribers: List[ChangeCallback] = []
+
+    def load(self, key: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def store(self, key: str, values: Dict[str, Any]):
+        raise NotImplementedError
+
+    def subscribe(self, callback: ChangeCallback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: ChangeCallback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self, key: str):
+        for callback in list(self._subscribers):
+            callback(key)
+
+    def close(self):
+        self._subscribers.clear()
+
+
+class InProcessStateBackend(StateBackend):
+    def __init__(self):
+        super().__init__()
+        self._data: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, key: str) -> Dict[str, Any]:
+        return self._data.get(key, {})
+
+    def store(self, key: str, values: Dict[str, Any]):
+        self._data[key] = {**self._data.get(key, {}), **values}
+        self._notify(key)
+
+
+class _SegmentLock:
+    # a lock file next to the segment, so processes that attach by name
+    # serialize writes with the creator and not just with its forks
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if self._pid != os.getpid():
+                # an inherited descriptor shares its flock with the parent
+                if self._fd is not None:
+                    os.close(self._fd)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._pid = None
+
+
+class SharedMemoryStateBackend(StateBackend):
+    # segment header: global version, payload length
+    _HEADER = struct.Struct("QI")
+    poll_interval: float = 0.05
+
+    def __init__(self, size: int = 1024 * 1024, name: Optional[str] = None):
+        super().__init__()
+        self._memory = shared_memory.SharedMemory(
+            name=name, create=name is None, size=size
+        )
+        self._owner_pid = os.getpid() if name is None else None
+        self._lock = _SegmentLock(
+            os.path.join(
+                tempfile.gettempdir(), f"quillion-{self._memory.name.lstrip('/')}.lock"
+            )
+        )
+        self._seen_version = -1
+        self._entries: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self._watcher_pid: Optional[int] = None
+        if name is None:
+            self._write(0, {})
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def _read_version(self) -> int:
+        return self._HEADER.unpack_from(self._memory.buf, 0)[0]
+
+    def _read(self) -> Tuple[int, Dict[str, Tuple[int, Dict[str, Any]]]]:
+        version, length = self._HEADER.unpack_from(self._memory.buf, 0)
+        start = self._HEADER.size
+        return version, pickle.loads(bytes(self._memory.buf[start : start + length]))
+
+    def _write(self, version: int, entries: Dict[str, Tuple[int, Dict[str, Any]]]):
+        payload = pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL)
+        start = self._HEADER.size
+        if start + len(payload) > self._memory.size:
+            raise ValueError(
+                f"Shared state needs {start + len(payload)} bytes, "
+                f"segment holds {self._memory.size}"
+            )
+        self._memory.buf[start : start + len(payload)] = payload
+        self._HEADER.pack_into(self._memory.buf, 0, version, len(payload))
+
+    def _refresh(self) -> List[str]:
+        if self._read_version() == self._seen_version:
+            return []
+        with self._lock:
+            version, entries = self._read()
+        return self._apply(version, entries)
+
+    def _apply(
+        self, version: int, entries: Dict[str, Tuple[int, Dict[str, Any]]]
+    ) -> List[str]:
+        changed = [
+            key
+            for key, (key_version, _) in entries.items()
+            if self._entries.get(key, (-1,))[0] != key_version
+        ]
+        self._entries = entries
+        self._seen_version = version
+        return changed
+
+    def load(self, key: str) -> Dict[str, Any]:
+        # subscribers usually register before the serving loop is running
+        self._ensure_watching()
+        self._refresh()
+        return self._entries.get(key, (0, {}))[1]
+
+    def store(self, key: str, values: Dict[str, Any]):
+        with self._lock:
+            version, entries = self._read()
+            key_version, data = entries.get(key, (0, {}))
+            entries[key] = (key_version + 1, {**data, **values})
+            self._write(version + 1, entries)
+        for changed_key in self._apply(version + 1, entries):
+            self._notify(changed_key)
+
+    def subscribe(self, callback: ChangeCallback):
+        super().subscribe(callback)
+        self._ensure_watching()
+
+    def _ensure_watching(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._watcher_pid == os.getpid() and self._watcher is not None:
+            if not self._watcher.done():
+                return
+        # forked workers need their own watcher on their own loop
+        self._watcher_pid = os.getpid()
+        self._watcher = loop.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            for key in self._refresh():
+                self._notify(key)
+            await asyncio.sleep(self.poll_interval)
+
+    def close(self):
+        super().close()
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            self._watcher.cancel()
+        self._memory.close()
+        self._lock.close()
+        if self._owner_pid == os.getpid():
+            self._memory.unlink()
+            try:
+                os.unlink(self._lock.path)
+            except FileNotFoundError:
+                pass
@@ -1,12 +1,139 @@
 import asyncio
+import copy
 import inspect
-from typing import Optional, Any, Callable
+import sys
+import weakref
+from collections import ChainMap
+from collections.abc import MutableMapping
+from types import MappingProxyType
+from typing import Optional, Any, Callable, Dict, Iterator, Set
 from pydantic import BaseModel, ValidationError
+from .backends import StateBackend, InProcessStateBackend
+
+_IMMUTABLE_TYPES = (
+    type(None),
+    bool,
+    int,
+    float,
+    complex,
+    str,
+    bytes,
+    tuple,
+    frozenset,
+)
+
+
+class _FrozenList(list):
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("State defaults are read-only, change them with set()")
+
+    append = extend = insert = pop = remove = clear = _read_only
+    sort = reverse = __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(item, memo) for item in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class _FrozenDict(dict):
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("State defaults are read-only, change them with set()")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = _read_only
+    setdefault = update = __ior__ = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {
+            copy.deepcopy(key, memo): copy.deepcopy(value, memo)
+            for key, value in self.items()
+        }
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, list):
+        return _FrozenList(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return _FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, tuple):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def _is_read_only(value: Any) -> bool:
+    return isinstance(value, (_IMMUTABLE_TYPES, _FrozenList, _FrozenDict))
+
+
+def _deep_sizeof(value: Any, seen: Optional[Set[int]] = None) -> int:
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            _deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    return size
+
+
+class _BackendView(MutableMapping):
+    def __init__(self, backend: StateBackend, key: str):
+        self._backend = backend
+        self._key = key
+
+    def __getitem__(self, name: str) -> Any:
+        return self._backend.load(self._key)[name]
+
+    def __setitem__(self, name: str, value: Any):
+        self._backend.store(self._key, {name: value})
+
+    def __delitem__(self, name: str):
+        raise TypeError("Shared state values cannot be deleted")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._backend.load(self._key))
+
+    def __len__(self) -> int:
+        return len(self._backend.load(self._key))
 
 
 class StateMeta(type):
+    _backend: StateBackend = InProcessStateBackend()
+    _shared_classes: Dict[str, "StateMeta"] = {}
+
     def __init__(self, name, bases, attrs):
         super().__init__(name, bases, attrs)
+        self._shared = bool(
+            attrs.get(
+                "_shared",
+                any(
+                    base.__dict__.get("_shared", False)
+                    for base in bases
+                    if isinstance(base, StateMeta)
+                ),
+            )
+        )
+        self._shared_instance = None
+        if self._shared:
+            self._state_key = f"{self.__module__}.{self.__qualname__}"
+            self._sessions = weakref.WeakSet()
+            StateMeta._shared_classes[self._state_key] = self
         self._defaults = {}
 
         for key in list(attrs.keys()):
@@ -30,12 +157,57 @@ class StateMeta(type):
         for key in self._defaults:
             delattr(self, key)
 
+        # frozen once and shared by every session, replaced through set()
+        self._defaults = MappingProxyType(
+            {key: _freeze(value) for key, value in self._defaults.items()}
+        )
+
     def __getattr__(self, name):
         return getattr(self.get_instance(), name)
 
+    def use_backend(self, backend: StateBackend):
+        # the previous backend is left open, the caller may switch back to it
+        StateMeta._backend.unsubscribe(StateMeta._on_backend_change)
+        StateMeta._backend = backend
+        backend.subscribe(StateMeta._on_backend_change)
+
+    @staticmethod
+    def _on_backend_change(key: str):
+        from ...core.app import Quillion
+
+        state_cls = StateMeta._shared_classes.get(key)
+        app = Quillion._instance
+        if state_cls is None or app is None:
+            return
+        app.rerender_sessions(list(state_cls._sessions))
+
+    def _get_shared_instance(self):
+        from ...core.app import Quillion
+
+        backend = StateMeta._backend
+        # starts the change watcher once an event loop is running
+        backend.subscribe(StateMeta._on_backend_change)
+        if self._shared_instance is None or (
+            self._shared_instance._data.maps[0]._backend is not backend
+        ):
+            instance = State(self)
+            instance._data = ChainMap(
+                _BackendView(backend, self._state_key), self._defaults
+            )
+            self._shared_instance = instance
+
+        app = Quillion._instance
+        session = app.session if app is not None else None
+        if session is not None and session.websocket is not None:
+            session.subscribe(self)
+        return self._shared_instance
+
     def get_instance(self):
         from ...core.app import Quillion
 
+        if self._shared:
+            return self._get_shared_instance()
+
         app = Quillion._instance
         if app is None or app.websocket is None:
             raise RuntimeError("No active WebSocket connection for state access")
@@ -47,6 +219,7 @@ class StateMeta(type):
 
     def set(self, **kwargs):
         instance = self.get_instance()
+        updates = {}
         for name, value in kwargs.items():
             if name in instance._data:
                 if hasattr(self, "__annotations__") and name in self.__annotations__:
@@ -61,26 +234,65 @@ class StateMeta(type):
                         raise TypeError(
                             f"Invalid value for state variable '{name}': {e}"
                         )
+                updates[name] = value
+
+        if self._shared:
+            # one backend write, subscribers are rerendered on change notification
+            if any(instance._data[name] != value for name, value in updates.items()):
+                StateMeta._backend.store(self._state_key, updates)
+            return
 
-                old_value = instance._data[name]
-                instance._data[name] = value
-                if old_value != value and instance._rerender_callback:
-                    callback_result = instance._rerender_callback()
-                    if inspect.iscoroutine(callback_result):
+        for name, value in updates.items():
+            old_value = instance._data[name]
+            instance._data[name] = value
+            if old_value != value and instance._rerender_callback:
+                callback_result = instance._rerender_callback()
+                if inspect.iscoroutine(callback_result):
+                    try:
                         asyncio.create_task(callback_result)
+                    except RuntimeError:
+                        from ...core.app import Quillion
+
+                        # set() from an offloaded handler thread
+                        Quillion._instance.spawn(callback_result)
 
 
 class State(metaclass=StateMeta):
     _rerender_callback: Optional[Callable[[], Any]] = None
+    _shared: bool = False
 
     def __init__(self, cls):
         self._cls = cls
-        self._data = {k: v for k, v in cls._defaults.items()}
+        self._data = ChainMap({}, cls._defaults)
 
     def __getattr__(self, name):
-        if name in self._data:
-            return self._data[name]
+        data = self.__dict__.get("_data")
+        if data is not None and name in data:
+            overrides = data.maps[0]
+            if not isinstance(overrides, dict):
+                value = data[name]
+                if _is_read_only(value):
+                    return value
+                # shared values only change through set(), never in place
+                return copy.deepcopy(value)
+            if name in overrides:
+                return overrides[name]
+            value = data[name]
+            if not _is_read_only(value):
+                # objects that cannot be frozen get a copy per session
+                value = overrides[name] = copy.deepcopy(value)
+            return value
         return super().__getattribute__(name)
 
+    def memory_usage(self) -> int:
+        overrides = self._data.maps[0]
+        return _deep_sizeof(overrides) if isinstance(overrides, dict) else 0
+
     def _set_rerender_callback(self, callback: Callable[[], Any]):
+        # shared state rerenders every subscribed session, not one component
+        if getattr(self._cls, "_shared", False):
+            return
         self._rerender_callback = callback
+
+
+StateMeta._backend.subscribe(StateMeta._on_backend_change)
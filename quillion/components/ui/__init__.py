@@ -1,4 +1,17 @@
 from .element import Element, MediaElement, StyleProperty
+from .actions import (
+    ClientAction,
+    add_class,
+    close,
+    copy_text,
+    hide,
+    remove_attr,
+    remove_class,
+    set_attr,
+    show,
+    show_modal,
+    toggle_class,
+)
 
 from .base.anchor import anchor
 from .base.article import article
@@ -123,4 +136,15 @@ __all__ = [
     "Element",
     "MediaElement",
     "StyleProperty",
+    "ClientAction",
+    "add_class",
+    "close",
+    "copy_text",
+    "hide",
+    "remove_attr",
+    "remove_class",
+    "set_attr",
+    "show",
+    "show_modal",
+    "toggle_class",
 ]
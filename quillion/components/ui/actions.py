@@ -0,0 +1,77 @@
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+
+class ClientAction:
+    def __init__(self, op: str, target: Optional[str] = None, **args: Any):
+        self.op = op
+        self.target = target
+        self.args = args
+
+    def to_dict(self) -> Dict[str, Any]:
+        # a missing target means the element the event fired on
+        data: Dict[str, Any] = {"op": self.op}
+        if self.target is not None:
+            data["target"] = self.target
+        data.update(self.args)
+        return data
+
+    def __repr__(self) -> str:
+        return f"ClientAction({self.to_dict()!r})"
+
+
+def client_actions(value: Any) -> Optional[List[ClientAction]]:
+    if isinstance(value, ClientAction):
+        return [value]
+    if (
+        isinstance(value, (list, tuple))
+        and value
+        and all(isinstance(action, ClientAction) for action in value)
+    ):
+        return list(value)
+    return None
+
+
+def toggle_class(class_name: str, target: Optional[str] = None) -> ClientAction:
+    return ClientAction("toggle_class", target, class_name=class_name)
+
+
+def add_class(class_name: str, target: Optional[str] = None) -> ClientAction:
+    return ClientAction("add_class", target, class_name=class_name)
+
+
+def remove_class(class_name: str, target: Optional[str] = None) -> ClientAction:
+    return ClientAction("remove_class", target, class_name=class_name)
+
+
+def set_attr(name: str, value: Any, target: Optional[str] = None) -> ClientAction:
+    return ClientAction("set_attr", target, name=name, value=value)
+
+
+def remove_attr(name: str, target: Optional[str] = None) -> ClientAction:
+    return ClientAction("remove_attr", target, name=name)
+
+
+def show(target: Optional[str] = None) -> ClientAction:
+    return ClientAction("show", target)
+
+
+def hide(target: Optional[str] = None) -> ClientAction:
+    return ClientAction("hide", target)
+
+
+def show_modal(target: str) -> ClientAction:
+    return ClientAction("show_modal", target)
+
+
+def close(target: str) -> ClientAction:
+    return ClientAction("close", target)
+
+
+def copy_text(text: Optional[str] = None, target: Optional[str] = None) -> ClientAction:
+    # copies the target's text content unless the text is given
+    if text is None:
+        return ClientAction("copy_text", target)
+    return ClientAction("copy_text", target, text=text)
+
+
+ClientActions = Union[ClientAction, Sequence[ClientAction]]
@@ -3,8 +3,18 @@ from ..element import Element
 
 
 class Anchor(Element):
-    def __init__(self, *children, class_name: Optional[str] = None, **kwargs):
+    def __init__(
+        self,
+        *children,
+        class_name: Optional[str] = None,
+        prefetch: Optional[str] = None,
+        **kwargs
+    ):
         super().__init__("a", *children, class_name=class_name, **kwargs)
+        if prefetch:
+            if prefetch not in ("hover", "visible"):
+                raise ValueError("prefetch must be 'hover' or 'visible'")
+            self.set_attribute("data-prefetch", prefetch)
 
 
 def anchor(*children, **kwargs):
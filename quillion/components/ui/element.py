@@ -1,8 +1,26 @@
 import os
-from typing import Optional, Dict, List, Any, Callable
+import json
+from typing import Optional, Dict, List, Any, Callable, Union
 import uuid
 import re
 
+from .actions import ClientAction, ClientActions, client_actions
+
+# high-frequency events where only the latest pending one needs handling
+COALESCED_EVENTS = frozenset(
+    {
+        "input",
+        "scroll",
+        "wheel",
+        "mousemove",
+        "pointermove",
+        "touchmove",
+        "drag",
+        "dragover",
+        "resize",
+    }
+)
+
 
 class StyleProperty:
     def __init__(self, key: str, value):
@@ -36,14 +54,16 @@ class Element:
         self.css_classes = classes or []
         self.key = key
         self.style_properties: List["StyleProperty"] = []
+        self.client_actions: Dict[str, List[ClientAction]] = {}
 
         if class_name:
             self.css_classes.append(class_name)
 
         for prop_key, prop_value in kwargs.items():
-            if prop_key.startswith("on_") and callable(prop_value):
-                event_name = prop_key[3:]
-                self.event_handlers[event_name] = prop_value
+            if prop_key.startswith("on_") and (
+                callable(prop_value) or client_actions(prop_value)
+            ):
+                self.add_event_handler(prop_key[3:], prop_value)
             elif prop_key == "style":
                 if isinstance(prop_value, str):
                     styles = prop_value.split(";")
@@ -63,14 +83,21 @@ class Element:
         if class_name not in self.css_classes:
             self.css_classes.append(class_name)
 
-    def add_event_handler(self, event_name: str, handler: Callable):
-        self.event_handlers[event_name] = handler
+    def add_event_handler(
+        self, event_name: str, handler: Union[Callable, ClientActions]
+    ):
+        actions = client_actions(handler)
+        if actions:
+            self.client_actions[event_name] = actions
+        else:
+            self.event_handlers[event_name] = handler
 
     def set_attribute(self, name: str, value: Any):
         self.attributes[name] = value
 
     def to_dict(self, app) -> Dict[str, Any]:
         from ...components import CSS
+        from ...core.messaging import bind_rate_limit_slot, callback_spec
 
         if isinstance(self, CSS):
             return self.to_dict(app)
@@ -84,8 +111,30 @@ class Element:
 
         for event_name, handler in self.event_handlers.items():
             cb_id = str(uuid.uuid4())
+            # inspected here, once per handler definition, instead of per event
+            callback_spec(handler)
+            rate_limit = getattr(handler, "_rate_limit", None)
+            if isinstance(rate_limit, tuple):
+                # lets the client drop events before they are sent
+                kind, interval_ms = rate_limit
+                data["attributes"][f"data-q-{event_name}-{kind}"] = interval_ms
+                handler = bind_rate_limit_slot(handler, event_name, self.key)
             app.callbacks[cb_id] = handler
+            if event_name in COALESCED_EVENTS:
+                app.coalesced_callbacks.add(cb_id)
             data["attributes"][f"on{event_name}"] = cb_id
+            event_fields = getattr(handler, "_event_fields", None)
+            if isinstance(event_fields, tuple):
+                # the client sends only these parts of the event
+                data["attributes"][f"data-q-{event_name}-fields"] = json.dumps(
+                    list(event_fields)
+                )
+
+        for event_name, actions in self.client_actions.items():
+            # run by the client without a round trip to the server
+            data["attributes"][f"data-q-on{event_name}"] = json.dumps(
+                [action.to_dict() for action in actions]
+            )
 
         all_styles = {}
 
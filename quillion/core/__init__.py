@@ -3,3 +3,7 @@ from .router import Path
 from .crypto import Crypto
 from .messaging import Messaging
 from .server import ServerConnection
+from .metrics import Metrics
+from .executor import Executor
+from .session import Session
+from .resume import SessionResumption
@@ -1,44 +1,177 @@
+import functools
 import inspect
 import json
 import websockets
 import os
-from typing import Dict, Optional, List
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Optional, List, Set, Tuple, Union
 
 from quillion.utils.finder import RouteFinder
-from .crypto import Crypto
+from .crypto import Crypto, SerializedMessage
+from .diff import diff_tree
+from .executor import Executor
 from .messaging import Messaging
-from .server import AssetServer, ServerConnection
+from .metrics import Metrics
+from .outbox import Outbox
+from .resume import SessionResumption
+from .server import (
+    AssetServer,
+    ServerConnection,
+    WorkerSupervisor,
+    bind_unix_socket,
+    enable_nested_loops,
+    install_event_loop,
+    websocket_options_from_env,
+)
 from .router import Path
+from .session import Session, connection_id, peer_address
 import asyncio
 from ..pages.base import Page
 from ..components import State
 
+# "service restart": the client should reconnect, the server is coming back
+SERVICE_RESTART_CLOSE_CODE = 1012
+# "tls" trusts a TLS-terminating proxy and drops the application-layer encryption
+TRANSPORT_SECURITY_MODES = ("encrypted", "tls")
+
 
 class Quillion:
     _instance = None
+    page_cache_size: int = 8
+    prefetch_cache_size: int = 4
+    prefetch_ttl: float = 10.0
+    outbox_max_pending: int = 64
+    inbox_max_pending: int = 256
+    inbox_burst_size: int = 64
+    max_connections: int = 0
+    max_connections_per_ip: int = 0
+    handshake_timeout: float = 10.0
+    idle_timeout: float = 0
+    drain_timeout: float = 10.0
+    transport_security: str = "encrypted"
+    restart_jitter: float = 5.0
 
     def __init__(self):
         Quillion._instance = self
-        self.callbacks: Dict[str, callable] = {}
-        self.current_path: Optional[str] = None
+        self.sessions: Dict[websockets.WebSocketServerProtocol, Session] = {}
+        # used when app methods run outside of a connection context
+        self._default_session = Session(None)
         assets_host = os.environ.get("QUILLION_ASSET_HOST", "localhost")
         assets_port = os.environ.get("QUILLION_ASSET_PORT", "1338")
         self.assets_path = os.environ.get("QUILLION_ASSET_PATH", "")
         self.asset_server_url = f"http://{assets_host}:{assets_port}".rstrip("/")
         self.asset_server = AssetServer(assets_dir=self.assets_path)
-        self.websocket = None
-        self._state_instances: Dict[type, "State"] = {}
         self.style_tag_id = "quillion-dynamic-styles"
-        self._current_rendering_page: Optional[Page] = None
-        self.crypto = Crypto()
+        self.executor = Executor()
+        self.crypto = Crypto(executor=self.executor)
         self.messaging = Messaging(self)
         self.server_connection = ServerConnection()
         Path.init(self)
         self.external_css_files: List[str] = []
         self._css_cache: Dict[str, str] = {}
+        self.metrics = Metrics()
+        self.metrics.register("routes", RouteFinder.cache_info)
+        self.metrics.register("sessions", lambda: {"active": len(self.sessions)})
+        self.metrics.register("connections", self._connection_metrics)
+        self.metrics.register("outbox", self._outbox_metrics)
+        self.metrics.register("state", self._state_metrics)
+        self.metrics.register("executor", self.executor.metrics)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connections_per_ip: Counter = Counter()
+        self.resumption = SessionResumption(metrics=self.metrics)
+        self.metrics.register("resumption", self.resumption.metrics)
+
+    def _state_metrics(self) -> Dict[str, Any]:
+        sessions = list(self.sessions.values())
+        total = sum(session.state_memory() for session in sessions)
+        return {
+            "instances": sum(len(session.state_instances) for session in sessions),
+            "bytes": total,
+            "bytes_per_session": total / len(sessions) if sessions else 0,
+        }
+
+    def _outbox_metrics(self) -> Dict[str, Any]:
+        depths = [
+            len(session.outbox)
+            for session in self.sessions.values()
+            if session.outbox is not None
+        ]
+        return {"pending": sum(depths), "max_pending": max(depths, default=0)}
+
+    def _connection_metrics(self) -> Dict[str, Any]:
+        return {
+            "active": len(self.sessions),
+            "ips": len(self._connections_per_ip),
+            "max_per_ip": max(self._connections_per_ip.values(), default=0),
+            "limit": self.max_connections,
+            "limit_per_ip": self.max_connections_per_ip,
+        }
+
+    @property
+    def session(self) -> Session:
+        return Session.current() or self._default_session
+
+    def _session_for(
+        self, websocket: Optional[websockets.WebSocketServerProtocol]
+    ) -> Session:
+        return self.sessions.get(websocket) or self.session
+
+    @property
+    def websocket(self) -> Optional[websockets.WebSocketServerProtocol]:
+        return self.session.websocket
+
+    @websocket.setter
+    def websocket(self, websocket: Optional[websockets.WebSocketServerProtocol]):
+        self.session.websocket = websocket
+
+    @property
+    def callbacks(self) -> Dict[str, Callable]:
+        return self.session.callbacks
+
+    @callbacks.setter
+    def callbacks(self, callbacks: Dict[str, Callable]):
+        self.session.callbacks = callbacks
+
+    @property
+    def coalesced_callbacks(self) -> Set[str]:
+        return self.session.coalesced_callbacks
+
+    @property
+    def current_path(self) -> Optional[str]:
+        return self.session.current_path
+
+    @current_path.setter
+    def current_path(self, path: Optional[str]):
+        self.session.current_path = path
+
+    @property
+    def current_page(self) -> Optional[Page]:
+        return self.session.current_page
+
+    @current_page.setter
+    def current_page(self, page_instance: Optional[Page]):
+        self.session.current_page = page_instance
+
+    @property
+    def _state_instances(self) -> Dict[type, "State"]:
+        return self.session.state_instances
+
+    @_state_instances.setter
+    def _state_instances(self, state_instances: Dict[type, "State"]):
+        self.session.state_instances = state_instances
+
+    @property
+    def _current_rendering_page(self) -> Optional[Page]:
+        return self.session.rendering_page
 
     def _get_connection_id(self, websocket: websockets.WebSocketServerProtocol) -> str:
-        return f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+        return connection_id(websocket)
 
     def _load_css_file(self, css_file: str) -> str:
         from quillion_cli.debug.debugger import debugger
@@ -55,43 +188,224 @@ class Quillion:
     async def handler(self, websocket: websockets.WebSocketServerProtocol):
         from quillion_cli.debug.debugger import debugger
 
-        self.websocket = websocket
-        connection_id = self._get_connection_id(websocket)
+        self.loop = asyncio.get_running_loop()
+        address = peer_address(websocket)
+        # local unix socket peers only count against the global limit
+        client_ip = address[0] if address is not None else None
+        if not self._admit(client_ip):
+            self.metrics.inc("connections_rejected")
+            debugger.warning(
+                f"[{self._get_connection_id(websocket)}] Connection rejected: limit reached"
+            )
+            await websocket.close(1013, "try again later")
+            return
+        if client_ip is not None:
+            self._connections_per_ip[client_ip] += 1
+        self.metrics.inc("connections_accepted")
+        session = Session(websocket)
+        session_token = session.activate()
+        self.sessions[websocket] = session
+        connection_id = session.connection_id
 
         if self:
             debugger.info(f"[{connection_id}] Received new connection")
 
-        self._state_instances = {}
         initial_path = websocket.path
+        reaper = None
+        resumable = False
         try:
-            public_key_message = await websocket.recv()
-            data = json.loads(public_key_message)
-            if await self.crypto.handle_key_exchange(websocket, data):
+            restored = None
+            try:
+                data = await self._receive_handshake(websocket)
+                if data.get("action") == "resume" and self.resumption.enabled:
+                    restored = self.resumption.resume(data.get("token"))
+                    if restored is None:
+                        await websocket.send(json.dumps({"action": "resume_rejected"}))
+                        data = await self._receive_handshake(websocket)
+            except asyncio.TimeoutError:
+                self.metrics.inc("handshake_timeouts")
+                debugger.warning(f"[{connection_id}] Key exchange timed out")
+                await websocket.close(1008, "handshake timeout")
+                return
+            # clients opt in to receiving several actions in one frame
+            batch = bool(data.get("batch"))
+            if restored is not None:
+                # the fresh session is replaced by the detached one
+                session.close()
+                Session.deactivate(session_token)
+                session, key = restored
+                session.websocket = websocket
+                session_token = session.activate()
+                self.sessions[websocket] = session
+                session.batch = batch
+                if key is not None:
+                    self.crypto.restore_key(websocket, key)
+                self._open_outbox(session)
+                await self._send_resume_token(session)
+                await self.resume_page(websocket)
+                debugger.info(f"[{connection_id}] Resumed session")
+            elif await self._establish_transport(websocket, session, data):
+                session.batch = batch
+                self._open_outbox(session)
+                await self._send_resume_token(session)
                 await self.navigate(initial_path, websocket)
             else:
                 return
-            async for message in websocket:
-                try:
-                    data = json.loads(message)
-                    inner_data = await self.crypto.decrypt_message(websocket, data)
-                    if inner_data:
-                        await self.messaging.process_inner_message(
-                            websocket, inner_data
+            resumable = True
+            if self.idle_timeout:
+                reaper = asyncio.create_task(self._reap_idle(session))
+            # decryption runs ahead while the processor handles earlier messages
+            inbox: asyncio.Queue = asyncio.Queue(maxsize=self.inbox_max_pending)
+            processor = asyncio.create_task(self._process_inbox(websocket, inbox))
+            processor.add_done_callback(
+                functools.partial(self._on_processor_done, websocket)
+            )
+            try:
+                async for message in websocket:
+                    session.last_activity = time.monotonic()
+                    try:
+                        data = json.loads(message)
+                        if session.transport == "tls":
+                            inner_data = data if isinstance(data, dict) else None
+                        else:
+                            inner_data = await self.crypto.decrypt_message(
+                                websocket, data
+                            )
+                        if inner_data:
+                            await inbox.put(inner_data)
+                    except json.JSONDecodeError as e:
+                        debugger.error(
+                            f"[{connection_id}] json decode error: {e} - msg: {message}. not decrypted?"
                         )
-                except json.JSONDecodeError as e:
-                    debugger.error(
-                        f"[{connection_id}] json decode error: {e} - msg: {message}. not decrypted?"
-                    )
-                except Exception as e:
-                    debugger.error(f"[{connection_id}] Error: {e}")
-                    raise
+                    except Exception as e:
+                        debugger.error(f"[{connection_id}] Error: {e}")
+                        raise
+                    if processor.done():
+                        break
+                if processor.done():
+                    processor.result()
+            finally:
+                processor.cancel()
         except Exception as e:
+            # dropped connections can be resumed, failed ones cannot
+            resumable = resumable and isinstance(e, websockets.ConnectionClosed)
             debugger.error(f"[{connection_id}] Error: {e}")
             raise
         finally:
-            self._state_instances.clear()
+            if reaper is not None:
+                reaper.cancel()
+            self.sessions.pop(websocket, None)
+            self._release(client_ip)
+            if not (
+                resumable
+                and self.resumption.detach(session, self.crypto.session_key(websocket))
+            ):
+                session.close()
+            Session.deactivate(session_token)
             self.crypto.cleanup(websocket)
 
+    async def _establish_transport(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        session: Session,
+        data: Dict[str, Any],
+    ) -> bool:
+        if data.get("action") != "hello":
+            return await self.crypto.handle_key_exchange(websocket, data)
+        # plain frames only when the deployment says TLS is terminated upstream
+        if data.get("transport") != "tls" or self.transport_security != "tls":
+            self.metrics.inc("transport_rejected")
+            await websocket.close(1008, "encrypted transport required")
+            return False
+        session.transport = "tls"
+        session.binary = bool(data.get("binary"))
+        self.metrics.inc("tls_connections")
+        await websocket.send(
+            json.dumps(
+                {"action": "server_hello", "transport": "tls", "binary": session.binary}
+            )
+        )
+        return True
+
+    async def _receive_handshake(
+        self, websocket: websockets.WebSocketServerProtocol
+    ) -> Dict[str, Any]:
+        message = await asyncio.wait_for(
+            websocket.recv(), self.handshake_timeout or None
+        )
+        return json.loads(message)
+
+    def _open_outbox(self, session: Session):
+        websocket = session.websocket
+        session.outbox = Outbox(
+            websocket,
+            lambda message: self._encode(websocket, message),
+            max_pending=self.outbox_max_pending,
+            metrics=self.metrics,
+            batch=SerializedMessage.batch if session.batch else None,
+            on_sent=lambda messages: self._record_sent(session, messages),
+        )
+        session.outbox.start()
+
+    async def _send_resume_token(self, session: Session):
+        if self.resumption.enabled:
+            await self.send(
+                session.websocket,
+                {"action": "resume_token", "token": self.resumption.issue(session)},
+            )
+
+    def _admit(self, client_ip: Optional[str]) -> bool:
+        if self.max_connections and len(self.sessions) >= self.max_connections:
+            return False
+        if (
+            client_ip is not None
+            and self.max_connections_per_ip
+            and self._connections_per_ip[client_ip] >= self.max_connections_per_ip
+        ):
+            return False
+        return True
+
+    def _release(self, client_ip: Optional[str]):
+        if client_ip is None:
+            return
+        self._connections_per_ip[client_ip] -= 1
+        if self._connections_per_ip[client_ip] <= 0:
+            del self._connections_per_ip[client_ip]
+
+    async def _reap_idle(self, session: Session):
+        while True:
+            remaining = session.last_activity + self.idle_timeout - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+        from quillion_cli.debug.debugger import debugger
+
+        self.metrics.inc("idle_closed")
+        debugger.info(f"[{session.connection_id}] Closing idle connection")
+        # let queued renders reach the client before going away
+        if session.outbox is not None:
+            try:
+                await asyncio.wait_for(session.outbox.flush(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        await session.websocket.close(1001, "idle timeout")
+
+    def _on_processor_done(
+        self, websocket: websockets.WebSocketServerProtocol, task: asyncio.Task
+    ):
+        # a failed processor ends the reader loop, like an error used to
+        if not task.cancelled() and task.exception() is not None:
+            asyncio.ensure_future(websocket.close(1011))
+
+    async def _process_inbox(
+        self, websocket: websockets.WebSocketServerProtocol, inbox: asyncio.Queue
+    ):
+        while True:
+            burst = [await inbox.get()]
+            while not inbox.empty() and len(burst) < self.inbox_burst_size:
+                burst.append(inbox.get_nowait())
+            await self.messaging.process_burst(websocket, burst)
+
     async def navigate(
         self, path: str, websocket: websockets.WebSocketServerProtocol = None
     ):
@@ -102,37 +416,234 @@ class Quillion:
                 "action": "redirect",
                 "url": path,
             }
-            message_to_client = self.crypto.encrypt_response(
-                websocket, content_message_for_encryption
+            await self.send(websocket, content_message_for_encryption)
+            return
+
+        session = self._session_for(websocket)
+        prefetched = self._take_prefetched(session, path)
+        if prefetched and websocket:
+            session.current_page, payload = prefetched
+            session.current_path = path
+            await self.send(websocket, payload, kind="render")
+            debugger.info(
+                f"[{session.connection_id}] Redirected to: {path} (prefetched)"
             )
-            await websocket.send(json.dumps(message_to_client))
             return
 
         page_cls, params, _ = RouteFinder.find_route(path)
 
         if page_cls and websocket:
-            current_page = page_cls(params=params or {})
-            self.current_path = path
+            current_page = self._get_page(session, page_cls, params or {})
+            session.current_page = current_page
+            session.current_path = path
 
             await self.render_page(current_page, websocket)
-            connection_id = self._get_connection_id(websocket)
-            debugger.info(f"[{connection_id}] Redirected to: {path}")
+            debugger.info(f"[{session.connection_id}] Redirected to: {path}")
         else:
             connection_id = self._get_connection_id(websocket)
             debugger.info(f"[{connection_id}] Received unknown path: {path}")
 
+    async def prefetch(
+        self, path: str, websocket: websockets.WebSocketServerProtocol = None
+    ):
+        if not websocket or path.startswith(("http://", "https://")):
+            return
+
+        session = self._session_for(websocket)
+        key = RouteFinder._normalize_path(path)
+        if key == RouteFinder._normalize_path(session.current_path or ""):
+            return
+        entry = session.prefetch_cache.get(key)
+        if entry and entry[2] > time.monotonic():
+            return
+
+        page_cls, params, _ = RouteFinder.find_route(path)
+        if not page_cls:
+            return
+
+        page_instance = self._get_page(session, page_cls, params or {})
+        content_message_for_encryption = await self._build_page_message(
+            session, page_instance, path
+        )
+        # encrypted only if the client actually navigates there
+        session.prefetch_cache[key] = (
+            page_instance,
+            content_message_for_encryption,
+            time.monotonic() + self.prefetch_ttl,
+        )
+        session.prefetch_cache.move_to_end(key)
+        while len(session.prefetch_cache) > self.prefetch_cache_size:
+            session.prefetch_cache.popitem(last=False)
+        self.metrics.inc("prefetch_renders")
+
+    def _take_prefetched(
+        self, session: Session, path: str
+    ) -> Optional[Tuple[Page, Dict[str, Any]]]:
+        entry = session.prefetch_cache.pop(RouteFinder._normalize_path(path), None)
+        if entry is None:
+            return None
+        page_instance, payload, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.metrics.inc("prefetch_expired")
+            return None
+        self.metrics.inc("prefetch_hits")
+        return page_instance, payload
+
     def redirect(self, path: str):
         if self.websocket:
             asyncio.create_task(self.navigate(path, self.websocket))
 
+    def _get_page(
+        self, session: Session, page_cls: type, params: Dict[str, Any]
+    ) -> Page:
+        try:
+            key = (page_cls, tuple(sorted(params.items())))
+            hash(key)
+        except TypeError:
+            return page_cls(params=params)
+
+        page_instance = session.page_cache.pop(key, None)
+        if page_instance is None:
+            page_instance = page_cls(params=params)
+        session.page_cache[key] = page_instance
+        while len(session.page_cache) > max(self.page_cache_size, 1):
+            session.page_cache.popitem(last=False)
+        return page_instance
+
+    def spawn(self, coro) -> None:
+        try:
+            asyncio.get_running_loop().create_task(coro)
+        except RuntimeError:
+            # called from an offloaded handler thread
+            if self.loop is None or self.loop.is_closed():
+                coro.close()
+                return
+            asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def rerender_sessions(self, sessions: List[Session]):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if self.loop is not None and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.rerender_sessions, sessions)
+            return
+        groups: Dict[Any, List[Session]] = {}
+        for session in sessions:
+            if session.websocket is None:
+                continue
+            if self.sessions.get(session.websocket) is not session:
+                continue
+            if session.handling_event:
+                continue
+            self.metrics.inc("state_rerenders")
+            groups.setdefault(self._render_group(session), []).append(session)
+        for key, members in groups.items():
+            if key is None or len(members) == 1:
+                for session in members:
+                    loop.create_task(self._rerender_session(session))
+            else:
+                loop.create_task(self._broadcast_render(members))
+
+    def _render_group(self, session: Session) -> Any:
+        # sessions without inputs of their own render identically
+        page_instance = session.current_page
+        if (
+            page_instance is None
+            or session.state_instances
+            or page_instance._component_instance_cache
+        ):
+            return None
+        try:
+            key = (
+                type(page_instance),
+                session.current_path,
+                tuple(sorted(page_instance.params.items())),
+            )
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    async def _broadcast_render(self, sessions: List[Session]):
+        leader = sessions[0]
+        known_callbacks = set(leader.callbacks)
+        content_message = await self._build_page_message(
+            leader, leader.current_page, leader.current_path
+        )
+        message = SerializedMessage(content_message)
+        callbacks = {
+            cb_id: handler
+            for cb_id, handler in leader.callbacks.items()
+            if cb_id not in known_callbacks
+        }
+        coalesced = leader.coalesced_callbacks.intersection(callbacks)
+        self.metrics.inc("shared_renders")
+        self.metrics.inc("shared_render_sessions", len(sessions))
+        for session in sessions:
+            # a session may have navigated or dropped while rendering
+            if self.sessions.get(session.websocket) is not session:
+                continue
+            session.prefetch_cache.clear()
+            if session is not leader:
+                session.callbacks.update(callbacks)
+                session.coalesced_callbacks.update(coalesced)
+                session.unsubscribe_all()
+                for state_cls in leader.shared_states:
+                    session.subscribe(state_cls)
+            await self.send(session.websocket, message, kind="render")
+
+    async def _rerender_session(self, session: Session):
+        session_token = session.activate()
+        try:
+            await self.render_current_page(session.websocket)
+        finally:
+            Session.deactivate(session_token)
+
     async def render_current_page(self, websocket: websockets.WebSocketServerProtocol):
-        if not self.current_path or not websocket:
+        session = self._session_for(websocket)
+        if not session.current_path or not websocket:
             return
 
-        page_cls, params, _ = RouteFinder.find_route(self.current_path)
-        if page_cls:
-            current_page = page_cls(params=params or {})
-            await self.render_page(current_page, websocket)
+        # state may have changed, so prefetched renders are stale
+        session.prefetch_cache.clear()
+
+        if session.current_page is None:
+            page_cls, params, _ = RouteFinder.find_route(session.current_path)
+            if not page_cls:
+                return
+            session.current_page = self._get_page(session, page_cls, params or {})
+
+        await self.render_page(session.current_page, websocket)
+
+    async def resume_page(self, websocket: websockets.WebSocketServerProtocol):
+        session = self._session_for(websocket)
+        if session.current_page is None or session.last_tree is None:
+            await self.render_current_page(websocket)
+            return
+
+        session.prefetch_cache.clear()
+        message = await self._build_page_message(
+            session, session.current_page, session.current_path
+        )
+        patches = diff_tree(
+            session.last_tree,
+            message["content"],
+            session.callbacks,
+            session.coalesced_callbacks,
+        )
+        self.metrics.inc("resume_patches", len(patches))
+        await self.send(
+            websocket,
+            SerializedMessage(
+                {
+                    "action": "patch_page",
+                    "path": session.current_path,
+                    "patches": patches,
+                },
+                tree=message["content"],
+            ),
+            kind="render",
+        )
 
     async def render_page(
         self, page_instance: Page, websocket: websockets.WebSocketServerProtocol
@@ -140,7 +651,71 @@ class Quillion:
         if not page_instance or not websocket:
             return
 
-        self._current_rendering_page = page_instance
+        session = self._session_for(websocket)
+        content_message_for_encryption = await self._build_page_message(
+            session, page_instance, session.current_path
+        )
+        # serialized once, also to size it for off-loop encryption
+        await self.send(
+            websocket, SerializedMessage(content_message_for_encryption), kind="render"
+        )
+
+    def _record_sent(
+        self,
+        session: Session,
+        messages: List[Union[Dict[str, Any], SerializedMessage]],
+    ):
+        if not self.resumption.enabled:
+            return
+        for message in messages:
+            if isinstance(message, SerializedMessage):
+                tree, content = message.tree, message.content
+            else:
+                tree, content = None, message
+            if tree is None and content.get("action") == "render_page":
+                tree = content["content"]
+            if tree is not None:
+                # what the client has on screen, diffed against on resume
+                session.last_tree = tree
+
+    async def _encode(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        message: Union[Dict[str, Any], SerializedMessage],
+    ) -> Union[str, bytes]:
+        content = message.content if isinstance(message, SerializedMessage) else message
+        session = self.sessions.get(websocket)
+        if session is None or session.transport != "tls":
+            return await self.crypto.encrypt_frame(websocket, message)
+        if isinstance(message, SerializedMessage):
+            payload = message.payload
+            return payload if session.binary else payload.decode("utf-8")
+        if session.binary:
+            return json.dumps(content).encode("utf-8")
+        return json.dumps(content)
+
+    async def send(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        message: Union[Dict[str, Any], SerializedMessage],
+        kind: Optional[str] = None,
+    ):
+        session = self.sessions.get(websocket)
+        if session is None or session.outbox is None:
+            await websocket.send(await self._encode(websocket, message))
+            if session is not None:
+                self._record_sent(session, [message])
+            return
+        # full renders supersede each other; encryption happens in the writer
+        session.outbox.put(message, kind)
+
+    async def _build_page_message(
+        self, session: Session, page_instance: Page, path: Optional[str]
+    ) -> Dict[str, Any]:
+        # callbacks and state created while rendering belong to this session
+        session_token = session.activate()
+        session.rendering_page = page_instance
+        session.begin_render()
         page_instance._rendered_component_keys.clear()
 
         for component_instance in page_instance._component_instance_cache.values():
@@ -176,33 +751,279 @@ class Quillion:
             content = [style_element, tree]
 
             page_instance._cleanup_old_component_instances()
-            content_message_for_encryption = {
+            return {
                 "action": "render_page",
-                "path": self.current_path,
+                "path": path,
                 "content": content,
             }
-
-            message_to_client = self.crypto.encrypt_response(
-                websocket, content_message_for_encryption
-            )
-            await websocket.send(json.dumps(message_to_client))
         finally:
-            self._current_rendering_page = None
+            session.rendering_page = None
+            Session.deactivate(session_token)
 
     def css(self, files: List[str]):
         self.external_css_files.extend(files)
         return self
 
     def start(
-        self, host="0.0.0.0", port=1337, assets_port=1338, assets_host="localhost"
+        self,
+        host="0.0.0.0",
+        port=1337,
+        assets_port=1338,
+        assets_host="localhost",
+        workers=1,
+        event_loop="auto",
+        nested=False,
+        thread_workers=None,
+        process_workers=None,
+        crypto_workers=None,
+        crypto_offload_threshold=None,
+        max_connections=None,
+        max_connections_per_ip=None,
+        handshake_timeout=None,
+        idle_timeout=None,
+        resume_ttl=None,
+        websocket_options=None,
+        sock=None,
+        unix_socket=None,
+        transport_security=None,
     ):
         final_host = os.environ.get("QUILLION_HOST", host)
         final_port = int(os.environ.get("QUILLION_PORT", port))
         assets_port = int(os.environ.get("QUILLION_ASSET_PORT", assets_port))
         assets_host = os.environ.get("QUILLION_ASSET_HOST", assets_host)
+        workers = int(os.environ.get("QUILLION_WORKERS", workers))
+        self.executor.configure(
+            thread_workers=int(
+                os.environ.get("QUILLION_THREAD_WORKERS", thread_workers or 0)
+            ),
+            process_workers=int(
+                os.environ.get("QUILLION_PROCESS_WORKERS", process_workers or 0)
+            ),
+            crypto_workers=int(
+                os.environ.get("QUILLION_CRYPTO_WORKERS", crypto_workers or 0)
+            ),
+        )
+        crypto_offload_threshold = os.environ.get(
+            "QUILLION_CRYPTO_OFFLOAD_THRESHOLD", crypto_offload_threshold
+        )
+        if crypto_offload_threshold is not None:
+            self.crypto.offload_threshold = int(crypto_offload_threshold)
+        limits = {
+            "max_connections": (max_connections, int),
+            "max_connections_per_ip": (max_connections_per_ip, int),
+            "handshake_timeout": (handshake_timeout, float),
+            "idle_timeout": (idle_timeout, float),
+        }
+        for name, (value, cast) in limits.items():
+            value = os.environ.get(f"QUILLION_{name.upper()}", value)
+            if value is not None:
+                setattr(self, name, cast(value))
+        resume_ttl = os.environ.get("QUILLION_RESUME_TTL", resume_ttl)
+        if resume_ttl is not None:
+            self.resumption.ttl = float(resume_ttl)
+        transport_security = os.environ.get(
+            "QUILLION_TRANSPORT_SECURITY", transport_security
+        )
+        if transport_security is not None:
+            if transport_security not in TRANSPORT_SECURITY_MODES:
+                raise ValueError(
+                    f"Unknown transport security '{transport_security}', "
+                    f"expected one of {TRANSPORT_SECURITY_MODES}"
+                )
+            self.transport_security = transport_security
+        self.server_connection.configure(
+            **{**(websocket_options or {}), **websocket_options_from_env()}
+        )
+        unix_socket = os.environ.get("QUILLION_UNIX_SOCKET", unix_socket)
+        inherited = _inherited_socket("QUILLION_SOCKET_FD")
+        if inherited is not None:
+            # from a socket-activating process manager or a graceful restart
+            sock = inherited
+        elif unix_socket:
+            sock = bind_unix_socket(unix_socket)
+        asset_sock = _inherited_socket("QUILLION_ASSET_SOCKET_FD")
+        event_loop = os.environ.get("QUILLION_EVENT_LOOP", event_loop)
+        nested = os.environ.get("QUILLION_NESTED", str(nested)).lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+
+        if nested:
+            # nest_asyncio can only patch the pure-python loop
+            if event_loop == "uvloop":
+                raise ValueError("Nested event loops are not supported with uvloop")
+            event_loop = "asyncio"
+
+        # before any loop exists, so the servers and forked workers pick it up
+        self.event_loop = install_event_loop(event_loop)
+        if nested:
+            enable_nested_loops()
 
         self.asset_server_url = f"http://{assets_host}:{assets_port}".rstrip("/")
 
-        self.asset_server.start(host=assets_host, port=assets_port)
+        if workers > 1:
+            self._start_workers(
+                workers,
+                final_host,
+                final_port,
+                assets_host,
+                assets_port,
+                sock,
+                asset_sock,
+            )
+            return
+
+        asyncio.run(
+            self.serve(
+                final_host,
+                final_port,
+                assets_host,
+                assets_port,
+                sock=sock,
+                asset_sock=asset_sock,
+            )
+        )
+
+    async def serve(
+        self,
+        host="0.0.0.0",
+        port=1337,
+        assets_host="localhost",
+        assets_port=1338,
+        sock=None,
+        asset_sock=None,
+    ):
+        self.loop = asyncio.get_running_loop()
+        tasks = [
+            asyncio.ensure_future(
+                self.asset_server.serve(
+                    host=assets_host, port=assets_port, sock=asset_sock
+                )
+            ),
+            asyncio.ensure_future(
+                self._serve_connections(host, port, sock=sock, on_hangup=self.restart)
+            ),
+        ]
+        try:
+            # connections end after a graceful restart, the asset server never does
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.resumption.close()
+            self.executor.shutdown()
+
+    async def _serve_connections(
+        self,
+        host: str,
+        port: int,
+        sock: Optional[socket.socket] = None,
+        reuse_port: bool = False,
+        on_hangup: Optional[Callable[[], Any]] = None,
+    ):
+        self.loop = asyncio.get_running_loop()
+        if on_hangup is not None and hasattr(signal, "SIGHUP"):
+            try:
+                self.loop.add_signal_handler(
+                    signal.SIGHUP, lambda: self.spawn(on_hangup())
+                )
+            except (RuntimeError, NotImplementedError, ValueError):
+                # not the main thread, or a loop without signal support
+                pass
+        await self.server_connection.serve(
+            self.handler, host, port, reuse_port=reuse_port, sock=sock
+        )
+
+    async def restart(self):
+        from quillion_cli.debug.debugger import debugger
+
+        successor = self._spawn_successor(
+            self.server_connection.listening_socket(), self.asset_server.socket
+        )
+        debugger.info(f"Restarting, handed sockets to pid {successor.pid}")
+        await self.drain()
+
+    def _spawn_successor(
+        self,
+        sock: Optional[socket.socket],
+        asset_sock: Optional[socket.socket],
+    ) -> subprocess.Popen:
+        env = dict(os.environ)
+        pass_fds = []
+        for name, inherited in (
+            ("QUILLION_SOCKET_FD", sock),
+            ("QUILLION_ASSET_SOCKET_FD", asset_sock),
+        ):
+            if inherited is None:
+                continue
+            env[name] = str(inherited.fileno())
+            pass_fds.append(inherited.fileno())
+        command = getattr(sys, "orig_argv", None) or [sys.executable, *sys.argv]
+        self.metrics.inc("restarts")
+        return subprocess.Popen(command, env=env, pass_fds=pass_fds)
+
+    async def drain(self, close_code: int = SERVICE_RESTART_CLOSE_CODE):
+        # the successor accepts from the shared backlog from here on
+        self.server_connection.stop_accepting()
+        sessions = [s for s in self.sessions.values() if s.websocket is not None]
+        self.metrics.inc("drained_connections", len(sessions))
+        await asyncio.gather(
+            *(self._drain_session(session, close_code) for session in sessions)
+        )
+
+    async def _drain_session(self, session: Session, close_code: int):
+        if session.outbox is not None:
+            try:
+                await asyncio.wait_for(session.outbox.flush(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        # spread the reconnects instead of sending every client back at once
+        await asyncio.sleep(random.uniform(0, self.restart_jitter))
+        await session.websocket.close(close_code, "service restart")
+
+    def _start_workers(
+        self,
+        workers: int,
+        host: str,
+        port: int,
+        assets_host: str,
+        assets_port: int,
+        sock: Optional[socket.socket] = None,
+        asset_sock: Optional[socket.socket] = None,
+    ):
+        supervisor = WorkerSupervisor(
+            workers,
+            # a pre-bound socket is inherited and shared by every worker
+            serve=lambda: self._serve_connections(
+                host, port, sock=sock, reuse_port=sock is None, on_hangup=self.drain
+            ),
+            collect_metrics=self.metrics.snapshot,
+        )
+
+        def on_start():
+            # static assets are served once, by the supervising process
+            self.metrics.register("workers", supervisor.metrics)
+            assets = asset_sock or socket.create_server((assets_host, assets_port))
+            supervisor.parent_sockets.append(assets)
+            # the supervisor owns SIGINT/SIGTERM so it can stop the workers
+            self.asset_server.start(sock=assets, handle_signals=False)
+
+        def on_restart():
+            # workers bound with SO_REUSEPORT coexist with the successor's
+            self._spawn_successor(sock, self.asset_server.socket)
+
+        supervisor.run(
+            on_start=on_start,
+            on_restart=on_restart,
+            drain_timeout=self.drain_timeout + self.restart_jitter,
+        )
+
 
-        self.server_connection.start(self.handler, final_host, final_port)
+def _inherited_socket(name: str) -> Optional[socket.socket]:
+    fd = os.environ.get(name)
+    if fd is None:
+        return None
+    return socket.socket(fileno=int(fd))
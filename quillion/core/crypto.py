@@ -10,11 +10,55 @@ from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.exceptions import InvalidTag
-from typing import Callable, Dict, List, Optional, Any, Type, TypeVar, Tuple
+from typing import Callable, Dict, List, Optional, Any, Type, TypeVar, Tuple, Union
+
+from .executor import Executor
+
+
+class SerializedMessage:
+    __slots__ = ("content", "tree", "_payload")
+
+    def __init__(self, content: Dict[str, Any], tree: Optional[List[Any]] = None):
+        self.content = content
+        # the page the client shows once this is sent, when not in the content
+        self.tree = tree
+        self._payload: Optional[bytes] = None
+
+    @property
+    def payload(self) -> bytes:
+        # serialized once, however many sessions encrypt it
+        if self._payload is None:
+            self._payload = json.dumps(self.content).encode("utf-8")
+        return self._payload
+
+    @classmethod
+    def batch(
+        cls, messages: List[Union[Dict[str, Any], "SerializedMessage"]]
+    ) -> "SerializedMessage":
+        envelope = cls(
+            {
+                "action": "batch",
+                "actions": [
+                    m.content if isinstance(m, SerializedMessage) else m
+                    for m in messages
+                ],
+            }
+        )
+        # joined from the parts so shared renders are not serialized again
+        envelope._payload = (
+            b'{"action": "batch", "actions": ['
+            + b", ".join(_plaintext(m) for m in messages)
+            + b"]}"
+        )
+        return envelope
 
 
 class Crypto:
-    def __init__(self):
+    # frames at least this large are sealed and opened off the event loop
+    offload_threshold: int = 256 * 1024
+
+    def __init__(self, executor: Optional[Executor] = None):
+        self.executor = executor
         self.client_x25519_private_keys: Dict[
             websockets.WebSocketServerProtocol, x25519.X25519PrivateKey
         ] = {}
@@ -67,11 +111,15 @@ class Crypto:
         if action == "encrypted_message":
             encrypted_data_b64 = data.get("data")
             nonce_b64 = data.get("nonce")
-            encrypted_data = base64.b64decode(encrypted_data_b64)
-            nonce = base64.b64decode(nonce_b64)
             session_aes_key = self.client_aes_keys.get(websocket)
-            aesgcm = AESGCM(session_aes_key)
-            decrypted_payload_bytes = aesgcm.decrypt(nonce, encrypted_data, None)
+            if self._offloaded(encrypted_data_b64):
+                decrypted_payload_bytes = await self.executor.run(
+                    "crypto", _open, session_aes_key, nonce_b64, encrypted_data_b64
+                )
+            else:
+                decrypted_payload_bytes = _open(
+                    session_aes_key, nonce_b64, encrypted_data_b64
+                )
             decrypted_payload_str = decrypted_payload_bytes.decode("utf-8")
             inner_data = json.loads(decrypted_payload_str)
             return inner_data
@@ -79,23 +127,73 @@ class Crypto:
             return None
 
     def encrypt_response(
-        self, websocket: websockets.WebSocketServerProtocol, content: Dict[str, Any]
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        content: Union[Dict[str, Any], SerializedMessage],
     ) -> Dict[str, Any]:
         session_aes_key = self.client_aes_keys.get(websocket)
-        plaintext = json.dumps(content).encode("utf-8")
-        nonce = os.urandom(12)
-        aesgcm = AESGCM(session_aes_key)
-        ciphertext = aesgcm.encrypt(nonce, plaintext, None)
-        encrypted_payload_b64 = base64.b64encode(ciphertext).decode("utf-8")
-        nonce_b64 = base64.b64encode(nonce).decode("utf-8")
-        return {
-            "action": "encrypted_response",
-            "encrypted_payload": encrypted_payload_b64,
-            "nonce": nonce_b64,
-        }
+        return _seal(session_aes_key, _plaintext(content))
+
+    async def encrypt_frame(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        content: Union[Dict[str, Any], SerializedMessage],
+    ) -> str:
+        if isinstance(content, SerializedMessage) and self._offloaded(content.payload):
+            session_aes_key = self.client_aes_keys.get(websocket)
+            return await self.executor.run(
+                "crypto", _seal_frame, session_aes_key, content.payload
+            )
+        return json.dumps(self.encrypt_response(websocket, content))
+
+    def _offloaded(self, data: Any) -> bool:
+        # the AEAD releases the GIL, so big frames can use other cores
+        return (
+            self.executor is not None
+            and data is not None
+            and len(data) >= self.offload_threshold
+        )
+
+    def session_key(
+        self, websocket: websockets.WebSocketServerProtocol
+    ) -> Optional[bytes]:
+        return self.client_aes_keys.get(websocket)
+
+    def restore_key(self, websocket: websockets.WebSocketServerProtocol, key: bytes):
+        self.client_aes_keys[websocket] = key
 
     def cleanup(self, websocket: websockets.WebSocketServerProtocol):
         if websocket in self.client_x25519_private_keys:
             del self.client_x25519_private_keys[websocket]
         if websocket in self.client_aes_keys:
             del self.client_aes_keys[websocket]
+
+
+def _plaintext(content: Union[Dict[str, Any], SerializedMessage]) -> bytes:
+    if isinstance(content, SerializedMessage):
+        return content.payload
+    return json.dumps(content).encode("utf-8")
+
+
+def _seal(key: bytes, plaintext: bytes) -> Dict[str, Any]:
+    nonce = os.urandom(12)
+    aesgcm = AESGCM(key)
+    ciphertext = aesgcm.encrypt(nonce, plaintext, None)
+    encrypted_payload_b64 = base64.b64encode(ciphertext).decode("utf-8")
+    nonce_b64 = base64.b64encode(nonce).decode("utf-8")
+    return {
+        "action": "encrypted_response",
+        "encrypted_payload": encrypted_payload_b64,
+        "nonce": nonce_b64,
+    }
+
+
+def _seal_frame(key: bytes, plaintext: bytes) -> str:
+    return json.dumps(_seal(key, plaintext))
+
+
+def _open(key: bytes, nonce_b64: str, encrypted_data_b64: str) -> bytes:
+    encrypted_data = base64.b64decode(encrypted_data_b64)
+    nonce = base64.b64decode(nonce_b64)
+    aesgcm = AESGCM(key)
+    return aesgcm.decrypt(nonce, encrypted_data, None)
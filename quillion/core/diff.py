@@ -0,0 +1,74 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+def diff_tree(
+    old: List[Any],
+    new: List[Any],
+    callbacks: Optional[Dict[str, Callable]] = None,
+    coalesced: Optional[Set[str]] = None,
+) -> List[Dict[str, Any]]:
+    patches: List[Dict[str, Any]] = []
+    _diff_children([], old, new, patches, callbacks, coalesced)
+    return patches
+
+
+def _same_node(old: Any, new: Any) -> bool:
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return False
+    return old.get("tag") == new.get("tag") and old.get("key") == new.get("key")
+
+
+def _diff_children(path, old, new, patches, callbacks, coalesced):
+    for index, (old_child, new_child) in enumerate(zip(old, new)):
+        child_path = path + [index]
+        if _same_node(old_child, new_child):
+            _diff_node(child_path, old_child, new_child, patches, callbacks, coalesced)
+        elif old_child != new_child:
+            patches.append({"op": "replace", "path": child_path, "node": new_child})
+    if len(new) > len(old):
+        patches.append({"op": "append", "path": path, "nodes": new[len(old) :]})
+    elif len(old) > len(new):
+        patches.append({"op": "truncate", "path": path, "length": len(new)})
+
+
+def _diff_node(path, old, new, patches, callbacks, coalesced):
+    old_attributes = old.get("attributes", {})
+    new_attributes = new.get("attributes", {})
+    if callbacks is not None:
+        _reconcile_callbacks(old_attributes, new_attributes, callbacks, coalesced)
+
+    changed = {
+        name: value
+        for name, value in new_attributes.items()
+        if old_attributes.get(name, object()) != value
+    }
+    removed = [name for name in old_attributes if name not in new_attributes]
+    if changed or removed:
+        patches.append(
+            {"op": "attributes", "path": path, "set": changed, "remove": removed}
+        )
+    if old.get("text") != new.get("text"):
+        patches.append({"op": "text", "path": path, "text": new.get("text")})
+    _diff_children(
+        path,
+        old.get("children", []),
+        new.get("children", []),
+        patches,
+        callbacks,
+        coalesced,
+    )
+
+
+def _reconcile_callbacks(old_attributes, new_attributes, callbacks, coalesced):
+    # keep the ids the client already has instead of patching every handler
+    for name, new_id in list(new_attributes.items()):
+        old_id = old_attributes.get(name)
+        if not name.startswith("on") or old_id is None or old_id == new_id:
+            continue
+        if new_id not in callbacks:
+            continue
+        callbacks[old_id] = callbacks.pop(new_id)
+        if coalesced is not None and new_id in coalesced:
+            coalesced.discard(new_id)
+            coalesced.add(old_id)
+        new_attributes[name] = old_id
@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import Executor as PoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+OFFLOAD_KINDS = ("thread", "process")
+# internal pools that user code cannot offload to
+POOL_KINDS = OFFLOAD_KINDS + ("crypto",)
+
+
+def _timed_call(func: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class _PoolStats:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @property
+    def pending(self) -> int:
+        return self.submitted - self.completed - self.failed
+
+    def snapshot(self, size: int) -> Dict[str, Any]:
+        finished = self.completed or 1
+        return {
+            "size": size,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": self.pending,
+            "queue_depth": max(self.pending - size, 0),
+            "avg_run_ms": self.run_seconds / finished * 1000,
+            "max_run_ms": self.max_run_seconds * 1000,
+            "avg_wait_ms": self.wait_seconds / finished * 1000,
+        }
+
+
+class Executor:
+    def __init__(
+        self,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        crypto_workers: Optional[int] = None,
+    ):
+        self.thread_workers = thread_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.crypto_workers = crypto_workers or os.cpu_count() or 1
+        self._pools: Dict[str, PoolExecutor] = {}
+        self._pool_pids: Dict[str, int] = {}
+        self._stats = {kind: _PoolStats() for kind in POOL_KINDS}
+
+    def configure(
+        self,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        crypto_workers: Optional[int] = None,
+    ):
+        if thread_workers:
+            self.thread_workers = thread_workers
+            self._shutdown_pool("thread")
+        if process_workers:
+            self.process_workers = process_workers
+            self._shutdown_pool("process")
+        if crypto_workers:
+            self.crypto_workers = crypto_workers
+            self._shutdown_pool("crypto")
+
+    def _size(self, kind: str) -> int:
+        return getattr(self, f"{kind}_workers")
+
+    def _pool(self, kind: str) -> PoolExecutor:
+        pool = self._pools.get(kind)
+        # pools are never shared with forked workers
+        if pool is None or self._pool_pids.get(kind) != os.getpid():
+            if kind == "thread":
+                pool = ThreadPoolExecutor(
+                    max_workers=self.thread_workers,
+                    thread_name_prefix="quillion-offload",
+                )
+            elif kind == "crypto":
+                # kept apart so slow handlers cannot delay frames
+                pool = ThreadPoolExecutor(
+                    max_workers=self.crypto_workers,
+                    thread_name_prefix="quillion-crypto",
+                )
+            else:
+                pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            self._pools[kind] = pool
+            self._pool_pids[kind] = os.getpid()
+        return pool
+
+    async def run(self, kind: str, func: Callable, *args, **kwargs) -> Any:
+        if kind not in POOL_KINDS:
+            raise ValueError(
+                f"Unknown offload kind '{kind}', expected one of {OFFLOAD_KINDS}"
+            )
+        call = functools.partial(_timed_call, func, *args, **kwargs)
+        if kind == "thread":
+            # the session and other context variables follow the call
+            call = functools.partial(contextvars.copy_context().run, call)
+
+        stats = self._stats[kind]
+        stats.submitted += 1
+        submitted = time.perf_counter()
+        try:
+            result, run_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._pool(kind), call
+            )
+        except BaseException:
+            stats.failed += 1
+            raise
+        stats.completed += 1
+        stats.run_seconds += run_seconds
+        stats.max_run_seconds = max(stats.max_run_seconds, run_seconds)
+        stats.wait_seconds += max(time.perf_counter() - submitted - run_seconds, 0.0)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            kind: stats.snapshot(self._size(kind))
+            for kind, stats in self._stats.items()
+        }
+
+    def _shutdown_pool(self, kind: str, wait: bool = False):
+        pool = self._pools.pop(kind, None)
+        if pool is not None and self._pool_pids.pop(kind, None) == os.getpid():
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def shutdown(self, wait: bool = False):
+        for kind in list(self._pools):
+            self._shutdown_pool(kind, wait=wait)
@@ -1,60 +1,310 @@
+import asyncio
+import functools
 import websockets
 import inspect
 import json
-from typing import Dict, Any
+import time
+import types
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Union
+from .executor import OFFLOAD_KINDS
+from .session import Session, connection_id
+
+ActionHandler = Callable[
+    [websockets.WebSocketServerProtocol, Dict[str, Any]],
+    Union[bool, None, Awaitable[Optional[bool]]],
+]
+
+
+class CallbackSpec:
+    __slots__ = ("takes_event", "is_async")
+
+    def __init__(self, takes_event: bool, is_async: bool):
+        self.takes_event = takes_event
+        self.is_async = is_async
+
+
+# lambdas are recreated on every render but share their code object
+_callback_specs: Dict[Any, CallbackSpec] = {}
+
+
+def _unwrap_markers(callback: Callable) -> Callable:
+    target = callback
+    while isinstance(target, functools.partial) and not (
+        target.args or target.keywords
+    ):
+        # debounce(), throttle() and fields() wrap without binding anything
+        target = target.func
+    return target
+
+
+def callback_spec(callback: Callable) -> CallbackSpec:
+    target = _unwrap_markers(callback)
+    func = getattr(target, "__func__", target)
+    code = getattr(func, "__code__", None)
+    # decorated functions share the wrapper's code, the signature comes from
+    # the function it wraps
+    wrapped = inspect.unwrap(func)
+    cacheable = code is not None and not hasattr(wrapped, "__signature__")
+    key = (
+        code,
+        getattr(wrapped, "__code__", None),
+        isinstance(target, types.MethodType),
+    )
+    spec = _callback_specs.get(key) if cacheable else None
+    if spec is None:
+        spec = CallbackSpec(
+            takes_event=len(inspect.signature(callback).parameters) > 0,
+            is_async=inspect.iscoroutinefunction(callback),
+        )
+        if cacheable:
+            _callback_specs[key] = spec
+    return spec
+
+
+def bind_rate_limit_slot(
+    handler: Callable, event_name: str, key: Optional[str] = None
+) -> Callable:
+    # callback ids change on every render, the slot names the same handler
+    # on the same element across renders
+    target = _unwrap_markers(handler)
+    code = getattr(getattr(target, "__func__", target), "__code__", target)
+    if key is None:
+        session = Session.current()
+        position = (event_name, code)
+        key = session.rate_limit_positions[position] if session is not None else 0
+        if session is not None:
+            session.rate_limit_positions[position] += 1
+    bound = functools.partial(handler)
+    bound.__dict__.update(getattr(handler, "__dict__", {}))
+    bound._rate_limit_slot = (event_name, code, key)
+    return bound
+
+
+class RateLimiter:
+    __slots__ = ("interval", "last_run", "args", "task")
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_run = float("-inf")
+        self.args: tuple = ()
+        self.task: Optional[asyncio.Task] = None
+
+    def idle(self, now: float) -> bool:
+        return self.task is None and now - self.last_run >= self.interval
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
 
 
 class Messaging:
     def __init__(self, app):
         self.app = app
+        self.handlers: Dict[str, ActionHandler] = {}
+        self.register("callback", self._handle_callback)
+        self.register("event_callback", self._handle_event_callback)
+        self.register("navigate", self._handle_navigate)
+        self.register("prefetch", self._handle_prefetch)
+        self.register("client_error", self._handle_client_error)
 
-    async def process_inner_message(
-        self, websocket: websockets.WebSocketServerProtocol, inner_data: Dict[str, Any]
+    def register(self, action: str, handler: Optional[ActionHandler] = None):
+        def decorator(handler: ActionHandler) -> ActionHandler:
+            self.handlers[action] = handler
+            return handler
+
+        if handler is not None:
+            return decorator(handler)
+        return decorator
+
+    async def process_burst(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        messages: List[Dict[str, Any]],
     ):
-        from quillion_cli.debug.debugger import debugger
+        self.app.metrics.inc("inbound_bursts")
+        render_pending = False
+        for inner_data in self._coalesce(websocket, messages):
+            handled = await self.process_inner_message(
+                websocket, inner_data, render=False
+            )
+            if inner_data.get("action") == "navigate":
+                # the navigation already rendered the latest state
+                render_pending = False
+            else:
+                render_pending = render_pending or handled
+        if render_pending:
+            await self.app.render_current_page(websocket)
+
+    def _coalesce(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        messages: List[Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        coalesced_callbacks = self.app._session_for(websocket).coalesced_callbacks
+        result: List[Dict[str, Any]] = []
+        for inner_data in messages:
+            previous = result[-1] if result else None
+            if (
+                previous is not None
+                and inner_data.get("action") == "event_callback"
+                and previous.get("action") == "event_callback"
+                and inner_data.get("id") == previous.get("id")
+                and inner_data.get("id") in coalesced_callbacks
+            ):
+                # only the latest of a run of high-frequency events matters
+                result[-1] = inner_data
+                self.app.metrics.inc("inbound_coalesced")
+            else:
+                result.append(inner_data)
+        return result
 
+    async def process_inner_message(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        inner_data: Dict[str, Any],
+        render: bool = True,
+    ) -> bool:
         inner_action = inner_data.get("action")
+        handler = self.handlers.get(inner_action)
+        if handler is None:
+            from quillion_cli.debug.debugger import debugger
 
-        if inner_action == "callback":
-            cb_id = inner_data.get("id")
-            if cb_id in self.app.callbacks:
-                cb = self.app.callbacks[cb_id]
-                result = cb()
-                if inspect.isawaitable(result):
-                    await result
-                await self.app.render_current_page(websocket)
+            debugger.info(
+                f"[{connection_id(websocket)}] Unknown action: {inner_action}"
+            )
+            return False
+        handled = handler(websocket, inner_data)
+        if inspect.isawaitable(handled):
+            handled = await handled
+        # truthy handlers changed state the client has not seen yet
+        if handled and render:
+            await self.app.render_current_page(websocket)
+        return bool(handled)
 
-        elif inner_action == "event_callback":
-            cb_id = inner_data.get("id")
-            event_data_str = inner_data.get("event_data", "{}")
+    async def _handle_callback(
+        self, websocket: websockets.WebSocketServerProtocol, inner_data: Dict[str, Any]
+    ) -> bool:
+        cb_id = inner_data.get("id")
+        cb = self.app.callbacks.get(cb_id)
+        if cb is None:
+            return False
+        return await self._dispatch(websocket, cb_id, cb)
+
+    async def _handle_event_callback(
+        self, websocket: websockets.WebSocketServerProtocol, inner_data: Dict[str, Any]
+    ) -> bool:
+        cb_id = inner_data.get("id")
+        cb = self.app.callbacks.get(cb_id)
+        if cb is None:
+            return False
+        if not callback_spec(cb).takes_event:
+            # nothing would read the event, so it is not parsed
+            return await self._dispatch(websocket, cb_id, cb)
 
-            if cb_id in self.app.callbacks:
-                cb = self.app.callbacks[cb_id]
+        event_data = inner_data.get("event_data", "{}")
+        if not isinstance(event_data, dict):
+            try:
+                event_data = json.loads(event_data) if event_data else {}
+            except json.JSONDecodeError:
+                event_data = {}
+        return await self._dispatch(websocket, cb_id, cb, event_data)
 
-                try:
-                    event_data = json.loads(event_data_str) if event_data_str else {}
-                except json.JSONDecodeError:
-                    event_data = {}
+    async def _dispatch(
+        self, websocket: websockets.WebSocketServerProtocol, cb_id: str, cb, *args
+    ) -> bool:
+        rate_limit = getattr(cb, "_rate_limit", None)
+        if not isinstance(rate_limit, tuple):
+            await self._run_callback(websocket, cb, *args)
+            return True
 
-                sig = inspect.signature(cb)
-                if len(sig.parameters) > 0:
-                    result = cb(event_data)
-                else:
-                    result = cb()
+        kind, interval_ms = rate_limit
+        interval = interval_ms / 1000
+        session = self.app._session_for(websocket)
+        slot = getattr(cb, "_rate_limit_slot", cb_id)
+        limiter = session.rate_limiters.get(slot)
+        if limiter is None:
+            limiter = session.rate_limiters[slot] = RateLimiter(interval)
+        # the trailing call always gets the latest event
+        limiter.args = args
+        now = time.monotonic()
+        if (
+            kind == "throttle"
+            and limiter.task is None
+            and now - limiter.last_run >= interval
+        ):
+            limiter.last_run = now
+            await self._run_callback(websocket, cb, *args)
+            return True
 
+        self.app.metrics.inc("events_deferred")
+        if kind == "debounce":
+            limiter.cancel()
+            delay = interval
+        elif limiter.task is not None:
+            return False
+        else:
+            delay = limiter.last_run + interval - now
+        limiter.task = asyncio.get_running_loop().create_task(
+            self._run_trailing(websocket, cb, limiter, delay)
+        )
+        return False
+
+    async def _run_trailing(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        cb,
+        limiter: RateLimiter,
+        delay: float,
+    ):
+        await asyncio.sleep(delay)
+        limiter.task = None
+        limiter.last_run = time.monotonic()
+        try:
+            await self._run_callback(websocket, cb, *limiter.args)
+            await self.app.render_current_page(websocket)
+        except Exception as e:
+            from quillion_cli.debug.debugger import debugger
+
+            debugger.error(f"[{connection_id(websocket)}] Error: {e}")
+
+    async def _handle_navigate(
+        self, websocket: websockets.WebSocketServerProtocol, inner_data: Dict[str, Any]
+    ) -> bool:
+        await self.app.navigate(inner_data.get("path", "/"), websocket)
+        return False
+
+    async def _handle_prefetch(
+        self, websocket: websockets.WebSocketServerProtocol, inner_data: Dict[str, Any]
+    ) -> bool:
+        await self.app.prefetch(inner_data.get("path", "/"), websocket)
+        return False
+
+    def _handle_client_error(
+        self, websocket: websockets.WebSocketServerProtocol, inner_data: Dict[str, Any]
+    ) -> bool:
+        from quillion_cli.debug.debugger import debugger
+
+        traceback = inner_data.get("error", "")
+        debugger.error(f"\n[{connection_id(websocket)}] Error occurred")
+        print(traceback)
+        return False
+
+    async def _run_callback(
+        self, websocket: websockets.WebSocketServerProtocol, cb, *args
+    ):
+        session = self.app._session_for(websocket)
+        # shared state written by the callback is covered by the render after it
+        session.handling_event = True
+        try:
+            offload = getattr(cb, "_offload", None)
+            if offload in OFFLOAD_KINDS:
+                await self.app.executor.run(offload, cb, *args)
+            elif callback_spec(cb).is_async:
+                await cb(*args)
+            else:
+                result = cb(*args)
                 if inspect.isawaitable(result):
                     await result
-                await self.app.render_current_page(websocket)
-
-        elif inner_action == "navigate":
-            await self.app.navigate(inner_data.get("path", "/"), websocket)
-        elif inner_action == "client_error":
-            traceback = inner_data.get("error", "")
-            debugger.error(
-                f"\n[{websocket.remote_address[0]}:{websocket.remote_address[1]}] Error occurred"
-            )
-            print(traceback)
-        else:
-            debugger.info(
-                f"[{websocket.remote_address[0]}:{websocket.remote_address[1]}] Unknown action: {inner_action}"
-            )
+        finally:
+            session.handling_event = False
@@ -0,0 +1,23 @@
+from typing import Any, Callable, Dict
+
+
+class Metrics:
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def inc(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def register(self, name: str, collector: Callable[[], Dict[str, Any]]):
+        self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {**self.counters, **self.gauges}
+        for name, collector in self._collectors.items():
+            data[name] = collector()
+        return data
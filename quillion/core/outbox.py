@@ -0,0 +1,120 @@
+import asyncio
+import inspect
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Tuple, Union
+import websockets
+
+from .metrics import Metrics
+
+# policy violation: the client is not reading fast enough
+OVERFLOW_CLOSE_CODE = 1008
+# internal error: a frame could not be encoded or sent
+WRITER_ERROR_CLOSE_CODE = 1011
+
+
+class Outbox:
+    def __init__(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        encode: Callable[[Any], Union[str, bytes, Awaitable[Union[str, bytes]]]],
+        max_pending: int = 64,
+        metrics: Optional[Metrics] = None,
+        batch: Optional[Callable[[List[Any]], Any]] = None,
+        on_sent: Optional[Callable[[List[Any]], None]] = None,
+    ):
+        self.websocket = websocket
+        self.max_pending = max_pending
+        self._encode = encode
+        self._batch = batch
+        self._on_sent = on_sent
+        self._metrics = metrics or Metrics()
+        self._queue: Deque[Tuple[Optional[str], Any]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        self._writer = asyncio.get_running_loop().create_task(self._run())
+
+    def put(self, message: Any, kind: Optional[str] = None) -> bool:
+        if self.closed:
+            return False
+        if kind is not None:
+            # a newer message of the same kind makes the unsent one stale
+            for index, (queued_kind, _) in enumerate(self._queue):
+                if queued_kind == kind:
+                    del self._queue[index]
+                    self._metrics.inc("outbox_superseded")
+                    break
+        if len(self._queue) >= self.max_pending:
+            self._overflow()
+            return False
+        self._queue.append((kind, message))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def _overflow(self):
+        self._metrics.inc("outbox_overflows")
+        self.close()
+        asyncio.get_running_loop().create_task(
+            self.websocket.close(OVERFLOW_CLOSE_CODE, "send queue full")
+        )
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            if self._batch is not None and len(self._queue) > 1:
+                # everything queued since the last send goes out as one frame
+                messages = [queued for _, queued in self._queue]
+                self._queue.clear()
+                self._metrics.inc("outbox_batched", len(messages))
+                message = self._batch(messages)
+            else:
+                _, message = self._queue.popleft()
+                messages = [message]
+            try:
+                frame = self._encode(message)
+                if inspect.isawaitable(frame):
+                    # large frames are encrypted off the loop
+                    frame = await frame
+                await self.websocket.send(frame)
+            except websockets.ConnectionClosed:
+                self.close()
+                return
+            except Exception as e:
+                self._fail(e)
+                return
+            self._metrics.inc("outbox_sent")
+            if self._on_sent is not None:
+                self._on_sent(messages)
+
+    def _fail(self, error: Exception):
+        from quillion_cli.debug.debugger import debugger
+
+        # the writer is gone, so nothing queued after this could be sent
+        self._metrics.inc("outbox_errors")
+        debugger.error(f"Failed to send frame: {error!r}")
+        self.close()
+        asyncio.get_running_loop().create_task(
+            self.websocket.close(WRITER_ERROR_CLOSE_CODE, "internal error")
+        )
+
+    async def flush(self):
+        await self._idle.wait()
+
+    def close(self):
+        self.closed = True
+        self._queue.clear()
+        self._idle.set()
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
@@ -0,0 +1,99 @@
+import base64
+import binascii
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from .metrics import Metrics
+from .session import Session
+
+TOKEN_CONTEXT = b"quillion-resume"
+
+
+class SessionResumption:
+    def __init__(
+        self,
+        ttl: float = 0,
+        max_sessions: int = 1024,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._metrics = metrics or Metrics()
+        self._cipher = AESGCM(AESGCM.generate_key(bit_length=256))
+        self._detached: "OrderedDict[str, Tuple[Session, Optional[bytes], float]]" = (
+            OrderedDict()
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._detached)
+
+    def issue(self, session: Session) -> str:
+        # rotated on every issue so a token can be redeemed only once
+        session.resume_id = base64.urlsafe_b64encode(os.urandom(18)).decode()
+        nonce = os.urandom(12)
+        sealed = self._cipher.encrypt(nonce, session.resume_id.encode(), TOKEN_CONTEXT)
+        return base64.urlsafe_b64encode(nonce + sealed).decode()
+
+    def detach(self, session: Session, key: Optional[bytes]) -> bool:
+        # key is None for sessions on the plain TLS transport
+        if not self.enabled or session.resume_id is None:
+            return False
+        self.prune()
+        session.detach()
+        self._detached[session.resume_id] = (session, key, time.monotonic() + self.ttl)
+        while len(self._detached) > self.max_sessions:
+            _, (evicted, _, _) = self._detached.popitem(last=False)
+            evicted.close()
+            self._metrics.inc("resume_evicted")
+        return True
+
+    def resume(self, token: Any) -> Optional[Tuple[Session, Optional[bytes]]]:
+        resume_id = self._open(token)
+        entry = self._detached.pop(resume_id, None) if resume_id else None
+        if entry is None:
+            self._metrics.inc("resume_rejected")
+            return None
+        session, key, expires_at = entry
+        if expires_at <= time.monotonic():
+            session.close()
+            self._metrics.inc("resume_expired")
+            return None
+        self._metrics.inc("sessions_resumed")
+        return session, key
+
+    def _open(self, token: Any) -> Optional[str]:
+        if not isinstance(token, str):
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token.encode())
+            return self._cipher.decrypt(raw[:12], raw[12:], TOKEN_CONTEXT).decode()
+        except (binascii.Error, ValueError, InvalidTag):
+            return None
+
+    def prune(self):
+        now = time.monotonic()
+        for resume_id, (session, _, expires_at) in list(self._detached.items()):
+            if expires_at <= now:
+                del self._detached[resume_id]
+                session.close()
+                self._metrics.inc("resume_expired")
+
+    def close(self):
+        for session, _, _ in self._detached.values():
+            session.close()
+        self._detached.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "detached": len(self._detached),
+            "ttl": self.ttl,
+            "max_sessions": self.max_sessions,
+        }
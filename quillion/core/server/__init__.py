@@ -1,2 +1,4 @@
-from .base import ServerConnection
+from .base import ServerConnection, bind_unix_socket, websocket_options_from_env
 from .assets import AssetServer
+from .workers import WorkerSupervisor
+from .loop import install_event_loop, enable_nested_loops
@@ -1,6 +1,8 @@
 import asyncio
 import mimetypes
 import os
+import socket
+from typing import Optional
 from aiohttp import web
 
 
@@ -9,6 +11,7 @@ class AssetServer:
         self.assets_dir = assets_dir
         self.app = web.Application()
         self.app.router.add_get("/{path:.*}", self.handle_request)
+        self.socket: Optional[socket.socket] = None
 
     async def handle_request(self, request: web.Request) -> web.Response:
         path = request.match_info["path"]
@@ -26,6 +29,31 @@ class AssetServer:
 
         return web.FileResponse(file_path, headers={"Content-Type": mime_type})
 
-    def start(self, host: str = "0.0.0.0", port: int = 1338):
-        loop = asyncio.get_event_loop()
-        loop.create_task(web._run_app(self.app, host=host, port=port, print=None))
+    def start(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 1338,
+        sock: Optional[socket.socket] = None,
+        handle_signals: bool = True,
+    ) -> asyncio.Task:
+        return asyncio.get_running_loop().create_task(
+            self.serve(host, port, sock=sock, handle_signals=handle_signals)
+        )
+
+    async def serve(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 1338,
+        sock: Optional[socket.socket] = None,
+        handle_signals: bool = True,
+    ):
+        if sock is None:
+            # bound here so a graceful restart can hand the socket over
+            sock = socket.create_server((host, port))
+        self.socket = sock
+        try:
+            await web._run_app(
+                self.app, print=None, handle_signals=handle_signals, sock=sock
+            )
+        finally:
+            self.socket = None
@@ -1,10 +1,94 @@
-import asyncio
+import os
+import socket
+import stat
 import websockets
-from typing import Callable
+from typing import Any, Callable, Dict, Mapping, Optional
+
+# websockets.serve keyword arguments that can be tuned, with their env parsers
+WEBSOCKET_OPTIONS = {
+    "max_size": int,
+    "max_queue": int,
+    "read_limit": int,
+    "write_limit": int,
+    "ping_interval": float,
+    "ping_timeout": float,
+    "close_timeout": float,
+    "compression": str,
+}
+
+
+def websocket_options_from_env(
+    environ: Optional[Mapping[str, str]] = None,
+) -> Dict[str, Any]:
+    environ = os.environ if environ is None else environ
+    options = {}
+    for name, cast in WEBSOCKET_OPTIONS.items():
+        value = environ.get(f"QUILLION_WS_{name.upper()}")
+        if value is None:
+            continue
+        # "none" disables limits, keepalive pings or compression
+        options[name] = None if value.lower() in ("", "none") else cast(value)
+    return options
+
+
+def bind_unix_socket(path: str) -> socket.socket:
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            # left behind by a previous run
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(socket.SOMAXCONN)
+    return sock
 
 
 class ServerConnection:
-    def start(self, handler: Callable, host: str = "0.0.0.0", port: int = 1337):
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(websockets.serve(handler, host, port))
-        loop.run_forever()
+    def __init__(self):
+        self.options: Dict[str, Any] = {}
+        self.server: Optional[websockets.WebSocketServer] = None
+
+    def configure(self, **options: Any):
+        unknown = set(options) - set(WEBSOCKET_OPTIONS)
+        if unknown:
+            raise ValueError(
+                f"Unknown websocket options {sorted(unknown)}, "
+                f"expected any of {list(WEBSOCKET_OPTIONS)}"
+            )
+        self.options.update(options)
+
+    async def serve(
+        self,
+        handler: Callable,
+        host: str = "0.0.0.0",
+        port: int = 1337,
+        reuse_port: bool = False,
+        sock: Optional[socket.socket] = None,
+    ):
+        options = dict(self.options)
+        if sock is not None and sock.family == socket.AF_UNIX:
+            server = websockets.unix_serve(handler, sock=sock, **options)
+        elif sock is not None:
+            server = websockets.serve(handler, sock=sock, **options)
+        else:
+            if reuse_port:
+                options["reuse_port"] = True
+            server = websockets.serve(handler, host, port, **options)
+        async with server as ws_server:
+            self.server = ws_server
+            try:
+                # returns once stop_accepting() was called and every handler ended
+                await ws_server.wait_closed()
+            finally:
+                self.server = None
+
+    def listening_socket(self) -> Optional[socket.socket]:
+        if self.server is None or not self.server.sockets:
+            return None
+        return self.server.sockets[0]
+
+    def stop_accepting(self):
+        # open connections are left to the caller to drain and close
+        if self.server is not None:
+            self.server.close(close_connections=False)
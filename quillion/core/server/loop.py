@@ -0,0 +1,31 @@
+import asyncio
+
+EVENT_LOOPS = ("auto", "asyncio", "uvloop")
+
+
+def install_event_loop(event_loop: str = "auto") -> str:
+    if event_loop not in EVENT_LOOPS:
+        raise ValueError(
+            f"Unknown event loop '{event_loop}', expected one of {EVENT_LOOPS}"
+        )
+    if event_loop == "asyncio":
+        asyncio.set_event_loop_policy(None)
+        return "asyncio"
+
+    try:
+        import uvloop
+    except ImportError:
+        if event_loop == "uvloop":
+            raise RuntimeError(
+                "uvloop is not installed, install it with 'pip install quillion[uvloop]'"
+            )
+        return "asyncio"
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
+
+
+def enable_nested_loops():
+    import nest_asyncio
+
+    nest_asyncio.apply()
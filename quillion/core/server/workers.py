@@ -0,0 +1,242 @@
+import asyncio
+import os
+import signal
+import socket
+import time
+import traceback
+from multiprocessing import Pipe
+from multiprocessing.connection import Connection
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# settings every worker reports the same value for
+CONFIG_METRICS = ("size", "ttl")
+
+
+def _combine(key: str, values: List[Any]) -> Any:
+    if key in CONFIG_METRICS or key.startswith("limit"):
+        return values[0]
+    if key.startswith("max_"):
+        return max(values)
+    # ratios and averages do not add up across workers
+    if key.startswith("avg_") or key.endswith("rate") or "_per_" in key:
+        return sum(values) / len(values)
+    return sum(values)
+
+
+def aggregate_metrics(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    nested: Dict[str, List[Dict[str, Any]]] = {}
+    numbers: Dict[str, List[Any]] = {}
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            if isinstance(value, dict):
+                nested.setdefault(key, []).append(value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                numbers.setdefault(key, []).append(value)
+    for key, values in numbers.items():
+        result[key] = _combine(key, values)
+    for key, values in nested.items():
+        result[key] = aggregate_metrics(values)
+    return result
+
+
+class Worker:
+    def __init__(self, index: int, pid: int, conn: Connection):
+        self.index = index
+        self.pid = pid
+        self.conn = conn
+        self.started_at = time.monotonic()
+
+
+class WorkerSupervisor:
+    metrics_interval: float = 5.0
+    poll_interval: float = 0.2
+    restart_delay: float = 0.5
+    max_restart_delay: float = 30.0
+
+    def __init__(
+        self,
+        workers: int,
+        serve: Callable[[], Awaitable[None]],
+        collect_metrics: Callable[[], Dict[str, Any]],
+    ):
+        self.workers = workers
+        self._serve = serve
+        self._collect_metrics = collect_metrics
+        self._children: Dict[int, Worker] = {}
+        self._snapshots: Dict[int, Dict[str, Any]] = {}
+        self._crash_streak: Dict[int, int] = {}
+        self._restarts = 0
+        self._stopping = False
+        self._stop_signal = signal.SIGTERM
+        self._drain_timeout = 10.0
+        # listening sockets owned by the supervisor, closed in every worker
+        self.parent_sockets: List[socket.socket] = []
+
+    def spawn(self, index: int) -> int:
+        reader, writer = Pipe(duplex=False)
+        pid = os.fork()
+        if pid == 0:
+            reader.close()
+            code = 0
+            try:
+                self._run_worker(index, writer)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            os._exit(code)
+        writer.close()
+        self._children[pid] = Worker(index, pid, reader)
+        return pid
+
+    def _run_worker(self, index: int, conn: Connection):
+        for sock in self.parent_sockets:
+            sock.close()
+        # drop the signal wiring inherited from the supervisor's event loop
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.environ["QUILLION_WORKER_INDEX"] = str(index)
+        asyncio.run(self._worker_main(index, conn, os.getppid()))
+
+    async def _worker_main(self, index: int, conn: Connection, parent_pid: int):
+        reporter = asyncio.create_task(self._report_metrics(index, conn, parent_pid))
+        try:
+            await self._serve()
+        finally:
+            reporter.cancel()
+
+    async def _report_metrics(self, index: int, conn: Connection, parent_pid: int):
+        while True:
+            if os.getppid() != parent_pid:
+                # the supervisor is gone, do not linger as an orphan
+                os._exit(0)
+            try:
+                conn.send({"worker": index, "pid": os.getpid(), **self._collect()})
+            except (BrokenPipeError, OSError):
+                os._exit(0)
+            await asyncio.sleep(self.metrics_interval)
+
+    def _collect(self) -> Dict[str, Any]:
+        try:
+            return self._collect_metrics()
+        except Exception as e:
+            return {"metrics_error": str(e)}
+
+    def metrics(self) -> Dict[str, Any]:
+        snapshots = list(self._snapshots.values())
+        return {
+            "count": len(self._children),
+            "restarts": self._restarts,
+            **aggregate_metrics(
+                [
+                    {k: v for k, v in s.items() if k not in ("worker", "pid")}
+                    for s in snapshots
+                ]
+            ),
+        }
+
+    def _drain_metrics(self):
+        for worker in self._children.values():
+            try:
+                while worker.conn.poll():
+                    self._snapshots[worker.index] = worker.conn.recv()
+            except (EOFError, OSError):
+                pass
+
+    def _reap(self, loop: asyncio.AbstractEventLoop):
+        from quillion_cli.debug.debugger import debugger
+
+        for pid in list(self._children):
+            try:
+                reaped, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                reaped, status = pid, 0
+            if reaped == 0:
+                continue
+            worker = self._children.pop(pid)
+            worker.conn.close()
+            self._snapshots.pop(worker.index, None)
+            if self._stopping:
+                continue
+
+            if time.monotonic() - worker.started_at < 1.0:
+                streak = self._crash_streak.get(worker.index, 0) + 1
+            else:
+                streak = 0
+            self._crash_streak[worker.index] = streak
+            delay = min(self.restart_delay * (2**streak), self.max_restart_delay)
+            self._restarts += 1
+            debugger.warning(
+                f"Worker {worker.index} (pid {pid}) exited with status "
+                f"{os.waitstatus_to_exitcode(status)}, restarting in {delay:.1f}s"
+            )
+            loop.call_later(delay, self._respawn, worker.index)
+
+    def _respawn(self, index: int):
+        if not self._stopping:
+            self.spawn(index)
+
+    def stop(self):
+        self._stopping = True
+
+    def restart(self, on_restart: Callable[[], None]):
+        if self._stopping:
+            return
+        # the successor is already listening, workers drain instead of dying
+        on_restart()
+        self._stop_signal = signal.SIGHUP
+        self._stopping = True
+
+    async def supervise(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            self._reap(loop)
+            self._drain_metrics()
+            await asyncio.sleep(self.poll_interval)
+        if self._stop_signal == signal.SIGTERM:
+            await self._shutdown()
+        else:
+            await self._shutdown(self._drain_timeout + 5.0)
+
+    async def _shutdown(self, timeout: float = 10.0):
+        for pid in list(self._children):
+            try:
+                os.kill(pid, self._stop_signal)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap(asyncio.get_running_loop())
+            await asyncio.sleep(self.poll_interval)
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(
+        self,
+        on_start: Optional[Callable[[], None]] = None,
+        on_restart: Optional[Callable[[], None]] = None,
+        drain_timeout: float = 10.0,
+    ):
+        self._drain_timeout = drain_timeout
+        asyncio.run(self._supervisor_main(on_start, on_restart))
+
+    async def _supervisor_main(
+        self,
+        on_start: Optional[Callable[[], None]],
+        on_restart: Optional[Callable[[], None]] = None,
+    ):
+        loop = asyncio.get_running_loop()
+        # installed before forking so an early SIGTERM cannot orphan workers
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        if on_restart is not None and hasattr(signal, "SIGHUP"):
+            loop.add_signal_handler(signal.SIGHUP, self.restart, on_restart)
+        for index in range(self.workers):
+            self.spawn(index)
+        if on_start:
+            on_start()
+        await self.supervise()
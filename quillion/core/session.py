@@ -0,0 +1,121 @@
+import contextvars
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import websockets
+
+_current_session: "contextvars.ContextVar[Optional[Session]]" = contextvars.ContextVar(
+    "quillion_session", default=None
+)
+
+
+def peer_address(
+    websocket: websockets.WebSocketServerProtocol,
+) -> Optional[Tuple[str, int]]:
+    address = websocket.remote_address
+    # unix socket peers have no address
+    if not isinstance(address, tuple) or len(address) < 2:
+        return None
+    return address[0], address[1]
+
+
+def connection_id(websocket: websockets.WebSocketServerProtocol) -> str:
+    address = peer_address(websocket)
+    if address is None:
+        return f"unix:{id(websocket):x}"
+    return f"{address[0]}:{address[1]}"
+
+
+class Session:
+    def __init__(self, websocket: Optional[websockets.WebSocketServerProtocol]):
+        self.websocket = websocket
+        self.current_path: Optional[str] = None
+        self.current_page = None
+        self.rendering_page = None
+        self.handling_event = False
+        self.page_cache: "OrderedDict[Tuple[type, Tuple], Any]" = OrderedDict()
+        self.prefetch_cache: "OrderedDict[str, Tuple[Any, Dict[str, Any], float]]" = (
+            OrderedDict()
+        )
+        self.state_instances: Dict[type, Any] = {}
+        self.callbacks: Dict[str, Callable] = {}
+        self.coalesced_callbacks: Set[str] = set()
+        self.rate_limiters: Dict[Any, Any] = {}
+        self.rate_limit_positions: Counter = Counter()
+        self.shared_states: Set[type] = set()
+        self.outbox = None
+        self.transport = "encrypted"
+        self.binary = False
+        self.batch = False
+        self.last_activity = time.monotonic()
+        self.resume_id: Optional[str] = None
+        self.last_tree: Optional[List[Any]] = None
+
+    @property
+    def connection_id(self) -> str:
+        if self.websocket is None:
+            return "-"
+        return connection_id(self.websocket)
+
+    @staticmethod
+    def current() -> Optional["Session"]:
+        return _current_session.get()
+
+    def activate(self) -> contextvars.Token:
+        return _current_session.set(self)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token):
+        _current_session.reset(token)
+
+    def state_memory(self) -> int:
+        return sum(
+            instance.memory_usage() for instance in self.state_instances.values()
+        )
+
+    def detach(self):
+        # keeps pages, state and callbacks so a reconnect can pick them up
+        if self.outbox is not None:
+            self.outbox.close()
+        self.outbox = None
+        self.websocket = None
+        self.handling_event = False
+        self._cancel_rate_limiters()
+
+    def subscribe(self, state_cls: type):
+        state_cls._sessions.add(self)
+        self.shared_states.add(state_cls)
+
+    def unsubscribe_all(self):
+        for state_cls in self.shared_states:
+            state_cls._sessions.discard(self)
+        self.shared_states.clear()
+
+    def begin_render(self):
+        self.rate_limit_positions.clear()
+        # only shared state read by this render should rerender the session
+        self.unsubscribe_all()
+        # limiters of handlers that are gone or quiet start over when needed
+        now = time.monotonic()
+        for slot, limiter in list(self.rate_limiters.items()):
+            if limiter.idle(now):
+                del self.rate_limiters[slot]
+
+    def _cancel_rate_limiters(self):
+        # trailing debounced or throttled calls need a connection to render to
+        for limiter in self.rate_limiters.values():
+            limiter.cancel()
+        self.rate_limiters.clear()
+
+    def close(self):
+        if self.outbox is not None:
+            self.outbox.close()
+        self.current_page = None
+        self.rendering_page = None
+        self.page_cache.clear()
+        self.prefetch_cache.clear()
+        self.state_instances.clear()
+        self.callbacks.clear()
+        self.coalesced_callbacks.clear()
+        self.unsubscribe_all()
+        self._cancel_rate_limiters()
@@ -1,17 +1,55 @@
 import asyncio
 import uuid
 import re
-from typing import Dict, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 from ..components.base import Component
 from ..components.ui.element import Element
 from ..components.ui.base.container import Container
 from ..utils import RegexParser, RouteType
+from ..utils.converters import build_route_converters
+
+
+class RouteRegistry(dict):
+    def _changed(self):
+        PageMeta._version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self._changed()
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
 
 
 class PageMeta(type):
-    _registry: Dict[str, Tuple["Page", int]] = {}
-    _dynamic_routes: Dict[str, Tuple[re.Pattern, "Page", int]] = {}
-    _regex_routes: Dict[re.Pattern, Tuple["Page", int]] = {}
+    _registry: Dict[str, Tuple["Page", int]] = RouteRegistry()
+    _dynamic_routes: Dict[str, Tuple[re.Pattern, "Page", int]] = RouteRegistry()
+    _regex_routes: Dict[re.Pattern, Tuple["Page", int]] = RouteRegistry()
+    _version: int = 0
 
     def __init__(cls, name, bases, attrs):
         if hasattr(cls, "router") and cls.router:
@@ -21,6 +59,9 @@ class PageMeta(type):
             regex_pattern, route_type = RegexParser.compile_route(cls.router)
             cls._regex = regex_pattern
             cls._route_type = route_type
+            cls._param_converters = build_route_converters(
+                RegexParser.get_param_types(cls.router)
+            )
 
             if route_type in [RouteType.REGEX_PATTERN, RouteType.REGEX_STRING]:
                 PageMeta._regex_routes[regex_pattern] = (cls, priority)
@@ -31,16 +72,32 @@ class PageMeta(type):
 
         super().__init__(name, bases, attrs)
 
+    def unregister(cls):
+        for table in (PageMeta._registry, PageMeta._regex_routes):
+            for route, (page_cls, _) in list(table.items()):
+                if page_cls is cls:
+                    del table[route]
+        for route, (_, page_cls, _) in list(PageMeta._dynamic_routes.items()):
+            if page_cls is cls:
+                del PageMeta._dynamic_routes[route]
+
 
 class Page(metaclass=PageMeta):
     router: str = None
     _priority: int = 0
     _page_class_name: Optional[str] = None
+    _param_converters: Dict[str, Callable[[Any], Any]] = {}
 
     def __init__(self, params: Optional[Dict[str, str]] = None):
         self._component_instance_cache: Dict[str, Component] = {}
         self._rendered_component_keys: set[str] = set()
         self.params = params or {}
+        converters = self._param_converters
+        if converters:
+            self.params = {
+                name: converters[name](value) if name in converters else value
+                for name, value in self.params.items()
+            }
 
     def render(self, **params) -> Union[Element, Component]:
         raise NotImplementedError
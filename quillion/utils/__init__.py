@@ -1,2 +1,2 @@
 from .regex_parser import RegexParser, RouteType
-from .decorators import page
+from .decorators import page, blocking, debounce, fields, throttle
@@ -0,0 +1,117 @@
+import inspect
+import uuid
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple, get_type_hints
+from pydantic import TypeAdapter
+
+Converter = Callable[[Any], Any]
+
+_TRUE_VALUES = {"1", "true", "t", "yes", "y", "on"}
+_FALSE_VALUES = {"0", "false", "f", "no", "n", "off"}
+
+
+@lru_cache(maxsize=None)
+def _adapter(annotation: Any) -> TypeAdapter:
+    return TypeAdapter(annotation)
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.strip().lower()
+    if lowered in _TRUE_VALUES:
+        return True
+    if lowered in _FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
+
+
+def _simple_converter(target: type, parse: Callable[[str], Any]) -> Converter:
+    def convert(value: Any) -> Any:
+        value_type = type(value)
+        if value_type is target:
+            return value
+        if value_type is str:
+            return parse(value)
+        return _adapter(target).validate_python(value)
+
+    return convert
+
+
+SIMPLE_CONVERTERS: Dict[Any, Converter] = {
+    str: _simple_converter(str, str),
+    int: _simple_converter(int, int),
+    float: _simple_converter(float, float),
+    bool: _simple_converter(bool, _parse_bool),
+    uuid.UUID: _simple_converter(uuid.UUID, uuid.UUID),
+}
+
+# route param type -> (regex, annotation)
+ROUTE_PARAM_TYPES: Dict[str, Tuple[str, Any]] = {
+    "str": (r"[^\/]+", str),
+    "slug": (r"[-a-zA-Z0-9_]+", str),
+    "int": (r"-?\d+", int),
+    "float": (r"-?\d+(?:\.\d+)?", float),
+    "uuid": (
+        r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}",
+        uuid.UUID,
+    ),
+    "path": (r".+", str),
+}
+
+
+def build_converter(annotation: Any) -> Optional[Converter]:
+    if annotation is inspect.Parameter.empty or annotation is Any:
+        return None
+    if annotation in SIMPLE_CONVERTERS:
+        return SIMPLE_CONVERTERS[annotation]
+    return _adapter(annotation).validate_python
+
+
+def build_route_converters(param_types: Dict[str, str]) -> Dict[str, Converter]:
+    converters = {}
+    for name, type_name in param_types.items():
+        annotation = ROUTE_PARAM_TYPES[type_name][1]
+        if annotation is not str:
+            converters[name] = SIMPLE_CONVERTERS[annotation]
+    return converters
+
+
+def compile_arguments(func: Callable) -> Callable:
+    try:
+        parameters = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return func
+
+    try:
+        hints = get_type_hints(func)
+    except Exception:
+        hints = {}
+
+    converters = {}
+    for name, param in parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        converter = build_converter(hints.get(name, param.annotation))
+        if converter is not None:
+            converters[name] = converter
+
+    if not converters:
+        return func
+
+    def convert(params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            name: converters[name](value) if name in converters else value
+            for name, value in params.items()
+        }
+
+    if inspect.iscoroutinefunction(func):
+
+        async def compiled(**params):
+            return await func(**convert(params))
+
+    else:
+
+        def compiled(**params):
+            return func(**convert(params))
+
+    compiled._converted_params = frozenset(converters)
+    return compiled
@@ -1,14 +1,86 @@
-from typing import Callable, Union, Pattern
+from typing import Callable, Optional, Union, Pattern
+import functools
 import inspect
-from pydantic import validate_arguments
+from .converters import compile_arguments
 
 
-def page(route: Union[str, Pattern], priority: int = 0):
+def blocking(func: Optional[Callable] = None, *, kind: str = "thread"):
+    from ..core.executor import OFFLOAD_KINDS
+
+    if kind not in OFFLOAD_KINDS:
+        raise ValueError(
+            f"Unknown offload kind '{kind}', expected one of {OFFLOAD_KINDS}"
+        )
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            raise TypeError(f"{func.__name__} is async and cannot be offloaded")
+        func._offload = kind
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def _marked(func: Callable, **markers) -> Callable:
+    marked = functools.partial(func)
+    # keeps markers such as the offload kind set by @blocking
+    marked.__dict__.update(getattr(func, "__dict__", {}))
+    marked.__dict__.update(markers)
+    return marked
+
+
+def _rate_limited(kind: str, func: Callable, ms: int) -> Callable:
+    if ms <= 0:
+        raise ValueError(f"{kind} interval must be positive, got {ms}ms")
+    return _marked(func, _rate_limit=(kind, ms))
+
+
+def debounce(func: Optional[Callable] = None, ms: int = 150):
+    def decorator(func: Callable) -> Callable:
+        return _rate_limited("debounce", func, ms)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def throttle(func: Optional[Callable] = None, ms: int = 50):
+    def decorator(func: Callable) -> Callable:
+        return _rate_limited("throttle", func, ms)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def fields(*paths: Union[Callable, str]):
+    if paths and callable(paths[0]):
+        return fields(*paths[1:])(paths[0])
+    if not paths or not all(isinstance(path, str) and path for path in paths):
+        raise ValueError("fields() needs at least one dotted event path")
+
+    def decorator(func: Callable) -> Callable:
+        return _marked(func, _event_fields=tuple(paths))
+
+    return decorator
+
+
+def page(route: Union[str, Pattern], priority: int = 0, offload: Optional[str] = None):
     from ..pages.base import Page, PageMeta
 
     def decorator(func: Callable):
-        validated_func = validate_arguments(func)
+        validated_func = compile_arguments(func)
         is_async = inspect.iscoroutinefunction(func)
+        offload_kind = offload or getattr(func, "_offload", None)
+        if offload_kind == "process":
+            # the page class replaces the function in its module, so it
+            # cannot be pickled by reference for a worker process
+            raise ValueError("Page functions can only be offloaded to threads")
+        if offload_kind:
+            # validates the kind and rejects async page functions
+            blocking(func, kind=offload_kind)
 
         class GeneratedPage(Page, metaclass=PageMeta):
             router = route
@@ -19,11 +91,27 @@ def page(route: Union[str, Pattern], priority: int = 0):
                 async def render(self, **params):
                     return await validated_func(**params)
 
+            elif offload_kind:
+
+                async def render(self, **params):
+                    from ..core.app import Quillion
+
+                    return await Quillion._instance.executor.run(
+                        offload_kind, validated_func, **params
+                    )
+
             else:
 
                 def render(self, **params):
                     return validated_func(**params)
 
+        # the function's own annotations take precedence over the route's types
+        annotated = getattr(validated_func, "_converted_params", ())
+        GeneratedPage._param_converters = {
+            name: converter
+            for name, converter in GeneratedPage._param_converters.items()
+            if name not in annotated
+        }
         GeneratedPage.__name__ = func.__name__
         return GeneratedPage
 
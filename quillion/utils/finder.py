@@ -1,10 +1,19 @@
-from typing import Dict, Tuple, Optional
+from collections import OrderedDict
+from typing import Any, Dict, Tuple, Optional
 import re
 from .regex_parser import RegexParser
 from ..pages.base import PageMeta
 
 
 class RouteFinder:
+    cache_size: int = 256
+    _cache: "OrderedDict[str, Tuple[Optional[type], Optional[dict], float]]" = (
+        OrderedDict()
+    )
+    _cache_version: int = -1
+    _cache_hits: int = 0
+    _cache_misses: int = 0
+
     @staticmethod
     def _normalize_path(path: str) -> str:
         if not path or path == "/":
@@ -18,6 +27,35 @@ class RouteFinder:
     def find_route(path: str) -> Tuple[Optional[type], Optional[dict], float]:
         path = RouteFinder._normalize_path(path)
         path = path.strip()
+
+        cache = RouteFinder._cache
+        if RouteFinder._cache_version != PageMeta._version:
+            cache.clear()
+            RouteFinder._cache_version = PageMeta._version
+
+        cached = cache.get(path)
+        if cached is not None:
+            RouteFinder._cache_hits += 1
+            cache.move_to_end(path)
+            page_cls, params, max_priority = cached
+            return page_cls, dict(params) if params is not None else None, max_priority
+
+        RouteFinder._cache_misses += 1
+        page_cls, params, max_priority = RouteFinder._scan_routes(path)
+
+        if RouteFinder.cache_size > 0:
+            cache[path] = (
+                page_cls,
+                dict(params) if params is not None else None,
+                max_priority,
+            )
+            if len(cache) > RouteFinder.cache_size:
+                cache.popitem(last=False)
+
+        return page_cls, params, max_priority
+
+    @staticmethod
+    def _scan_routes(path: str) -> Tuple[Optional[type], Optional[dict], float]:
         page_cls = None
         params = None
         max_priority = float("-inf")
@@ -43,3 +81,22 @@ class RouteFinder:
                     page_cls, params, max_priority = cls, match_params, priority
 
         return page_cls, params, max_priority
+
+    @staticmethod
+    def clear_cache():
+        RouteFinder._cache.clear()
+        RouteFinder._cache_hits = 0
+        RouteFinder._cache_misses = 0
+
+    @staticmethod
+    def cache_info() -> Dict[str, Any]:
+        hits = RouteFinder._cache_hits
+        misses = RouteFinder._cache_misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": len(RouteFinder._cache),
+            "max_size": RouteFinder.cache_size,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
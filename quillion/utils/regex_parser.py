@@ -1,6 +1,10 @@
 import re
 from enum import Enum, auto
 from typing import Dict, Tuple, Optional, Union, Pattern
+from .converters import ROUTE_PARAM_TYPES
+
+_PARAM_RE = re.compile(r"\{(\w+)(?::(\w+))?\}")
+_ESCAPED_PARAM_RE = re.compile(r"\\\{(\w+)(?::(\w+))?\\\}")
 
 
 class RouteType(Enum):
@@ -26,13 +30,28 @@ class RegexParser:
 
         if "{" in route or "*" in route:
             pattern = re.escape(route)
-            pattern = re.sub(r"\\\{(\w+)\\\}", r"(?P<\1>[^\/]+)", pattern)
+            pattern = _ESCAPED_PARAM_RE.sub(RegexParser._param_group, pattern)
             pattern = pattern.replace(r"\*", r"[^\/]+")
             return re.compile(f"^{pattern}$"), RouteType.DYNAMIC
 
         pattern = re.escape(route)
         return re.compile(f"^{pattern}$"), RouteType.STATIC
 
+    @staticmethod
+    def _param_group(match: "re.Match") -> str:
+        name, type_name = match.group(1), match.group(2) or "str"
+        if type_name not in ROUTE_PARAM_TYPES:
+            raise ValueError(f"Unknown type '{type_name}' for route parameter '{name}'")
+        return f"(?P<{name}>{ROUTE_PARAM_TYPES[type_name][0]})"
+
+    @staticmethod
+    def get_param_types(route: Union[str, Pattern]) -> Dict[str, str]:
+        if not isinstance(route, str) or route.startswith("regex:"):
+            return {}
+        return {
+            name: type_name or "str" for name, type_name in _PARAM_RE.findall(route)
+        }
+
     @staticmethod
     def get_route_type(route: Union[str, Pattern]) -> RouteType:
         if isinstance(route, Pattern):
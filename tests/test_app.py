@@ -1,6 +1,10 @@
+import asyncio
 import pytest
 import json
 import os
+import socket
+import sys
+import time
 import websockets
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 
@@ -12,7 +16,43 @@ from quillion.core.server import AssetServer, ServerConnection
 from quillion.pages.base import Page
 
 
+def run_on_private_loop(coro):
+    # stands in for asyncio.run without touching the test's current loop
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def route_tables():
+    from quillion.pages.base import PageMeta
+
+    tables = (PageMeta._registry, PageMeta._dynamic_routes, PageMeta._regex_routes)
+    saved = [dict(table) for table in tables]
+    for table in tables:
+        table.clear()
+    yield
+    for table, entries in zip(tables, saved):
+        table.clear()
+        table.update(entries)
+
+
+@pytest.fixture
+def routed_app(route_tables):
+    # a fresh app whose pages are registered by the test and removed after it
+    return Quillion()
+
+
 class TestQuillion:
+    @pytest.fixture(autouse=True)
+    def keep_event_loop_policy(self):
+        with patch(
+            "quillion.core.app.install_event_loop", return_value="asyncio"
+        ), patch("asyncio.run", side_effect=run_on_private_loop):
+            yield
+
     @pytest.fixture
     def quillion(self):
         with patch.dict(
@@ -142,8 +182,12 @@ class TestQuillion:
         assert quillion.external_css_files == css_files + more_files
 
     def test_start_method(self, quillion):
-        with patch.object(quillion.asset_server, "start") as mock_asset_start:
-            with patch.object(quillion.server_connection, "start") as mock_server_start:
+        with patch.object(
+            quillion.asset_server, "serve", new_callable=AsyncMock
+        ) as mock_asset_start:
+            with patch.object(
+                quillion.server_connection, "serve", new_callable=AsyncMock
+            ) as mock_server_start:
 
                 quillion.start(
                     host="127.0.0.1",
@@ -152,9 +196,11 @@ class TestQuillion:
                     assets_host="assets.local",
                 )
 
-                mock_asset_start.assert_called_once_with(host="assets.local", port=9000)
+                mock_asset_start.assert_called_once_with(
+                    host="assets.local", port=9000, sock=None
+                )
                 mock_server_start.assert_called_once_with(
-                    quillion.handler, "127.0.0.1", 8080
+                    quillion.handler, "127.0.0.1", 8080, reuse_port=False, sock=None
                 )
 
     def test_start_method_with_env_vars(self, quillion):
@@ -167,18 +213,20 @@ class TestQuillion:
                 "QUILLION_ASSET_HOST": "env_assets",
             },
         ):
-            with patch.object(quillion.asset_server, "start") as mock_asset_start:
+            with patch.object(
+                quillion.asset_server, "serve", new_callable=AsyncMock
+            ) as mock_asset_start:
                 with patch.object(
-                    quillion.server_connection, "start"
+                    quillion.server_connection, "serve", new_callable=AsyncMock
                 ) as mock_server_start:
 
                     quillion.start()
 
                     mock_asset_start.assert_called_once_with(
-                        host="env_assets", port=8888
+                        host="env_assets", port=8888, sock=None
                     )
                     mock_server_start.assert_called_once_with(
-                        quillion.handler, "env_host", 9999
+                        quillion.handler, "env_host", 9999, reuse_port=False, sock=None
                     )
                     assert quillion.asset_server_url == "http://env_assets:8888"
 
@@ -191,3 +239,1268 @@ class TestQuillion:
 
         assert quillion._state_instances == {}
         assert mock_websocket not in quillion.crypto.client_aes_keys
+
+
+class TestQuillionPageReuse:
+    @pytest.fixture
+    def quillion(self, routed_app):
+        app = routed_app
+        app.render_page = AsyncMock()
+        return app
+
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        return websocket
+
+    @pytest.fixture
+    def user_page(self):
+        class UserPage(Page):
+            router = "/users/{id}"
+
+            def render(self, **params):
+                return None
+
+        return UserPage
+
+    @pytest.mark.asyncio
+    async def test_rerender_reuses_live_page(self, quillion, mock_websocket, user_page):
+        with patch("quillion_cli.debug.debugger.debugger"):
+            await quillion.navigate("/users/1", mock_websocket)
+        first_page = quillion.current_page
+
+        await quillion.render_current_page(mock_websocket)
+        await quillion.render_current_page(mock_websocket)
+
+        assert isinstance(first_page, user_page)
+        for call in quillion.render_page.call_args_list:
+            assert call.args[0] is first_page
+
+    @pytest.mark.asyncio
+    async def test_navigation_to_new_params_creates_page(
+        self, quillion, mock_websocket, user_page
+    ):
+        with patch("quillion_cli.debug.debugger.debugger"):
+            await quillion.navigate("/users/1", mock_websocket)
+            first_page = quillion.current_page
+            await quillion.navigate("/users/2", mock_websocket)
+
+        assert quillion.current_page is not first_page
+        assert quillion.current_page.params == {"id": "2"}
+
+    @pytest.mark.asyncio
+    async def test_back_navigation_restores_cached_page(
+        self, quillion, mock_websocket, user_page
+    ):
+        with patch("quillion_cli.debug.debugger.debugger"):
+            await quillion.navigate("/users/1", mock_websocket)
+            first_page = quillion.current_page
+            await quillion.navigate("/users/2", mock_websocket)
+            await quillion.navigate("/users/1", mock_websocket)
+
+        assert quillion.current_page is first_page
+
+    @pytest.mark.asyncio
+    async def test_page_cache_is_bounded(self, quillion, mock_websocket, user_page):
+        quillion.page_cache_size = 2
+
+        with patch("quillion_cli.debug.debugger.debugger"):
+            for user_id in range(5):
+                await quillion.navigate(f"/users/{user_id}", mock_websocket)
+
+        assert len(quillion.session.page_cache) == 2
+
+
+class TestQuillionPrefetch:
+    @pytest.fixture
+    def quillion(self, routed_app):
+        app = routed_app
+        app.crypto.encrypt_response = Mock(return_value={"encrypted": "data"})
+        return app
+
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        return websocket
+
+    @pytest.fixture
+    def render_counter(self):
+        from quillion.components import text
+
+        renders = []
+
+        class NextPage(Page):
+            router = "/next"
+
+            def render(self, **params):
+                renders.append(self)
+                return text("next")
+
+        return renders
+
+    @pytest.mark.asyncio
+    async def test_navigate_served_from_prefetch(
+        self, quillion, mock_websocket, render_counter
+    ):
+        await quillion.prefetch("/next", mock_websocket)
+
+        assert len(render_counter) == 1
+        mock_websocket.send.assert_not_called()
+
+        with patch("quillion_cli.debug.debugger.debugger"):
+            await quillion.navigate("/next", mock_websocket)
+
+        assert len(render_counter) == 1
+        mock_websocket.send.assert_called_once_with(json.dumps({"encrypted": "data"}))
+        assert quillion.current_page is render_counter[0]
+        assert quillion.current_path == "/next"
+        assert quillion.metrics.snapshot()["prefetch_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_prefetch_is_rendered_again(
+        self, quillion, mock_websocket, render_counter
+    ):
+        quillion.prefetch_ttl = 0
+
+        await quillion.prefetch("/next", mock_websocket)
+        with patch("quillion_cli.debug.debugger.debugger"):
+            await quillion.navigate("/next", mock_websocket)
+
+        assert len(render_counter) == 2
+
+    @pytest.mark.asyncio
+    async def test_rerender_discards_prefetched_pages(
+        self, quillion, mock_websocket, render_counter
+    ):
+        quillion.current_path = "/"
+
+        await quillion.prefetch("/next", mock_websocket)
+        await quillion.render_current_page(mock_websocket)
+
+        assert quillion.session.prefetch_cache == {}
+
+    @pytest.mark.asyncio
+    async def test_prefetch_unknown_route(self, quillion, mock_websocket):
+        await quillion.prefetch("/missing", mock_websocket)
+
+        assert quillion.session.prefetch_cache == {}
+
+
+class TestQuillionMetrics:
+    def test_state_metrics_per_session(self):
+        from quillion.core.session import Session
+
+        app = Quillion()
+        state = Mock()
+        state.memory_usage.return_value = 100
+        for port in (1, 2):
+            session = Session(Mock())
+            session.state_instances[Mock] = state
+            app.sessions[session.websocket] = session
+
+        snapshot = app.metrics.snapshot()["state"]
+
+        assert snapshot == {"instances": 2, "bytes": 200, "bytes_per_session": 100}
+
+    def test_start_with_workers_uses_supervisor(self):
+        app = Quillion()
+
+        with patch("quillion.core.app.WorkerSupervisor") as mock_supervisor_cls, patch(
+            "quillion.core.app.install_event_loop"
+        ):
+            with patch.object(
+                app.server_connection, "serve", new_callable=AsyncMock
+            ) as mock_server_start:
+                app.start(host="127.0.0.1", port=8080, workers=3)
+
+                args, kwargs = mock_supervisor_cls.call_args
+                assert args == (3,)
+                mock_server_start.assert_not_called()
+
+                run_on_private_loop(kwargs["serve"]())
+                mock_server_start.assert_called_once_with(
+                    app.handler, "127.0.0.1", 8080, reuse_port=True, sock=None
+                )
+                mock_supervisor_cls.return_value.run.assert_called_once()
+
+    def test_workers_asset_server_leaves_signals_to_supervisor(self):
+        app = Quillion()
+
+        with patch("quillion.core.app.WorkerSupervisor") as mock_supervisor_cls, patch(
+            "quillion.core.app.install_event_loop"
+        ), patch("socket.create_server") as mock_create_server, patch.object(
+            app.asset_server, "start"
+        ) as mock_asset_start:
+            supervisor = mock_supervisor_cls.return_value
+            supervisor.parent_sockets = []
+            app.start(assets_host="127.0.0.1", assets_port=9000, workers=2)
+
+            on_start = supervisor.run.call_args.kwargs["on_start"]
+            on_start()
+
+        mock_create_server.assert_called_once_with(("127.0.0.1", 9000))
+        sock = mock_create_server.return_value
+        assert supervisor.parent_sockets == [sock]
+        mock_asset_start.assert_called_once_with(sock=sock, handle_signals=False)
+
+
+class TestQuillionRerenderSessions:
+    @pytest.mark.asyncio
+    async def test_rerenders_each_live_session_in_its_context(self):
+        from quillion.core.session import Session
+
+        app = Quillion()
+        seen = []
+
+        async def render_current_page(websocket):
+            seen.append((websocket, Session.current().websocket))
+
+        app.render_current_page = render_current_page
+        live = Session(Mock())
+        detached = Session(Mock())
+        app.sessions[live.websocket] = live
+
+        app.rerender_sessions([live, detached])
+        await asyncio.sleep(0)
+
+        assert seen == [(live.websocket, live.websocket)]
+
+    @pytest.mark.asyncio
+    async def test_writer_session_rendered_once(self):
+        from quillion.components import State
+        from quillion.core.session import Session
+
+        class Votes(State):
+            _shared = True
+            count: int = 0
+
+        app = Quillion()
+        renders = []
+
+        async def render_current_page(websocket):
+            renders.append(websocket)
+
+        app.render_current_page = render_current_page
+        writer, watcher = Session(Mock()), Session(Mock())
+        for session in (writer, watcher):
+            app.sessions[session.websocket] = session
+            token = session.activate()
+            Votes.get_instance()
+            Session.deactivate(token)
+
+        token = writer.activate()
+        try:
+            app.callbacks["vote"] = lambda: Votes.set(count=Votes.count + 1)
+            await app.messaging.process_inner_message(
+                writer.websocket, {"action": "callback", "id": "vote"}
+            )
+            await asyncio.sleep(0)
+        finally:
+            Session.deactivate(token)
+
+        assert sorted(map(id, renders)) == sorted(
+            map(id, [writer.websocket, watcher.websocket])
+        )
+
+
+class TestQuillionBroadcast:
+    @pytest.fixture
+    def app(self, routed_app):
+        from quillion.components import button
+
+        app = routed_app
+        app.renders = 0
+
+        class Scoreboard(Page):
+            router = "/score"
+
+            def render(self, **params):
+                app.renders += 1
+                return button("1:0", on_click=lambda: None)
+
+        app.page_cls = Scoreboard
+        return app
+
+    def make_session(self, app, path="/score"):
+        from quillion.core.session import Session
+
+        session = Session(AsyncMock(spec=websockets.WebSocketServerProtocol))
+        session.outbox = Mock()
+        session.current_path = path
+        session.current_page = app.page_cls(params={})
+        app.sessions[session.websocket] = session
+        return session
+
+    async def rerender(self, app, sessions):
+        app.rerender_sessions(sessions)
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+    @pytest.mark.asyncio
+    async def test_identical_sessions_share_one_render(self, app):
+        from quillion.core.crypto import SerializedMessage
+
+        sessions = [self.make_session(app) for _ in range(5)]
+
+        await self.rerender(app, sessions)
+
+        assert app.renders == 1
+        messages = [s.outbox.put.call_args.args[0] for s in sessions]
+        assert isinstance(messages[0], SerializedMessage)
+        assert all(message is messages[0] for message in messages)
+        assert app.metrics.counters["shared_renders"] == 1
+        assert app.metrics.counters["shared_render_sessions"] == 5
+
+    @pytest.mark.asyncio
+    async def test_shared_render_callbacks_reach_every_session(self, app):
+        sessions = [self.make_session(app) for _ in range(2)]
+
+        await self.rerender(app, sessions)
+
+        message = sessions[0].outbox.put.call_args.args[0].content
+        cb_id = message["content"][1]["children"][0]["attributes"]["onclick"]
+        for session in sessions:
+            assert cb_id in session.callbacks
+
+    @pytest.mark.asyncio
+    async def test_sessions_with_own_inputs_render_alone(self, app):
+        plain = [self.make_session(app) for _ in range(2)]
+        stateful = self.make_session(app)
+        stateful.state_instances[object] = Mock()
+        elsewhere = self.make_session(app, path="/score/")
+
+        await self.rerender(app, plain + [stateful, elsewhere])
+
+        assert app.renders == 3
+        assert app.metrics.counters["shared_render_sessions"] == 2
+
+    @pytest.mark.asyncio
+    async def test_session_gone_during_render_is_skipped(self, app):
+        sessions = [self.make_session(app) for _ in range(2)]
+        build = app._build_page_message
+
+        async def build_and_drop(*args):
+            app.sessions.pop(sessions[1].websocket)
+            return await build(*args)
+
+        app._build_page_message = build_and_drop
+        await self.rerender(app, sessions)
+
+        sessions[0].outbox.put.assert_called_once()
+        sessions[1].outbox.put.assert_not_called()
+
+
+class TestQuillionEventLoop:
+    @pytest.fixture
+    def app(self):
+        app = Quillion()
+        with patch.object(app, "serve", Mock()), patch("asyncio.run") as mock_run:
+            app.mock_run = mock_run
+            yield app
+
+    @pytest.mark.parametrize("event_loop", ["auto", "asyncio", "uvloop"])
+    def test_start_installs_requested_loop(self, app, event_loop):
+        with patch(
+            "quillion.core.app.install_event_loop", return_value="asyncio"
+        ) as mock_install:
+            app.start(event_loop=event_loop)
+
+        mock_install.assert_called_once_with(event_loop)
+        assert app.event_loop == "asyncio"
+
+    def test_event_loop_from_env(self, app):
+        with patch.dict(os.environ, {"QUILLION_EVENT_LOOP": "asyncio"}), patch(
+            "quillion.core.app.install_event_loop", return_value="asyncio"
+        ) as mock_install:
+            app.start(event_loop="uvloop")
+
+        mock_install.assert_called_once_with("asyncio")
+
+    def test_start_runs_both_servers_in_one_loop(self, app):
+        with patch("quillion.core.app.install_event_loop"):
+            app.start(host="127.0.0.1", port=8080, assets_port=9000)
+
+        app.serve.assert_called_once_with(
+            "127.0.0.1", 8080, "localhost", 9000, sock=None, asset_sock=None
+        )
+        app.mock_run.assert_called_once_with(app.serve.return_value)
+
+    def test_nesting_is_opt_in(self, app):
+        with patch("quillion.core.app.install_event_loop"), patch(
+            "quillion.core.app.enable_nested_loops"
+        ) as mock_enable:
+            app.start()
+            mock_enable.assert_not_called()
+
+            app.start(nested=True)
+            mock_enable.assert_called_once()
+
+    def test_nested_forces_asyncio_loop(self, app):
+        with patch.dict(os.environ, {"QUILLION_NESTED": "1"}), patch(
+            "quillion.core.app.install_event_loop", return_value="asyncio"
+        ) as mock_install, patch("quillion.core.app.enable_nested_loops"):
+            app.start()
+
+        mock_install.assert_called_once_with("asyncio")
+
+    def test_nested_rejects_uvloop(self, app):
+        with patch("quillion.core.app.install_event_loop"), pytest.raises(
+            ValueError, match="uvloop"
+        ):
+            app.start(event_loop="uvloop", nested=True)
+
+    def test_import_does_not_patch_event_loop(self):
+        import subprocess
+        import sys
+
+        code = (
+            "import asyncio, quillion; "
+            "print(hasattr(asyncio.run, '__wrapped__') "
+            "or asyncio.run.__module__ != 'asyncio.runners')"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+
+        assert result.stdout.strip() == "False"
+
+    def test_start_configures_executor_pools(self, app):
+        with patch.dict(os.environ, {"QUILLION_PROCESS_WORKERS": "3"}), patch(
+            "quillion.core.app.install_event_loop"
+        ):
+            app.start(thread_workers=6, crypto_workers=2)
+
+        assert app.executor.thread_workers == 6
+        assert app.executor.process_workers == 3
+        assert app.executor.crypto_workers == 2
+
+    def test_start_configures_crypto_offload_threshold(self, app):
+        with patch.dict(
+            os.environ, {"QUILLION_CRYPTO_OFFLOAD_THRESHOLD": "4096"}
+        ), patch("quillion.core.app.install_event_loop"):
+            app.start()
+
+        assert app.crypto.offload_threshold == 4096
+        assert app.crypto.executor is app.executor
+
+    def test_start_configures_websocket_options(self, app):
+        with patch.dict(os.environ, {"QUILLION_WS_MAX_QUEUE": "8"}), patch(
+            "quillion.core.app.install_event_loop"
+        ):
+            app.start(websocket_options={"max_size": 2**24, "max_queue": 64})
+
+        assert app.server_connection.options == {"max_size": 2**24, "max_queue": 8}
+
+    def test_start_binds_unix_socket(self, app, tmp_path):
+        path = str(tmp_path / "quillion.sock")
+
+        with patch.dict(os.environ, {"QUILLION_UNIX_SOCKET": path}), patch(
+            "quillion.core.app.install_event_loop"
+        ):
+            app.start()
+
+        sock = app.serve.call_args.kwargs["sock"]
+        try:
+            assert sock.getsockname() == path
+        finally:
+            sock.close()
+
+    def test_workers_share_prebound_socket(self, app):
+        sock = Mock()
+
+        with patch("quillion.core.app.WorkerSupervisor") as mock_supervisor_cls, patch(
+            "quillion.core.app.install_event_loop"
+        ), patch.object(
+            app.server_connection, "serve", new_callable=AsyncMock
+        ) as mock_server_start:
+            app.start(workers=2, sock=sock)
+            run_on_private_loop(mock_supervisor_cls.call_args.kwargs["serve"]())
+
+        mock_server_start.assert_called_once_with(
+            app.handler, "0.0.0.0", 1337, reuse_port=False, sock=sock
+        )
+
+
+class TestQuillionOffload:
+    def test_executor_metrics_registered(self):
+        app = Quillion()
+
+        assert set(app.metrics.snapshot()["executor"]) == {
+            "thread",
+            "process",
+            "crypto",
+        }
+
+    @pytest.mark.asyncio
+    async def test_rerender_from_handler_thread_runs_on_loop(self):
+        from quillion.core.session import Session
+
+        app = Quillion()
+        app.loop = asyncio.get_running_loop()
+        rendered = asyncio.Event()
+
+        async def render_current_page(websocket):
+            rendered.set()
+
+        app.render_current_page = render_current_page
+        session = Session(Mock())
+        app.sessions[session.websocket] = session
+
+        await app.executor.run("thread", app.rerender_sessions, [session])
+        await asyncio.wait_for(rendered.wait(), 1)
+
+    @pytest.mark.asyncio
+    async def test_spawn_from_handler_thread(self):
+        app = Quillion()
+        app.loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+
+        async def work():
+            done.set()
+
+        await app.executor.run("thread", lambda: app.spawn(work()))
+        await asyncio.wait_for(done.wait(), 1)
+
+
+class TestQuillionOutbox:
+    @pytest.mark.asyncio
+    async def test_send_goes_through_session_outbox(self):
+        from quillion.core.session import Session
+
+        app = Quillion()
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        session = Session(websocket)
+        session.outbox = Mock()
+        app.sessions[websocket] = session
+
+        await app.send(websocket, {"action": "render_page"}, kind="render")
+
+        session.outbox.put.assert_called_once_with({"action": "render_page"}, "render")
+        websocket.send.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_handler_starts_and_closes_outbox(self):
+        app = Quillion()
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        websocket.path = "/"
+        websocket.recv.return_value = '{"action": "public_key", "key": ""}'
+        websocket.__aiter__.return_value = []
+        seen = {}
+
+        async def navigate(path, ws):
+            seen["outbox"] = app.sessions[ws].outbox
+
+        app.navigate = navigate
+        with patch.object(
+            app.crypto, "handle_key_exchange", AsyncMock(return_value=True)
+        ), patch("quillion_cli.debug.debugger.debugger"):
+            await app.handler(websocket)
+
+        assert seen["outbox"].websocket is websocket
+        assert seen["outbox"].closed
+
+    def test_outbox_metrics(self):
+        from quillion.core.session import Session
+
+        app = Quillion()
+        for depth in (2, 5):
+            session = Session(Mock())
+            session.outbox = [None] * depth
+            app.sessions[session.websocket] = session
+
+        assert app.metrics.snapshot()["outbox"] == {"pending": 7, "max_pending": 5}
+
+
+class TestQuillionInboundPipeline:
+    def make_websocket(self, messages):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        websocket.path = "/"
+        websocket.recv.return_value = '{"action": "public_key", "key": ""}'
+        websocket.__aiter__.return_value = [json.dumps(m) for m in messages]
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_messages_decrypted_ahead_and_processed_as_burst(self):
+        app = Quillion()
+        app.navigate = AsyncMock()
+        bursts = []
+        release, processed = asyncio.Event(), asyncio.Event()
+
+        async def process_burst(websocket, messages):
+            bursts.append([m["n"] for m in messages])
+            await release.wait()
+            if sum(map(len, bursts)) == 4:
+                processed.set()
+
+        async def decrypt_message(websocket, data):
+            if data["n"] == 3:
+                # decrypted while the first message is still being handled
+                release.set()
+            return data
+
+        async def messages():
+            for n in range(4):
+                yield json.dumps({"n": n})
+                await asyncio.sleep(0)
+            await asyncio.wait_for(processed.wait(), 1)
+
+        app.messaging.process_burst = process_burst
+        websocket = self.make_websocket([])
+        websocket.__aiter__ = lambda self: messages()
+        with patch.object(
+            app.crypto, "handle_key_exchange", AsyncMock(return_value=True)
+        ), patch.object(app.crypto, "decrypt_message", decrypt_message), patch(
+            "quillion_cli.debug.debugger.debugger"
+        ):
+            await app.handler(websocket)
+
+        assert bursts == [[0], [1, 2, 3]]
+
+    @pytest.mark.asyncio
+    async def test_processing_error_closes_connection(self):
+        app = Quillion()
+        app.navigate = AsyncMock()
+        app.messaging.process_burst = AsyncMock(side_effect=RuntimeError("boom"))
+        websocket = self.make_websocket([{"n": 0}])
+
+        async def messages():
+            yield json.dumps({"n": 0})
+            await asyncio.sleep(0.05)
+
+        websocket.__aiter__ = lambda self: messages()
+        with patch.object(
+            app.crypto, "handle_key_exchange", AsyncMock(return_value=True)
+        ), patch.object(
+            app.crypto, "decrypt_message", AsyncMock(return_value={"n": 0})
+        ), patch(
+            "quillion_cli.debug.debugger.debugger"
+        ):
+            with pytest.raises(RuntimeError, match="boom"):
+                await app.handler(websocket)
+
+
+class TestQuillionAdmission:
+    def make_websocket(self, ip="127.0.0.1"):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = (ip, 8080)
+        websocket.path = "/"
+        websocket.recv.return_value = '{"action": "public_key", "key": ""}'
+        websocket.__aiter__.return_value = []
+        return websocket
+
+    @pytest.fixture
+    def app(self):
+        app = Quillion()
+        app.navigate = AsyncMock()
+        with patch.object(
+            app.crypto, "handle_key_exchange", AsyncMock(return_value=True)
+        ), patch("quillion_cli.debug.debugger.debugger"):
+            yield app
+
+    @pytest.mark.asyncio
+    async def test_rejects_above_max_connections(self, app):
+        from quillion.core.session import Session
+
+        app.max_connections = 1
+        app.sessions[Mock()] = Session(None)
+        websocket = self.make_websocket()
+
+        await app.handler(websocket)
+
+        websocket.close.assert_awaited_once_with(1013, "try again later")
+        websocket.recv.assert_not_called()
+        assert app.metrics.counters["connections_rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_per_ip_limit(self, app):
+        app.max_connections_per_ip = 1
+        app._connections_per_ip["10.0.0.1"] = 1
+
+        blocked = self.make_websocket("10.0.0.1")
+        await app.handler(blocked)
+        allowed = self.make_websocket("10.0.0.2")
+        await app.handler(allowed)
+
+        blocked.close.assert_awaited_once_with(1013, "try again later")
+        allowed.close.assert_not_called()
+        assert app._connections_per_ip == {"10.0.0.1": 1}
+
+    @pytest.mark.asyncio
+    async def test_connection_count_released(self, app):
+        await app.handler(self.make_websocket())
+
+        assert app._connections_per_ip == {}
+        assert app.metrics.counters["connections_accepted"] == 1
+        assert app.metrics.snapshot()["connections"]["active"] == 0
+
+    @pytest.mark.asyncio
+    async def test_handshake_timeout(self, app):
+        app.handshake_timeout = 0.01
+        websocket = self.make_websocket()
+
+        async def recv():
+            await asyncio.sleep(1)
+
+        websocket.recv.side_effect = recv
+
+        await app.handler(websocket)
+
+        websocket.close.assert_awaited_once_with(1008, "handshake timeout")
+        app.navigate.assert_not_called()
+        assert app.metrics.counters["handshake_timeouts"] == 1
+        assert app.sessions == {}
+
+    @pytest.mark.asyncio
+    async def test_idle_connection_closed(self, app):
+        app.idle_timeout = 0.02
+        websocket = self.make_websocket()
+        closed = asyncio.Event()
+
+        async def close(code=1000, reason=""):
+            closed.set()
+
+        async def messages():
+            await asyncio.wait_for(closed.wait(), 1)
+            return
+            yield
+
+        websocket.close.side_effect = close
+        websocket.__aiter__ = lambda self: messages()
+
+        await app.handler(websocket)
+
+        websocket.close.assert_awaited_once_with(1001, "idle timeout")
+        assert app.metrics.counters["idle_closed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_activity_postpones_idle_close(self, app):
+        from quillion.core.session import Session
+
+        app.idle_timeout = 0.05
+        websocket = self.make_websocket()
+        session = Session(websocket)
+        reaper = asyncio.create_task(app._reap_idle(session))
+        for _ in range(4):
+            await asyncio.sleep(0.02)
+            session.last_activity = time.monotonic()
+
+        assert not reaper.done()
+        await asyncio.wait_for(reaper, 1)
+        websocket.close.assert_awaited_once_with(1001, "idle timeout")
+
+    def test_limits_from_start_and_env(self):
+        app = Quillion()
+        with patch.object(app, "serve", Mock()), patch("asyncio.run"), patch(
+            "quillion.core.app.install_event_loop"
+        ), patch.dict(os.environ, {"QUILLION_IDLE_TIMEOUT": "30"}):
+            app.start(max_connections=100, max_connections_per_ip=5)
+
+        assert app.max_connections == 100
+        assert app.max_connections_per_ip == 5
+        assert app.idle_timeout == 30.0
+        assert app.handshake_timeout == 10.0
+
+
+class TestQuillionResumption:
+    @pytest.fixture
+    def app(self, routed_app):
+        from quillion.components import button, text
+
+        app = routed_app
+        app.resumption.ttl = 60
+        app.label = "first"
+        app.clicks = []
+
+        class CounterPage(Page):
+            router = "/"
+
+            def render(self, **params):
+                return button(app.label, on_click=lambda: app.clicks.append(1))
+
+        async def key_exchange(websocket, data):
+            app.crypto.client_aes_keys[websocket] = b"key"
+            return data.get("action") == "public_key"
+
+        with patch.object(
+            app.crypto, "handle_key_exchange", side_effect=key_exchange
+        ), patch.object(
+            app.crypto,
+            "encrypt_response",
+            side_effect=lambda ws, message: getattr(message, "content", message),
+        ), patch(
+            "quillion_cli.debug.debugger.debugger"
+        ):
+            yield app
+
+    def make_websocket(self, *handshake):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        websocket.path = "/"
+        websocket.recv.side_effect = [json.dumps(m) for m in handshake]
+        websocket.sent = []
+        websocket.send.side_effect = lambda frame: websocket.sent.append(
+            json.loads(frame)
+        )
+
+        async def messages():
+            await asyncio.sleep(0.01)
+            raise websockets.ConnectionClosedError(None, None)
+            yield
+
+        websocket.__aiter__ = lambda self: messages()
+        return websocket
+
+    async def connect(self, app, *handshake):
+        websocket = self.make_websocket(*handshake)
+        with pytest.raises(websockets.ConnectionClosedError):
+            await app.handler(websocket)
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_reconnect_receives_patch(self, app):
+        first = await self.connect(app, {"action": "public_key", "key": ""})
+        token = first.sent[0]["token"]
+        render = first.sent[1]
+        assert render["action"] == "render_page"
+        assert len(app.resumption) == 1
+
+        app.label = "second"
+        second = await self.connect(app, {"action": "resume", "token": token})
+
+        app.crypto.handle_key_exchange.assert_called_once()
+        assert second.sent[0]["action"] == "resume_token"
+        assert second.sent[0]["token"] != token
+        patch_message = second.sent[1]
+        assert patch_message["action"] == "patch_page"
+        assert patch_message["patches"] == [
+            {"op": "text", "path": [1, 0], "text": "second"}
+        ]
+        assert app.metrics.counters["sessions_resumed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unsent_patch_does_not_move_last_tree(self, app):
+        first = await self.connect(app, {"action": "public_key", "key": ""})
+        token = first.sent[0]["token"]
+
+        app.label = "second"
+        second = self.make_websocket({"action": "resume", "token": token})
+
+        def send(frame):
+            message = json.loads(frame)
+            if message["action"] == "patch_page":
+                raise websockets.ConnectionClosedError(None, None)
+            second.sent.append(message)
+
+        second.send.side_effect = send
+        with pytest.raises(websockets.ConnectionClosedError):
+            await app.handler(second)
+
+        session = next(iter(app.resumption._detached.values()))[0]
+        assert session.last_tree == first.sent[1]["content"]
+
+    @pytest.mark.asyncio
+    async def test_resumed_session_keeps_callback_ids(self, app):
+        first = await self.connect(app, {"action": "public_key", "key": ""})
+        button = first.sent[1]["content"][1]["children"][0]
+        cb_id = button["attributes"]["onclick"]
+
+        await self.connect(app, {"action": "resume", "token": first.sent[0]["token"]})
+        session, _ = app.resumption._detached.popitem()[1][:2]
+
+        session.callbacks[cb_id]()
+        assert app.clicks == [1]
+
+    @pytest.mark.asyncio
+    async def test_unknown_token_falls_back_to_key_exchange(self, app):
+        websocket = await self.connect(
+            app,
+            {"action": "resume", "token": "bogus"},
+            {"action": "public_key", "key": ""},
+        )
+
+        assert websocket.sent[0] == {"action": "resume_rejected"}
+        assert [m["action"] for m in websocket.sent[1:]] == [
+            "resume_token",
+            "render_page",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_failed_connection_is_not_resumable(self, app):
+        app.messaging.process_burst = AsyncMock(side_effect=RuntimeError("boom"))
+        websocket = self.make_websocket({"action": "public_key", "key": ""})
+
+        async def messages():
+            yield json.dumps({"action": "encrypted_message"})
+            await asyncio.sleep(0.05)
+
+        websocket.__aiter__ = lambda self: messages()
+        with patch.object(
+            app.crypto, "decrypt_message", AsyncMock(return_value={"n": 0})
+        ), pytest.raises(RuntimeError):
+            await app.handler(websocket)
+
+        assert len(app.resumption) == 0
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        app = Quillion()
+
+        assert not app.resumption.enabled
+        with patch.dict(os.environ, {"QUILLION_RESUME_TTL": "30"}), patch.object(
+            app, "serve", Mock()
+        ), patch("asyncio.run"), patch("quillion.core.app.install_event_loop"):
+            app.start()
+
+        assert app.resumption.ttl == 30.0
+
+
+class TestQuillionGracefulRestart:
+    def make_session(self, app):
+        from quillion.core.session import Session
+
+        session = Session(AsyncMock(spec=websockets.WebSocketServerProtocol))
+        session.outbox = Mock()
+        session.outbox.flush = AsyncMock()
+        app.sessions[session.websocket] = session
+        return session
+
+    @pytest.mark.asyncio
+    async def test_drain_flushes_and_closes_with_restart_code(self):
+        app = Quillion()
+        app.restart_jitter = 0
+        app.server_connection = Mock()
+        sessions = [self.make_session(app) for _ in range(2)]
+
+        await app.drain()
+
+        app.server_connection.stop_accepting.assert_called_once()
+        for session in sessions:
+            session.outbox.flush.assert_awaited_once()
+            session.websocket.close.assert_awaited_once_with(1012, "service restart")
+        assert app.metrics.counters["drained_connections"] == 2
+
+    @pytest.mark.asyncio
+    async def test_drain_spreads_closes_over_jitter_window(self):
+        app = Quillion()
+        app.restart_jitter = 0.3
+        app.server_connection = Mock()
+        sessions = [self.make_session(app) for _ in range(3)]
+
+        with patch("quillion.core.app.random.uniform", side_effect=[0, 0.3, 0.2]):
+            task = asyncio.create_task(app.drain())
+            await asyncio.sleep(0.05)
+            closed = [s.websocket.close.await_count for s in sessions]
+            await task
+
+        assert closed == [1, 0, 0]
+
+    @pytest.mark.asyncio
+    async def test_stuck_outbox_does_not_block_drain(self):
+        app = Quillion()
+        app.restart_jitter = 0
+        app.drain_timeout = 0.01
+        app.server_connection = Mock()
+        session = self.make_session(app)
+        session.outbox.flush = AsyncMock(side_effect=asyncio.Event().wait)
+
+        await asyncio.wait_for(app.drain(), 1)
+
+        session.websocket.close.assert_awaited_once()
+
+    def test_successor_inherits_listening_sockets(self):
+        app = Quillion()
+        sock, asset_sock = Mock(), Mock()
+        sock.fileno.return_value = 7
+        asset_sock.fileno.return_value = 8
+
+        with patch("subprocess.Popen") as mock_popen:
+            app._spawn_successor(sock, asset_sock)
+
+        command = mock_popen.call_args.args[0]
+        kwargs = mock_popen.call_args.kwargs
+        assert command[-1] == sys.argv[-1]
+        assert kwargs["pass_fds"] == [7, 8]
+        assert kwargs["env"]["QUILLION_SOCKET_FD"] == "7"
+        assert kwargs["env"]["QUILLION_ASSET_SOCKET_FD"] == "8"
+        assert app.metrics.counters["restarts"] == 1
+
+    def test_start_uses_inherited_sockets(self):
+        import socket
+
+        app = Quillion()
+        listener = socket.create_server(("127.0.0.1", 0))
+        assets = socket.create_server(("127.0.0.1", 0))
+        env = {
+            "QUILLION_SOCKET_FD": str(listener.fileno()),
+            "QUILLION_ASSET_SOCKET_FD": str(assets.fileno()),
+            "QUILLION_UNIX_SOCKET": "/nonexistent/ignored.sock",
+        }
+        with patch.dict(os.environ, env), patch.object(
+            app, "serve", Mock()
+        ) as mock_serve, patch("asyncio.run"), patch(
+            "quillion.core.app.install_event_loop"
+        ):
+            app.start()
+
+        kwargs = mock_serve.call_args.kwargs
+        try:
+            assert kwargs["sock"].fileno() == listener.fileno()
+            assert kwargs["asset_sock"].fileno() == assets.fileno()
+        finally:
+            kwargs["sock"].detach()
+            kwargs["asset_sock"].detach()
+            listener.close()
+            assets.close()
+
+
+class TestQuillionTransportSecurity:
+    @pytest.fixture
+    def app(self, routed_app):
+        app = routed_app
+        app.transport_security = "tls"
+
+        class Home(Page):
+            router = "/"
+
+            def render(self, **params):
+                return None
+
+        with patch("quillion_cli.debug.debugger.debugger"):
+            yield app
+
+    def make_websocket(self, hello, messages=()):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        websocket.path = "/"
+        websocket.recv.return_value = json.dumps(hello)
+        websocket.sent = []
+        websocket.send.side_effect = websocket.sent.append
+
+        async def incoming():
+            for message in messages:
+                yield message
+            await asyncio.sleep(0.01)
+
+        websocket.__aiter__ = lambda self: incoming()
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_tls_hello_skips_key_exchange(self, app):
+        websocket = self.make_websocket({"action": "hello", "transport": "tls"})
+
+        with patch.object(
+            app.crypto, "handle_key_exchange"
+        ) as key_exchange, patch.object(app.crypto, "encrypt_response") as encrypt:
+            await app.handler(websocket)
+
+        key_exchange.assert_not_called()
+        encrypt.assert_not_called()
+        assert json.loads(websocket.sent[0]) == {
+            "action": "server_hello",
+            "transport": "tls",
+            "binary": False,
+        }
+        render = json.loads(websocket.sent[1])
+        assert render["action"] == "render_page"
+        assert app.metrics.counters["tls_connections"] == 1
+
+    @pytest.mark.asyncio
+    async def test_binary_frames(self, app):
+        websocket = self.make_websocket(
+            {"action": "hello", "transport": "tls", "binary": True}
+        )
+
+        await app.handler(websocket)
+
+        assert isinstance(websocket.sent[1], bytes)
+        assert json.loads(websocket.sent[1])["action"] == "render_page"
+
+    @pytest.mark.asyncio
+    async def test_plain_messages_reach_processor(self, app):
+        received = []
+
+        async def process_burst(websocket, messages):
+            received.extend(messages)
+
+        app.messaging.process_burst = process_burst
+        event = {"action": "callback", "id": "cb"}
+        websocket = self.make_websocket(
+            {"action": "hello", "transport": "tls"}, [json.dumps(event), "[1]"]
+        )
+
+        with patch.object(app.crypto, "decrypt_message") as decrypt:
+            await app.handler(websocket)
+
+        decrypt.assert_not_called()
+        assert received == [event]
+
+    @pytest.mark.asyncio
+    async def test_encrypted_clients_still_accepted(self, app):
+        websocket = self.make_websocket({"action": "public_key", "key": ""})
+
+        with patch.object(
+            app.crypto, "handle_key_exchange", AsyncMock(return_value=True)
+        ) as key_exchange, patch.object(
+            app.crypto, "encrypt_response", return_value={"encrypted": True}
+        ):
+            await app.handler(websocket)
+
+        key_exchange.assert_awaited_once()
+        assert json.loads(websocket.sent[0]) == {"encrypted": True}
+
+    @pytest.mark.asyncio
+    async def test_encrypted_mode_rejects_tls_hello(self, app):
+        app.transport_security = "encrypted"
+        websocket = self.make_websocket({"action": "hello", "transport": "tls"})
+
+        await app.handler(websocket)
+
+        websocket.close.assert_awaited_once_with(1008, "encrypted transport required")
+        assert websocket.sent == []
+        assert app.metrics.counters["transport_rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_message_serialized_once_for_plain_sessions(self, app):
+        from quillion.core.crypto import SerializedMessage
+        from quillion.core.session import Session
+
+        message = SerializedMessage({"action": "render_page", "content": []})
+        frames = []
+        for binary in (True, False):
+            session = Session(Mock())
+            session.transport, session.binary = "tls", binary
+            app.sessions[session.websocket] = session
+            frames.append(await app._encode(session.websocket, message))
+
+        assert frames[0] is message.payload
+        assert frames[1] == message.payload.decode()
+
+    def test_start_validates_mode(self):
+        app = Quillion()
+
+        assert app.transport_security == "encrypted"
+        with patch.object(app, "serve", Mock()), patch("asyncio.run"), patch(
+            "quillion.core.app.install_event_loop"
+        ):
+            with patch.dict(os.environ, {"QUILLION_TRANSPORT_SECURITY": "tls"}):
+                app.start()
+            assert app.transport_security == "tls"
+            with pytest.raises(ValueError, match="plaintext"):
+                app.start(transport_security="plaintext")
+
+
+class TestQuillionFrameBatching:
+    @pytest.fixture
+    def app(self, routed_app):
+        app = routed_app
+        app.transport_security = "tls"
+        app.resumption.ttl = 30
+
+        class Home(Page):
+            router = "/"
+
+            def render(self, **params):
+                return None
+
+        with patch("quillion_cli.debug.debugger.debugger"):
+            yield app
+        app.resumption.close()
+
+    def make_websocket(self, hello):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        websocket.path = "/"
+        websocket.recv.return_value = json.dumps(hello)
+        websocket.sent = []
+        websocket.send.side_effect = lambda frame: websocket.sent.append(
+            json.loads(frame)
+        )
+
+        async def incoming():
+            await asyncio.sleep(0.01)
+            return
+            yield
+
+        websocket.__aiter__ = lambda self: incoming()
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_actions_of_one_tick_share_a_frame(self, app):
+        websocket = self.make_websocket(
+            {"action": "hello", "transport": "tls", "batch": True}
+        )
+
+        await app.handler(websocket)
+
+        assert websocket.sent[0]["action"] == "server_hello"
+        assert len(websocket.sent) == 2
+        envelope = websocket.sent[1]
+        assert envelope["action"] == "batch"
+        assert [a["action"] for a in envelope["actions"]] == [
+            "resume_token",
+            "render_page",
+        ]
+        assert app.metrics.counters["outbox_batched"] == 2
+
+    @pytest.mark.asyncio
+    async def test_clients_without_batch_get_one_frame_per_action(self, app):
+        websocket = self.make_websocket({"action": "hello", "transport": "tls"})
+
+        await app.handler(websocket)
+
+        assert [m["action"] for m in websocket.sent] == [
+            "server_hello",
+            "resume_token",
+            "render_page",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_batched_render_is_kept_for_resumption(self, app):
+        websocket = self.make_websocket(
+            {"action": "hello", "transport": "tls", "batch": True}
+        )
+
+        await app.handler(websocket)
+
+        session = next(iter(app.resumption._detached.values()))[0]
+        assert session.last_tree == websocket.sent[1]["actions"][1]["content"]
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs unix sockets")
+class TestQuillionUnixSocket:
+    @pytest.mark.asyncio
+    async def test_serves_clients_over_unix_socket(self, routed_app, tmp_path):
+        from quillion.components import text
+
+        app = routed_app
+        app.transport_security = "tls"
+        app.max_connections_per_ip = 1
+
+        class Home(Page):
+            router = "/"
+
+            def render(self, **params):
+                return text("hi")
+
+        path = str(tmp_path / "quillion.sock")
+        hello = json.dumps({"action": "hello", "transport": "tls"})
+        with patch("quillion_cli.debug.debugger.debugger"):
+            async with websockets.unix_serve(app.handler, path):
+                async with websockets.unix_connect(
+                    path
+                ) as first, websockets.unix_connect(path) as second:
+                    for client in (first, second):
+                        await client.send(hello)
+                        replies = [json.loads(await client.recv()) for _ in range(2)]
+                        assert [r["action"] for r in replies] == [
+                            "server_hello",
+                            "render_page",
+                        ]
+                    assert len({s.connection_id for s in app.sessions.values()}) == 2
+
+        assert app._connections_per_ip == {}
+        assert "connections_rejected" not in app.metrics.counters
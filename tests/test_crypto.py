@@ -9,7 +9,8 @@ from cryptography.hazmat.primitives.asymmetric import x25519
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
-from quillion.core.crypto import Crypto
+from quillion.core.crypto import Crypto, SerializedMessage
+from quillion.core.executor import Executor
 
 
 class TestCrypto:
@@ -132,6 +133,30 @@ class TestCrypto:
 
         assert decrypted_content == test_content
 
+    def test_encrypt_serialized_message_once_per_payload(
+        self, crypto, mock_websocket, test_aes_key
+    ):
+        other = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        other_key = AESGCM.generate_key(bit_length=256)
+        crypto.client_aes_keys[mock_websocket] = test_aes_key
+        crypto.client_aes_keys[other] = other_key
+        message = SerializedMessage({"action": "render_page", "content": [1]})
+
+        results = [
+            (crypto.encrypt_response(mock_websocket, message), test_aes_key),
+            (crypto.encrypt_response(other, message), other_key),
+        ]
+        payload = message.payload
+
+        assert message.payload is payload
+        for result, key in results:
+            decrypted = AESGCM(key).decrypt(
+                base64.b64decode(result["nonce"]),
+                base64.b64decode(result["encrypted_payload"]),
+                None,
+            )
+            assert json.loads(decrypted) == message.content
+
     def test_encrypt_response_no_aes_key(self, crypto, mock_websocket):
         test_content = {"response": "data"}
 
@@ -264,3 +289,75 @@ class TestCrypto:
         assert websocket1 not in crypto.client_aes_keys
         assert websocket2 in crypto.client_x25519_private_keys
         assert websocket2 in crypto.client_aes_keys
+
+    def test_batch_envelope_reuses_serialized_parts(self):
+        shared = SerializedMessage({"action": "render_page", "content": ["x"]})
+        shared.payload
+        envelope = SerializedMessage.batch([{"action": "redirect"}, shared])
+
+        assert json.loads(envelope.payload) == envelope.content
+        assert envelope.payload == json.dumps(envelope.content).encode("utf-8")
+        assert envelope.content["actions"][1] is shared.content
+
+
+class TestCryptoOffload:
+    @pytest.fixture
+    def executor(self):
+        executor = Executor(crypto_workers=1)
+        yield executor
+        executor.shutdown(wait=True)
+
+    @pytest.fixture
+    def crypto(self, executor):
+        crypto = Crypto(executor=executor)
+        crypto.offload_threshold = 1024
+        return crypto
+
+    @pytest.fixture
+    def websocket(self, crypto):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        crypto.client_aes_keys[websocket] = os.urandom(32)
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_large_frame_sealed_on_crypto_pool(self, crypto, executor, websocket):
+        message = SerializedMessage({"action": "render_page", "content": "x" * 2048})
+
+        frame = json.loads(await crypto.encrypt_frame(websocket, message))
+
+        assert executor.metrics()["crypto"]["completed"] == 1
+        aesgcm = AESGCM(crypto.client_aes_keys[websocket])
+        plaintext = aesgcm.decrypt(
+            base64.b64decode(frame["nonce"]),
+            base64.b64decode(frame["encrypted_payload"]),
+            None,
+        )
+        assert plaintext == message.payload
+
+    @pytest.mark.asyncio
+    async def test_small_frame_sealed_inline(self, crypto, executor, websocket):
+        frame = json.loads(
+            await crypto.encrypt_frame(websocket, SerializedMessage({"n": 1}))
+        )
+
+        assert frame["action"] == "encrypted_response"
+        assert executor.metrics()["crypto"]["submitted"] == 0
+
+    @pytest.mark.asyncio
+    async def test_large_message_opened_on_crypto_pool(
+        self, crypto, executor, websocket
+    ):
+        content = {"action": "event", "value": "x" * 2048}
+        sealed = crypto.encrypt_response(websocket, content)
+
+        opened = await crypto.decrypt_message(
+            websocket,
+            {
+                "action": "encrypted_message",
+                "data": sealed["encrypted_payload"],
+                "nonce": sealed["nonce"],
+            },
+        )
+
+        assert opened == content
+        assert executor.metrics()["crypto"]["completed"] == 1
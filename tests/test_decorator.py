@@ -3,7 +3,7 @@ import re
 from unittest.mock import Mock
 import inspect
 
-from quillion import page
+from quillion import blocking, debounce, fields, page, throttle
 
 
 class TestPageDecorator:
@@ -391,3 +391,180 @@ class TestPageDecoratorPerformance:
         results = await asyncio.gather(page1_instance.render(), page2_instance.render())
 
         assert results == ["Page 1", "Page 2"]
+
+
+class TestPageDecoratorConverters:
+    def test_simple_annotations_skip_pydantic(self):
+        from unittest.mock import patch
+
+        @page("/fast/{id:int}")
+        def fast_page(id: int, name: str = "x"):
+            return (id, name)
+
+        page_instance = fast_page(params={"id": "5"})
+
+        with patch("quillion.utils.converters._adapter") as mock_adapter:
+            result = page_instance.render(**page_instance.params)
+
+            mock_adapter.assert_not_called()
+        assert result == (5, "x")
+
+    def test_string_params_converted_from_annotation(self):
+        @page("/annotated/{flag}/{ratio}")
+        def annotated_page(flag: bool, ratio: float):
+            return (flag, ratio)
+
+        page_instance = annotated_page(params={"flag": "yes", "ratio": "0.5"})
+
+        assert page_instance.render(**page_instance.params) == (True, 0.5)
+
+    def test_function_annotation_overrides_route_type(self):
+        @page("/typed-override/{id:int}")
+        def override_page(id: str):
+            return id
+
+        page_instance = override_page(params={"id": "7"})
+
+        assert page_instance.params == {"id": "7"}
+        assert page_instance.render(**page_instance.params) == "7"
+
+    def test_route_type_applies_to_unannotated_params(self):
+        @page("/typed-plain/{id:int}")
+        def plain_page(id, name: str = "x"):
+            return id
+
+        page_instance = plain_page(params={"id": "7"})
+
+        assert page_instance.render(**page_instance.params) == 7
+
+    def test_complex_annotation_uses_pydantic(self):
+        from typing import List
+
+        @page("/complex")
+        def complex_page(ids: List[int]):
+            return ids
+
+        page_instance = complex_page()
+
+        assert page_instance.render(ids=["1", "2"]) == [1, 2]
+        with pytest.raises(Exception):
+            page_instance.render(ids=["a"])
+
+    def test_unannotated_function_is_not_wrapped(self):
+        from quillion.utils.converters import compile_arguments
+
+        def plain(id, name="x"):
+            return id
+
+        assert compile_arguments(plain) is plain
+
+
+class TestBlockingDecorator:
+    def test_marks_function_for_thread_offload(self):
+        @blocking
+        def parse():
+            return 1
+
+        assert parse._offload == "thread"
+        assert parse() == 1
+
+    def test_process_kind(self):
+        @blocking(kind="process")
+        def crunch():
+            return 1
+
+        assert crunch._offload == "process"
+
+    def test_rejects_async_and_unknown_kinds(self):
+        async def fetch():
+            pass
+
+        with pytest.raises(TypeError):
+            blocking(fetch)
+        with pytest.raises(ValueError):
+            blocking(kind="fiber")
+
+    @pytest.mark.asyncio
+    async def test_offloaded_page_renders_in_executor(self):
+        from unittest.mock import AsyncMock, patch
+
+        @page("/offloaded/{id:int}", offload="thread")
+        def offloaded_page(id: int):
+            return id
+
+        app = Mock()
+        app.executor.run = AsyncMock(return_value="rendered")
+        page_instance = offloaded_page(params={"id": "3"})
+
+        with patch("quillion.core.app.Quillion._instance", app):
+            result = await page_instance.render(**page_instance.params)
+
+        assert result == "rendered"
+        kind, func = app.executor.run.call_args.args
+        assert kind == "thread"
+        assert app.executor.run.call_args.kwargs == {"id": "3"}
+
+    def test_blocking_page_function_is_offloaded(self):
+        @page("/blocking-page")
+        @blocking
+        def blocking_page():
+            return "x"
+
+        assert inspect.iscoroutinefunction(blocking_page.render)
+
+    def test_pages_cannot_use_process_offload(self):
+        with pytest.raises(ValueError, match="threads"):
+
+            @page("/process-page", offload="process")
+            def process_page():
+                return "x"
+
+
+class TestRateLimitDecorators:
+    def test_debounce_wraps_without_changing_the_handler(self):
+        def search(event):
+            return event
+
+        limited = debounce(search, 200)
+
+        assert limited._rate_limit == ("debounce", 200)
+        assert limited("q") == "q"
+        assert not hasattr(search, "_rate_limit")
+
+    def test_throttle_as_decorator_keeps_offload(self):
+        @throttle(ms=100)
+        @blocking
+        def track(event):
+            pass
+
+        assert track._rate_limit == ("throttle", 100)
+        assert track._offload == "thread"
+
+    def test_rejects_non_positive_interval(self):
+        with pytest.raises(ValueError):
+            debounce(lambda: None, 0)
+
+
+class TestFieldsDecorator:
+    def test_declares_event_paths(self):
+        def on_input(event):
+            return event
+
+        projected = fields(on_input, "target.value", "key")
+
+        assert projected._event_fields == ("target.value", "key")
+        assert projected({"key": "a"}) == {"key": "a"}
+
+    def test_decorator_form_composes_with_debounce(self):
+        @fields("target.value")
+        def search(event):
+            pass
+
+        limited = debounce(search, 100)
+
+        assert limited._event_fields == ("target.value",)
+        assert limited._rate_limit == ("debounce", 100)
+
+    def test_requires_a_path(self):
+        with pytest.raises(ValueError):
+            fields(lambda event: None)
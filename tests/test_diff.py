@@ -0,0 +1,84 @@
+from quillion.core.diff import diff_tree
+
+
+def node(tag, text=None, children=None, **attributes):
+    return {
+        "tag": tag,
+        "attributes": attributes,
+        "text": text,
+        "children": children or [],
+    }
+
+
+class TestDiffTree:
+    def test_identical_trees(self):
+        tree = [node("div", "a", [node("p", "b")])]
+
+        assert diff_tree(tree, tree) == []
+
+    def test_text_and_attribute_changes(self):
+        old = [node("div", children=[node("p", "1", **{"class": "a", "id": "x"})])]
+        new = [node("div", children=[node("p", "2", **{"class": "b"})])]
+
+        assert diff_tree(old, new) == [
+            {
+                "op": "attributes",
+                "path": [0, 0],
+                "set": {"class": "b"},
+                "remove": ["id"],
+            },
+            {"op": "text", "path": [0, 0], "text": "2"},
+        ]
+
+    def test_replaces_different_tags_and_keys(self):
+        old = [node("p"), {**node("li"), "key": "a"}]
+        new = [node("span"), {**node("li"), "key": "b"}]
+
+        patches = diff_tree(old, new)
+
+        assert [p["op"] for p in patches] == ["replace", "replace"]
+        assert patches[0] == {"op": "replace", "path": [0], "node": node("span")}
+
+    def test_append_and_truncate_children(self):
+        grown = diff_tree(
+            [node("ul", children=[node("li")])],
+            [node("ul", children=[node("li"), node("li", "2")])],
+        )
+        shrunk = diff_tree(
+            [node("ul", children=[node("li"), node("li")])], [node("ul")]
+        )
+
+        assert grown == [{"op": "append", "path": [0], "nodes": [node("li", "2")]}]
+        assert shrunk == [{"op": "truncate", "path": [0], "length": 0}]
+
+    def test_text_children(self):
+        assert diff_tree([node("p", children=["a"])], [node("p", children=["b"])]) == [
+            {"op": "replace", "path": [0, 0], "node": "b"}
+        ]
+
+    def test_callback_ids_reconciled(self):
+        handler = object()
+        callbacks = {"old": object(), "new": handler}
+        coalesced = {"new"}
+        new_tree = [node("input", oninput="new")]
+
+        patches = diff_tree(
+            [node("input", oninput="old")], new_tree, callbacks, coalesced
+        )
+
+        assert patches == []
+        assert callbacks["old"] is handler
+        assert "new" not in callbacks
+        assert coalesced == {"old"}
+        assert new_tree[0]["attributes"]["oninput"] == "old"
+
+    def test_new_handler_is_patched(self):
+        callbacks = {"new": object()}
+
+        patches = diff_tree(
+            [node("button")], [node("button", onclick="new")], callbacks
+        )
+
+        assert patches == [
+            {"op": "attributes", "path": [0], "set": {"onclick": "new"}, "remove": []}
+        ]
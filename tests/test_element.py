@@ -1,4 +1,5 @@
 import pytest
+import json
 import uuid
 from unittest.mock import Mock, patch
 
@@ -209,6 +210,48 @@ class TestElement:
         expected = {"tag": "div", "attributes": {}, "text": "Hello", "children": []}
         assert result == expected
 
+    def test_to_dict_marks_high_frequency_callbacks(self):
+        element = Element("input", on_input=Mock(), on_click=Mock())
+        mock_app = Mock()
+        mock_app.callbacks = {}
+        mock_app.coalesced_callbacks = set()
+
+        result = element.to_dict(mock_app)
+
+        assert mock_app.coalesced_callbacks == {result["attributes"]["oninput"]}
+
+    def test_to_dict_advertises_rate_limit(self):
+        from quillion import debounce
+
+        element = Element("input", on_input=debounce(lambda event: None, 150))
+        mock_app = Mock()
+        mock_app.callbacks = {}
+        mock_app.coalesced_callbacks = set()
+
+        result = element.to_dict(mock_app)
+
+        assert result["attributes"]["data-q-input-debounce"] == 150
+        assert "data-q-click-debounce" not in result["attributes"]
+
+    def test_to_dict_advertises_event_fields(self):
+        from quillion import fields
+
+        element = Element(
+            "input",
+            on_input=fields(lambda event: None, "target.value"),
+            on_click=Mock(),
+        )
+        mock_app = Mock()
+        mock_app.callbacks = {}
+        mock_app.coalesced_callbacks = set()
+
+        result = element.to_dict(mock_app)
+
+        assert json.loads(result["attributes"]["data-q-input-fields"]) == [
+            "target.value"
+        ]
+        assert "data-q-click-fields" not in result["attributes"]
+
     @patch("uuid.uuid4")
     def test_to_dict_with_event_handlers(self, mock_uuid):
         mock_uuid.return_value = uuid.UUID("12345678-1234-5678-1234-567812345678")
@@ -611,3 +654,71 @@ class TestElementPerformance:
 
         assert (end_time - start_time) < 0.1, "append too slow for many children"
         assert len(parent.children) == 1000
+
+
+class TestAnchorPrefetch:
+    def test_prefetch_attribute(self):
+        from quillion.components import anchor
+
+        link = anchor("Next", prefetch="hover")
+
+        assert link.to_dict(Mock(callbacks={}))["attributes"]["data-prefetch"] == (
+            "hover"
+        )
+
+    def test_invalid_prefetch_mode(self):
+        from quillion.components import anchor
+
+        with pytest.raises(ValueError):
+            anchor("Next", prefetch="always")
+
+
+class TestElementClientActions:
+    def make_app(self):
+        mock_app = Mock()
+        mock_app.callbacks = {}
+        mock_app.coalesced_callbacks = set()
+        return mock_app
+
+    def test_client_action_serialized_without_callback(self):
+        from quillion.components import toggle_class
+
+        element = Element("button", on_click=toggle_class("open", target="#menu"))
+        mock_app = self.make_app()
+
+        result = element.to_dict(mock_app)
+
+        assert json.loads(result["attributes"]["data-q-onclick"]) == [
+            {"op": "toggle_class", "target": "#menu", "class_name": "open"}
+        ]
+        assert "onclick" not in result["attributes"]
+        assert mock_app.callbacks == {}
+
+    def test_several_actions_run_in_order(self):
+        from quillion.components import hide, set_attr, show
+
+        element = Element(
+            "button",
+            on_click=[hide(".tab"), show("#tab-2"), set_attr("aria-selected", "true")],
+        )
+
+        result = element.to_dict(self.make_app())
+
+        assert json.loads(result["attributes"]["data-q-onclick"]) == [
+            {"op": "hide", "target": ".tab"},
+            {"op": "show", "target": "#tab-2"},
+            {"op": "set_attr", "name": "aria-selected", "value": "true"},
+        ]
+
+    def test_client_action_next_to_server_handler(self):
+        from quillion.components import copy_text
+
+        element = Element("button", on_click=Mock())
+        element.add_event_handler("dblclick", copy_text(target="#code"))
+
+        result = element.to_dict(self.make_app())
+
+        assert "onclick" in result["attributes"]
+        assert json.loads(result["attributes"]["data-q-ondblclick"]) == [
+            {"op": "copy_text", "target": "#code"}
+        ]
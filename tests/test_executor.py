@@ -0,0 +1,103 @@
+import asyncio
+import os
+import threading
+import pytest
+from unittest.mock import Mock, patch
+
+from quillion.core.executor import Executor
+from quillion.core.session import Session
+
+
+def square(value):
+    return value * value
+
+
+def current_pid():
+    return os.getpid()
+
+
+class TestExecutor:
+    @pytest.fixture
+    def executor(self):
+        executor = Executor(thread_workers=2, process_workers=1)
+        yield executor
+        executor.shutdown(wait=True)
+
+    @pytest.mark.asyncio
+    async def test_thread_offload_runs_off_the_loop(self, executor):
+        loop_thread = threading.get_ident()
+
+        thread = await executor.run("thread", threading.get_ident)
+
+        assert thread != loop_thread
+
+    @pytest.mark.asyncio
+    async def test_thread_offload_keeps_session_context(self, executor):
+        session = Session(Mock())
+        token = session.activate()
+        try:
+            seen = await executor.run("thread", Session.current)
+        finally:
+            Session.deactivate(token)
+
+        assert seen is session
+
+    @pytest.mark.asyncio
+    async def test_process_offload(self, executor):
+        assert await executor.run("process", square, 7) == 49
+        assert await executor.run("process", current_pid) != os.getpid()
+
+    @pytest.mark.asyncio
+    async def test_unknown_kind(self, executor):
+        with pytest.raises(ValueError, match="Unknown offload kind"):
+            await executor.run("fiber", square, 2)
+
+    @pytest.mark.asyncio
+    async def test_metrics_track_runs_and_failures(self, executor):
+        def fail():
+            raise RuntimeError("boom")
+
+        await executor.run("thread", square, 3)
+        with pytest.raises(RuntimeError):
+            await executor.run("thread", fail)
+
+        metrics = executor.metrics()["thread"]
+        assert metrics["size"] == 2
+        assert metrics["submitted"] == 2
+        assert metrics["completed"] == 1
+        assert metrics["failed"] == 1
+        assert metrics["pending"] == 0
+        assert metrics["queue_depth"] == 0
+        assert metrics["max_run_ms"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_queue_depth_counts_calls_beyond_pool_size(self, executor):
+        release = threading.Event()
+        calls = [
+            asyncio.ensure_future(executor.run("thread", release.wait))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0.05)
+
+        assert executor.metrics()["thread"]["queue_depth"] == 3
+
+        release.set()
+        await asyncio.gather(*calls)
+        assert executor.metrics()["thread"]["pending"] == 0
+
+    def test_configure_replaces_pool(self, executor):
+        pool = executor._pool("thread")
+
+        executor.configure(thread_workers=4)
+
+        assert executor.thread_workers == 4
+        assert executor._pool("thread") is not pool
+
+    @pytest.mark.asyncio
+    async def test_crypto_pool_is_separate_from_offload_pool(self, executor):
+        offload_thread = await executor.run("thread", threading.current_thread)
+        crypto_thread = await executor.run("crypto", threading.current_thread)
+
+        assert offload_thread.name.startswith("quillion-offload")
+        assert crypto_thread.name.startswith("quillion-crypto")
+        assert executor.metrics()["crypto"]["completed"] == 1
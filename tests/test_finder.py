@@ -200,6 +200,7 @@ class TestRouteFinder:
 
             for path in test_paths:
                 mock_extract.reset_mock()
+                RouteFinder.clear_cache()
                 page_cls, params, priority = RouteFinder.find_route(path)
 
                 expected_path = RouteFinder._normalize_path(path)
@@ -319,3 +320,73 @@ class TestRouteFinderEdgeCases:
             page_cls, params, priority = RouteFinder.find_route("/users/用户123")
             assert page_cls == mock_page_cls
             assert params == {"id": "用户123"}
+
+
+class TestRouteFinderCache:
+    def setup_method(self):
+        PageMeta._registry.clear()
+        PageMeta._dynamic_routes.clear()
+        PageMeta._regex_routes.clear()
+        RouteFinder.clear_cache()
+
+    def test_repeated_lookup_served_from_cache(self):
+        mock_page_cls = Mock()
+        mock_page_cls._regex = re.compile(r"^/users$")
+
+        PageMeta._registry["/users"] = (mock_page_cls, 0)
+
+        RouteFinder.find_route("/users")
+
+        with patch.object(RegexParser, "extract_params") as mock_extract:
+            page_cls, params, priority = RouteFinder.find_route("users/")
+
+            mock_extract.assert_not_called()
+            assert page_cls == mock_page_cls
+            assert params == {}
+            assert priority == 0
+
+        info = RouteFinder.cache_info()
+        assert info["hits"] == 1
+        assert info["misses"] == 1
+        assert info["hit_rate"] == 0.5
+
+    def test_cached_params_are_copied(self):
+        mock_page_cls = Mock()
+        pattern = re.compile(r"^/users/(?P<id>\w+)$")
+
+        PageMeta._dynamic_routes["/users/{id}"] = (pattern, mock_page_cls, 0)
+
+        _, params, _ = RouteFinder.find_route("/users/1")
+        params["id"] = "changed"
+
+        _, params, _ = RouteFinder.find_route("/users/1")
+        assert params == {"id": "1"}
+
+    def test_registration_invalidates_cache(self):
+        from quillion.pages.base import Page
+
+        page_cls, _, _ = RouteFinder.find_route("/late")
+        assert page_cls is None
+
+        class LatePage(Page):
+            router = "/late"
+
+        page_cls, _, _ = RouteFinder.find_route("/late")
+        assert page_cls is LatePage
+
+        LatePage.unregister()
+
+        page_cls, _, _ = RouteFinder.find_route("/late")
+        assert page_cls is None
+
+    def test_cache_is_bounded(self):
+        original_size = RouteFinder.cache_size
+        RouteFinder.cache_size = 2
+        try:
+            for path in ["/a", "/b", "/c"]:
+                RouteFinder.find_route(path)
+
+            assert RouteFinder.cache_info()["size"] == 2
+            assert "/a" not in RouteFinder._cache
+        finally:
+            RouteFinder.cache_size = original_size
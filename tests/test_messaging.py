@@ -1,8 +1,9 @@
+import asyncio
 import pytest
 import json
 from unittest.mock import Mock, AsyncMock, patch
 import websockets
-from quillion.core.messaging import Messaging
+from quillion.core.messaging import Messaging, callback_spec
 
 
 class TestMessaging:
@@ -47,6 +48,24 @@ class TestMessaging:
         mock_callback.assert_called_once()
         messaging.app.render_current_page.assert_called_once_with(mock_websocket)
 
+    @pytest.mark.asyncio
+    async def test_blocking_callback_runs_in_executor(self, messaging, mock_websocket):
+        def handler(event_data):
+            pass
+
+        handler._offload = "thread"
+        messaging.app.callbacks = {"cb": handler}
+        messaging.app.executor.run = AsyncMock()
+        messaging.app.render_current_page = AsyncMock()
+
+        await messaging.process_inner_message(
+            mock_websocket,
+            {"action": "event_callback", "id": "cb", "event_data": '{"v": 1}'},
+        )
+
+        messaging.app.executor.run.assert_awaited_once_with("thread", handler, {"v": 1})
+        messaging.app.render_current_page.assert_called_once_with(mock_websocket)
+
     @pytest.mark.asyncio
     async def test_process_inner_message_callback_async(
         self, messaging, mock_websocket, mock_async_callback
@@ -221,6 +240,16 @@ class TestMessaging:
 
         messaging.app.navigate.assert_called_once_with("/", mock_websocket)
 
+    @pytest.mark.asyncio
+    async def test_process_inner_message_prefetch(self, messaging, mock_websocket):
+        inner_data = {"action": "prefetch", "path": "/next"}
+
+        messaging.app.prefetch = AsyncMock()
+
+        await messaging.process_inner_message(mock_websocket, inner_data)
+
+        messaging.app.prefetch.assert_called_once_with("/next", mock_websocket)
+
     @pytest.mark.asyncio
     async def test_process_inner_message_callback_exception(
         self, messaging, mock_websocket, mock_callback
@@ -314,5 +343,390 @@ class TestMessaging:
                 await messaging.process_inner_message(mock_websocket, inner_data)
 
 
+class TestMessagingDispatch:
+    @pytest.fixture
+    def messaging(self):
+        app = Mock()
+        app.render_current_page = AsyncMock()
+        return Messaging(app)
+
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_custom_action_handler(self, messaging, mock_websocket):
+        received = []
+
+        @messaging.register("ping")
+        async def ping(websocket, data):
+            received.append((websocket, data["n"]))
+
+        handled = await messaging.process_inner_message(
+            mock_websocket, {"action": "ping", "n": 1}
+        )
+
+        assert received == [(mock_websocket, 1)]
+        assert handled is False
+        messaging.app.render_current_page.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_truthy_handler_result_renders(self, messaging, mock_websocket):
+        messaging.register("bump", lambda websocket, data: True)
+
+        handled = await messaging.process_inner_message(
+            mock_websocket, {"action": "bump"}
+        )
+
+        assert handled is True
+        messaging.app.render_current_page.assert_awaited_once_with(mock_websocket)
+
+    @pytest.mark.asyncio
+    async def test_builtin_action_can_be_replaced(self, messaging, mock_websocket):
+        navigate = AsyncMock(return_value=False)
+        messaging.register("navigate", navigate)
+
+        await messaging.process_inner_message(
+            mock_websocket, {"action": "navigate", "path": "/x"}
+        )
+
+        navigate.assert_awaited_once_with(
+            mock_websocket, {"action": "navigate", "path": "/x"}
+        )
+        messaging.app.navigate.assert_not_called()
+
+    def test_spec_shared_by_lambdas_from_one_definition(self):
+        def make():
+            return lambda event: event
+
+        first, second = make(), make()
+
+        assert callback_spec(first) is callback_spec(second)
+        assert callback_spec(first).takes_event is True
+
+    def test_spec_of_decorated_functions_follows_wrapped(self):
+        import functools
+
+        def deco(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                return func(*args)
+
+            return wrapper
+
+        @deco
+        def without_event():
+            pass
+
+        @deco
+        def with_event(event):
+            pass
+
+        assert callback_spec(without_event).takes_event is False
+        assert callback_spec(with_event).takes_event is True
+
+    def test_spec_of_bound_method_excludes_self(self):
+        class Counter:
+            def increment(self):
+                pass
+
+            async def load(self, event):
+                pass
+
+        assert callback_spec(Counter().increment).takes_event is False
+        spec = callback_spec(Counter().load)
+        assert spec.takes_event is True
+        assert spec.is_async is True
+
+    @pytest.mark.asyncio
+    async def test_event_dispatch_does_not_inspect_signature(
+        self, messaging, mock_websocket
+    ):
+        seen = []
+        handler = lambda event: seen.append(event["v"])
+        callback_spec(handler)
+        messaging.app.callbacks = {"cb": handler}
+
+        with patch("quillion.core.messaging.CallbackSpec") as inspected:
+            await messaging.process_inner_message(
+                mock_websocket,
+                {"action": "event_callback", "id": "cb", "event_data": '{"v": 2}'},
+            )
+
+        inspected.assert_not_called()
+        assert seen == [2]
+
+    @pytest.mark.asyncio
+    async def test_event_data_not_parsed_for_handler_without_arguments(
+        self, messaging, mock_websocket
+    ):
+        calls = []
+        messaging.app.callbacks = {"cb": lambda: calls.append(1)}
+
+        with patch("quillion.core.messaging.json") as json_module:
+            await messaging.process_inner_message(
+                mock_websocket,
+                {"action": "event_callback", "id": "cb", "event_data": '{"v": 1}'},
+            )
+
+        json_module.loads.assert_not_called()
+        assert calls == [1]
+
+    @pytest.mark.asyncio
+    async def test_projected_event_data_sent_as_object(self, messaging, mock_websocket):
+        seen = []
+        messaging.app.callbacks = {"cb": lambda event: seen.append(event)}
+
+        await messaging.process_inner_message(
+            mock_websocket,
+            {
+                "action": "event_callback",
+                "id": "cb",
+                "event_data": {"target": {"value": "q"}},
+            },
+        )
+
+        assert seen == [{"target": {"value": "q"}}]
+
+
+class TestMessagingRateLimits:
+    @pytest.fixture
+    def session(self):
+        from quillion.core.session import Session
+
+        session = Session(Mock())
+        yield session
+        session.close()
+
+    @pytest.fixture
+    def messaging(self, session):
+        app = Mock()
+        app.render_current_page = AsyncMock()
+        app._session_for.return_value = session
+        return Messaging(app)
+
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        return websocket
+
+    def event(self, value):
+        return {
+            "action": "event_callback",
+            "id": "cb",
+            "event_data": json.dumps({"value": value}),
+        }
+
+    @pytest.mark.asyncio
+    async def test_debounce_delivers_latest_event_after_quiet_period(
+        self, messaging, mock_websocket
+    ):
+        from quillion import debounce
+
+        seen = []
+        messaging.app.callbacks = {
+            "cb": debounce(lambda event: seen.append(event["value"]), 20)
+        }
+
+        for value in ("h", "he", "hel"):
+            handled = await messaging.process_inner_message(
+                mock_websocket, self.event(value)
+            )
+            assert handled is False
+        assert seen == []
+
+        await asyncio.sleep(0.05)
+
+        assert seen == ["hel"]
+        messaging.app.render_current_page.assert_awaited_once_with(mock_websocket)
+        messaging.app.metrics.inc.assert_any_call("events_deferred")
+
+    @pytest.mark.asyncio
+    async def test_throttle_runs_leading_and_trailing_edges(
+        self, messaging, mock_websocket
+    ):
+        from quillion import throttle
+
+        seen = []
+        messaging.app.callbacks = {
+            "cb": throttle(lambda event: seen.append(event["value"]), 30)
+        }
+
+        results = [
+            await messaging.process_inner_message(mock_websocket, self.event(value))
+            for value in (1, 2, 3)
+        ]
+        assert results == [True, False, False]
+        assert seen == [1]
+
+        await asyncio.sleep(0.06)
+
+        assert seen == [1, 3]
+        assert messaging.app.render_current_page.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_throttle_survives_rerender_between_events(
+        self, messaging, mock_websocket, session
+    ):
+        from quillion import throttle
+        from quillion.components.ui.element import Element
+
+        seen = []
+        current = {}
+        messaging.app.callbacks = session.callbacks
+        messaging.app.coalesced_callbacks = session.coalesced_callbacks
+
+        async def render(websocket):
+            # every render hands out new callback ids, like the real page
+            session.begin_render()
+            element = Element(
+                "div",
+                on_mousemove=throttle(lambda event: seen.append(event["value"]), 1000),
+            )
+            current["id"] = element.to_dict(messaging.app)["attributes"]["onmousemove"]
+
+        messaging.app.render_current_page.side_effect = render
+        token = session.activate()
+        try:
+            await render(mock_websocket)
+            for value in range(3):
+                await messaging.process_inner_message(
+                    mock_websocket,
+                    {
+                        "action": "event_callback",
+                        "id": current["id"],
+                        "event_data": json.dumps({"value": value}),
+                    },
+                )
+            for _ in range(5):
+                await render(mock_websocket)
+        finally:
+            session.deactivate(token)
+
+        assert seen == [0]
+        assert len(session.rate_limiters) == 1
+
+    @pytest.mark.asyncio
+    async def test_closing_session_drops_pending_trailing_call(
+        self, messaging, mock_websocket, session
+    ):
+        from quillion import debounce
+
+        seen = []
+        messaging.app.callbacks = {"cb": debounce(lambda: seen.append(1), 10)}
+
+        await messaging.process_inner_message(
+            mock_websocket, {"action": "callback", "id": "cb"}
+        )
+        session.close()
+        await asyncio.sleep(0.03)
+
+        assert seen == []
+
+
 def mock_call(*args, **kwargs):
     return ((args, kwargs),)
+
+
+class TestMessagingBursts:
+    @pytest.fixture
+    def messaging(self):
+        app = Mock()
+        app.render_current_page = AsyncMock()
+        app._session_for.return_value.coalesced_callbacks = {"input"}
+        app._session_for.return_value.handling_event = False
+        return Messaging(app)
+
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        return websocket
+
+    def event(self, cb_id, value):
+        return {
+            "action": "event_callback",
+            "id": cb_id,
+            "event_data": json.dumps({"value": value}),
+        }
+
+    @pytest.mark.asyncio
+    async def test_callbacks_run_in_order_with_one_render(
+        self, messaging, mock_websocket
+    ):
+        calls = []
+        messaging.app.callbacks = {
+            "a": lambda: calls.append("a"),
+            "b": lambda: calls.append("b"),
+        }
+
+        await messaging.process_burst(
+            mock_websocket,
+            [
+                {"action": "callback", "id": "a"},
+                {"action": "callback", "id": "b"},
+                {"action": "callback", "id": "a"},
+            ],
+        )
+
+        assert calls == ["a", "b", "a"]
+        messaging.app.render_current_page.assert_awaited_once_with(mock_websocket)
+
+    @pytest.mark.asyncio
+    async def test_consecutive_high_frequency_events_coalesced(
+        self, messaging, mock_websocket
+    ):
+        seen = []
+        messaging.app.callbacks = {
+            "input": lambda data: seen.append(("input", data["value"])),
+            "keydown": lambda data: seen.append(("keydown", data["value"])),
+        }
+
+        await messaging.process_burst(
+            mock_websocket,
+            [
+                self.event("input", "h"),
+                self.event("input", "he"),
+                self.event("keydown", "l"),
+                self.event("keydown", "l"),
+                self.event("input", "hel"),
+                self.event("input", "hell"),
+            ],
+        )
+
+        assert seen == [
+            ("input", "he"),
+            ("keydown", "l"),
+            ("keydown", "l"),
+            ("input", "hell"),
+        ]
+        messaging.app.metrics.inc.assert_any_call("inbound_coalesced")
+        messaging.app.render_current_page.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_navigate_in_burst_replaces_pending_render(
+        self, messaging, mock_websocket
+    ):
+        messaging.app.callbacks = {"a": Mock()}
+        messaging.app.navigate = AsyncMock()
+
+        await messaging.process_burst(
+            mock_websocket,
+            [{"action": "callback", "id": "a"}, {"action": "navigate", "path": "/x"}],
+        )
+
+        messaging.app.navigate.assert_awaited_once_with("/x", mock_websocket)
+        messaging.app.render_current_page.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_unknown_callbacks_do_not_render(self, messaging, mock_websocket):
+        messaging.app.callbacks = {}
+
+        await messaging.process_burst(
+            mock_websocket, [{"action": "callback", "id": "gone"}]
+        )
+
+        messaging.app.render_current_page.assert_not_called()
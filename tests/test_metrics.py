@@ -0,0 +1,30 @@
+from quillion import Quillion
+from quillion.core.metrics import Metrics
+
+
+class TestMetrics:
+    def test_counters_and_gauges(self):
+        metrics = Metrics()
+
+        metrics.inc("renders")
+        metrics.inc("renders", 2)
+        metrics.set("connections", 5)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["renders"] == 3
+        assert snapshot["connections"] == 5
+
+    def test_collectors_are_evaluated_on_snapshot(self):
+        metrics = Metrics()
+        values = {"size": 1}
+
+        metrics.register("cache", lambda: dict(values))
+        values["size"] = 2
+
+        assert metrics.snapshot()["cache"] == {"size": 2}
+
+    def test_app_exposes_route_cache_stats(self):
+        app = Quillion()
+
+        routes = app.metrics.snapshot()["routes"]
+        assert set(routes) == {"hits", "misses", "size", "max_size", "hit_rate"}
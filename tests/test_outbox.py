@@ -0,0 +1,184 @@
+import asyncio
+import json
+import pytest
+import websockets
+from unittest.mock import AsyncMock, Mock, patch
+
+from quillion.core.metrics import Metrics
+from quillion.core.outbox import (
+    Outbox,
+    OVERFLOW_CLOSE_CODE,
+    WRITER_ERROR_CLOSE_CODE,
+)
+
+
+class TestOutbox:
+    @pytest.fixture
+    def websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.sent = []
+        websocket.gate = asyncio.Event()
+        websocket.gate.set()
+
+        async def send(frame):
+            await websocket.gate.wait()
+            websocket.sent.append(json.loads(frame))
+
+        websocket.send.side_effect = send
+        return websocket
+
+    @pytest.fixture
+    def metrics(self):
+        return Metrics()
+
+    @pytest.fixture
+    def outbox(self, websocket, metrics):
+        outbox = Outbox(websocket, json.dumps, max_pending=3, metrics=metrics)
+        yield outbox
+        outbox.close()
+
+    @pytest.mark.asyncio
+    async def test_sends_in_order(self, outbox, websocket):
+        outbox.start()
+        outbox.put({"n": 1})
+        outbox.put({"n": 2})
+        await outbox.flush()
+
+        assert websocket.sent == [{"n": 1}, {"n": 2}]
+
+    @pytest.mark.asyncio
+    async def test_newer_render_replaces_unsent_one(self, outbox, websocket, metrics):
+        outbox.start()
+        websocket.gate.clear()
+        outbox.put({"n": "in flight"}, kind="render")
+        await asyncio.sleep(0)
+        outbox.put({"n": "stale"}, kind="render")
+        outbox.put({"n": "redirect"})
+        outbox.put({"n": "latest"}, kind="render")
+
+        assert len(outbox) == 2
+        websocket.gate.set()
+        await outbox.flush()
+
+        assert websocket.sent == [
+            {"n": "in flight"},
+            {"n": "redirect"},
+            {"n": "latest"},
+        ]
+        assert metrics.counters["outbox_superseded"] == 1
+
+    @pytest.mark.asyncio
+    async def test_encodes_lazily_in_writer(self, websocket):
+        encode = Mock(side_effect=json.dumps)
+        outbox = Outbox(websocket, encode)
+        websocket.gate.clear()
+        outbox.start()
+        outbox.put({"n": 1}, kind="render")
+        await asyncio.sleep(0)
+        outbox.put({"n": 2}, kind="render")
+        outbox.put({"n": 3}, kind="render")
+
+        websocket.gate.set()
+        await outbox.flush()
+        outbox.close()
+
+        assert encode.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_overflow_closes_connection(self, outbox, websocket, metrics):
+        outbox.start()
+        websocket.gate.clear()
+        outbox.put({"n": 0})
+        await asyncio.sleep(0)
+        for n in range(3):
+            assert outbox.put({"n": n + 1})
+
+        assert not outbox.put({"n": 4})
+        await asyncio.sleep(0)
+
+        websocket.close.assert_awaited_once_with(OVERFLOW_CLOSE_CODE, "send queue full")
+        assert outbox.closed
+        assert len(outbox) == 0
+        assert metrics.counters["outbox_overflows"] == 1
+        assert not outbox.put({"n": 5})
+
+    @pytest.mark.asyncio
+    async def test_writer_stops_when_connection_closes(self, websocket):
+        websocket.send.side_effect = websockets.ConnectionClosed(None, None)
+        outbox = Outbox(websocket, json.dumps)
+        outbox.start()
+
+        outbox.put({"n": 1})
+        await asyncio.sleep(0.01)
+
+        assert outbox.closed
+        assert outbox._writer.done()
+
+    @pytest.mark.asyncio
+    async def test_awaits_async_encoder(self, websocket, metrics):
+        async def encode(message):
+            await asyncio.sleep(0)
+            return json.dumps(message)
+
+        outbox = Outbox(websocket, encode, metrics=metrics)
+        outbox.start()
+        outbox.put({"n": 1})
+        await outbox.flush()
+        outbox.close()
+
+        assert websocket.sent == [{"n": 1}]
+
+    @pytest.mark.asyncio
+    async def test_batches_messages_queued_together(self, websocket, metrics):
+        outbox = Outbox(
+            websocket,
+            json.dumps,
+            metrics=metrics,
+            batch=lambda messages: {"batch": messages},
+        )
+        outbox.start()
+        outbox.put({"n": 1})
+        outbox.put({"n": 2}, kind="render")
+        outbox.put({"n": 3}, kind="render")
+        await outbox.flush()
+        outbox.put({"n": 4})
+        await outbox.flush()
+        outbox.close()
+
+        assert websocket.sent == [{"batch": [{"n": 1}, {"n": 3}]}, {"n": 4}]
+        assert metrics.counters["outbox_batched"] == 2
+        assert metrics.counters["outbox_sent"] == 2
+
+    @pytest.mark.asyncio
+    async def test_on_sent_only_after_send(self, websocket, metrics):
+        sent = []
+        outbox = Outbox(websocket, json.dumps, metrics=metrics, on_sent=sent.append)
+        outbox.start()
+        outbox.put({"n": 1})
+        await outbox.flush()
+
+        websocket.send.side_effect = websockets.ConnectionClosedError(None, None)
+        outbox.put({"n": 2})
+        await outbox.flush()
+
+        assert sent == [[{"n": 1}]]
+        assert outbox.closed
+
+    @pytest.mark.asyncio
+    async def test_encode_error_closes_connection(self, websocket, metrics):
+        import datetime
+
+        outbox = Outbox(websocket, json.dumps, metrics=metrics)
+        outbox.start()
+        with patch("quillion_cli.debug.debugger.debugger") as debugger:
+            outbox.put({"at": datetime.datetime.now()})
+            await asyncio.wait_for(outbox.flush(), 1)
+            await asyncio.sleep(0)
+
+        assert outbox.closed
+        assert outbox.put({"n": 1}) is False
+        websocket.close.assert_awaited_once_with(
+            WRITER_ERROR_CLOSE_CODE, "internal error"
+        )
+        debugger.error.assert_called_once()
+        assert metrics.counters["outbox_errors"] == 1
@@ -408,3 +408,17 @@ class TestRouteMatching:
         assert "/static" in PageMeta._registry
         page_class, _ = PageMeta._registry["/static"]
         assert page_class == StaticPage
+
+    def test_typed_route_params_are_converted(self):
+        import uuid
+
+        class TypedPage(Page):
+            router = "/orders/{id:int}/{ref:uuid}/{name}"
+
+            def render(self, **params):
+                return Mock(spec=Element)
+
+        ref = "12345678-1234-5678-1234-567812345678"
+        page = TypedPage(params={"id": "7", "ref": ref, "name": "box"})
+
+        assert page.params == {"id": 7, "ref": uuid.UUID(ref), "name": "box"}
@@ -1,3 +1,4 @@
+import pytest
 import re
 from re import Pattern
 from quillion.utils.regex_parser import RegexParser, RouteType
@@ -344,3 +345,34 @@ class TestRegexParserCorrected:
             pattern, route_type = RegexParser.compile_route(route)
             assert pattern.pattern == expected_pattern
             assert route_type == RouteType.DYNAMIC
+
+
+class TestTypedRouteParams:
+    def test_typed_params_compile_to_narrow_groups(self):
+        pattern, route_type = RegexParser.compile_route("/users/{id:int}/{slug:slug}")
+
+        assert route_type == RouteType.DYNAMIC
+        assert RegexParser.extract_params(pattern, "/users/42/hello-world") == {
+            "id": "42",
+            "slug": "hello-world",
+        }
+        assert RegexParser.extract_params(pattern, "/users/abc/hello") is None
+
+    def test_uuid_param(self):
+        pattern, _ = RegexParser.compile_route("/items/{item:uuid}")
+
+        value = "12345678-1234-5678-1234-567812345678"
+        assert RegexParser.extract_params(pattern, f"/items/{value}") == {"item": value}
+        assert RegexParser.extract_params(pattern, "/items/not-a-uuid") is None
+
+    def test_get_param_types(self):
+        assert RegexParser.get_param_types("/a/{id:int}/{name}") == {
+            "id": "int",
+            "name": "str",
+        }
+        assert RegexParser.get_param_types("/static") == {}
+        assert RegexParser.get_param_types(re.compile(r"/x")) == {}
+
+    def test_unknown_param_type(self):
+        with pytest.raises(ValueError, match="Unknown type 'money'"):
+            RegexParser.compile_route("/price/{amount:money}")
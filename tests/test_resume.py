@@ -0,0 +1,121 @@
+import time
+import pytest
+from unittest.mock import Mock, patch
+
+from quillion.core.metrics import Metrics
+from quillion.core.resume import SessionResumption
+from quillion.core.session import Session
+
+
+class TestSessionResumption:
+    @pytest.fixture
+    def metrics(self):
+        return Metrics()
+
+    @pytest.fixture
+    def resumption(self, metrics):
+        return SessionResumption(ttl=60, max_sessions=2, metrics=metrics)
+
+    def make_session(self):
+        session = Session(Mock())
+        session.outbox = Mock()
+        session.callbacks["cb"] = Mock()
+        return session
+
+    def test_disabled_by_default(self):
+        resumption = SessionResumption()
+        session = self.make_session()
+        resumption.issue(session)
+
+        assert not resumption.enabled
+        assert not resumption.detach(session, b"key")
+
+    def test_detach_and_resume(self, resumption, metrics):
+        session = self.make_session()
+        outbox = session.outbox
+        token = resumption.issue(session)
+
+        assert resumption.detach(session, b"key")
+        outbox.close.assert_called_once()
+        assert session.websocket is None
+        assert session.callbacks
+
+        assert resumption.resume(token) == (session, b"key")
+        assert len(resumption) == 0
+        assert metrics.counters["sessions_resumed"] == 1
+
+    def test_plain_transport_sessions_have_no_key(self, resumption):
+        session = self.make_session()
+        token = resumption.issue(session)
+
+        assert resumption.detach(session, None)
+        assert resumption.resume(token) == (session, None)
+
+    def test_token_is_single_use(self, resumption, metrics):
+        session = self.make_session()
+        token = resumption.issue(session)
+        resumption.detach(session, b"key")
+        resumption.resume(token)
+
+        assert resumption.resume(token) is None
+        assert metrics.counters["resume_rejected"] == 1
+
+    def test_reissue_rotates_token(self, resumption):
+        session = self.make_session()
+        first = resumption.issue(session)
+        second = resumption.issue(session)
+        resumption.detach(session, b"key")
+
+        assert first != second
+        assert resumption.resume(first) is None
+        assert resumption.resume(second)[0] is session
+
+    @pytest.mark.parametrize("token", [None, 42, "", "not base64!", "AAAA" * 10])
+    def test_rejects_forged_tokens(self, resumption, token):
+        session = self.make_session()
+        resumption.issue(session)
+        resumption.detach(session, b"key")
+
+        assert resumption.resume(token) is None
+        assert len(resumption) == 1
+
+    def test_token_does_not_reveal_session_id(self, resumption):
+        session = self.make_session()
+        token = resumption.issue(session)
+
+        assert session.resume_id not in token
+
+    def test_expired_sessions_closed(self, resumption, metrics):
+        session = self.make_session()
+        token = resumption.issue(session)
+        resumption.detach(session, b"key")
+
+        with patch(
+            "quillion.core.resume.time.monotonic", return_value=time.monotonic() + 61
+        ):
+            assert resumption.resume(token) is None
+
+        assert session.callbacks == {}
+        assert metrics.counters["resume_expired"] == 1
+
+    def test_lru_evicts_oldest(self, resumption, metrics):
+        sessions = [self.make_session() for _ in range(3)]
+        tokens = [resumption.issue(session) for session in sessions]
+        for session in sessions:
+            resumption.detach(session, b"key")
+
+        assert len(resumption) == 2
+        assert resumption.resume(tokens[0]) is None
+        assert sessions[0].callbacks == {}
+        assert metrics.counters["resume_evicted"] == 1
+        assert resumption.metrics()["detached"] == 2
+
+    def test_close_releases_detached(self, resumption):
+        session = self.make_session()
+        resumption.issue(session)
+        resumption.detach(session, b"key")
+
+        resumption.close()
+
+        assert len(resumption) == 0
+        assert session.callbacks == {}
@@ -75,3 +75,14 @@ class TestPathSync:
 
         with patch("asyncio.create_task"):
             Path.navigate(path_template, params)
+
+    def test_prefetch_async_task_creation(self):
+        mock_app = MagicMock()
+        mock_app.websocket = MagicMock()
+        Path.init(mock_app)
+
+        with patch("asyncio.create_task") as mock_create_task:
+            Path.prefetch("/user/{id}", {"id": "1"})
+
+            mock_create_task.assert_called_once()
+            mock_app.prefetch.assert_called_once_with("/user/1", mock_app.websocket)
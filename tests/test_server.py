@@ -1,7 +1,13 @@
 import asyncio
+import os
 import pytest
+import signal
+import socket
+import subprocess
+import sys
+import time
 import websockets
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 from typing import Callable
 from quillion import ServerConnection
 
@@ -17,66 +23,467 @@ class TestServerConnection:
         return Mock()
 
     @pytest.fixture
-    def mock_loop(self):
-        loop = Mock()
+    def mock_serve(self):
+        with patch("websockets.serve") as mock_serve:
+            ws_server = Mock()
+            ws_server.wait_closed = AsyncMock(side_effect=asyncio.Event().wait)
+            mock_serve.return_value.__aenter__ = AsyncMock(return_value=ws_server)
+            mock_serve.return_value.__aexit__ = AsyncMock(return_value=False)
+            yield mock_serve
 
-        future = asyncio.Future()
-        future.set_result(None)
+    async def run_briefly(self, coro):
+        task = asyncio.create_task(coro)
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
 
-        def run_until_complete(future_or_coro):
-            if asyncio.iscoroutine(future_or_coro):
-                try:
-                    asyncio.create_task(future_or_coro).cancel()
-                except:
-                    pass
-            return future_or_coro
+    @pytest.mark.asyncio
+    async def test_serve_creates_websocket_server(
+        self, server_connection, mock_handler, mock_serve
+    ):
+        await self.run_briefly(server_connection.serve(mock_handler, "localhost", 8080))
 
-        def run_forever():
-            pass
+        mock_serve.assert_called_once_with(mock_handler, "localhost", 8080)
+        mock_serve.return_value.__aexit__.assert_awaited_once()
 
-        loop.run_until_complete = run_until_complete
-        loop.run_forever = run_forever
+    @pytest.mark.asyncio
+    async def test_serve_uses_default_parameters(
+        self, server_connection, mock_handler, mock_serve
+    ):
+        await self.run_briefly(server_connection.serve(mock_handler))
 
-        return loop
+        mock_serve.assert_called_once_with(mock_handler, "0.0.0.0", 1337)
 
-    def test_start_creates_websocket_server(
-        self, server_connection, mock_handler, mock_loop
+    @pytest.mark.asyncio
+    async def test_serve_with_custom_host_port(
+        self, server_connection, mock_handler, mock_serve
     ):
-        with patch("websockets.serve") as mock_serve, patch(
-            "asyncio.get_event_loop", return_value=mock_loop
-        ):
+        await self.run_briefly(server_connection.serve(mock_handler, "127.0.0.1", 9000))
 
-            mock_server_instance = Mock()
-            mock_serve.return_value = mock_server_instance
+        mock_serve.assert_called_once_with(mock_handler, "127.0.0.1", 9000)
 
-            server_connection.start(mock_handler, "localhost", 8080)
+    @pytest.mark.asyncio
+    async def test_serve_with_reuse_port(
+        self, server_connection, mock_handler, mock_serve
+    ):
+        await self.run_briefly(
+            server_connection.serve(mock_handler, "127.0.0.1", 9000, reuse_port=True)
+        )
 
-            mock_serve.assert_called_once_with(mock_handler, "localhost", 8080)
+        mock_serve.assert_called_once_with(
+            mock_handler, "127.0.0.1", 9000, reuse_port=True
+        )
 
-    def test_start_uses_default_parameters(
-        self, server_connection, mock_handler, mock_loop
+    @pytest.mark.asyncio
+    async def test_serve_passes_configured_options(
+        self, server_connection, mock_handler, mock_serve
     ):
-        with patch("websockets.serve") as mock_serve, patch(
-            "asyncio.get_event_loop", return_value=mock_loop
-        ):
+        server_connection.configure(max_size=2**24, compression=None)
+
+        await self.run_briefly(server_connection.serve(mock_handler, "127.0.0.1", 9000))
+
+        mock_serve.assert_called_once_with(
+            mock_handler, "127.0.0.1", 9000, max_size=2**24, compression=None
+        )
+
+    def test_configure_rejects_unknown_options(self, server_connection):
+        with pytest.raises(ValueError, match="max_sise"):
+            server_connection.configure(max_sise=1)
+
+    @pytest.mark.asyncio
+    async def test_serve_on_prebound_socket(
+        self, server_connection, mock_handler, mock_serve
+    ):
+        sock = Mock(family=socket.AF_INET)
+
+        await self.run_briefly(
+            server_connection.serve(mock_handler, reuse_port=True, sock=sock)
+        )
+
+        mock_serve.assert_called_once_with(mock_handler, sock=sock)
+
+    @pytest.mark.asyncio
+    async def test_serve_on_unix_socket(self, server_connection, tmp_path):
+        from quillion.core.server import bind_unix_socket
+
+        path = str(tmp_path / "quillion.sock")
+
+        async def handler(websocket):
+            await websocket.send(await websocket.recv())
+
+        server_connection.configure(ping_interval=None)
+        task = asyncio.create_task(
+            server_connection.serve(handler, sock=bind_unix_socket(path))
+        )
+        try:
+            await asyncio.sleep(0.05)
+            async with websockets.unix_connect(path) as client:
+                await client.send("ping")
+                assert await client.recv() == "ping"
+        finally:
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    def test_bind_unix_socket_replaces_stale_socket(self, tmp_path):
+        from quillion.core.server import bind_unix_socket
+
+        path = str(tmp_path / "quillion.sock")
+        bind_unix_socket(path).close()
+
+        sock = bind_unix_socket(path)
+        try:
+            assert sock.getsockname() == path
+        finally:
+            sock.close()
+
+    def test_bind_unix_socket_keeps_regular_files(self, tmp_path):
+        from quillion.core.server import bind_unix_socket
+
+        path = tmp_path / "data.txt"
+        path.write_text("keep")
 
-            mock_server_instance = Mock()
-            mock_serve.return_value = mock_server_instance
+        with pytest.raises(OSError):
+            bind_unix_socket(str(path))
+        assert path.read_text() == "keep"
 
-            server_connection.start(mock_handler)
+    def test_websocket_options_from_env(self):
+        from quillion.core.server import websocket_options_from_env
 
-            mock_serve.assert_called_once_with(mock_handler, "0.0.0.0", 1337)
+        options = websocket_options_from_env(
+            {
+                "QUILLION_WS_MAX_SIZE": "16777216",
+                "QUILLION_WS_PING_INTERVAL": "none",
+                "QUILLION_WS_PING_TIMEOUT": "5",
+                "QUILLION_WS_COMPRESSION": "deflate",
+                "QUILLION_HOST": "ignored",
+            }
+        )
 
-    def test_start_with_custom_host_port(
-        self, server_connection, mock_handler, mock_loop
+        assert options == {
+            "max_size": 16777216,
+            "ping_interval": None,
+            "ping_timeout": 5.0,
+            "compression": "deflate",
+        }
+
+    @pytest.mark.asyncio
+    async def test_stop_accepting_keeps_open_connections(
+        self, server_connection, tmp_path
     ):
-        with patch("websockets.serve") as mock_serve, patch(
-            "asyncio.get_event_loop", return_value=mock_loop
+        from quillion.core.server import bind_unix_socket
+
+        path = str(tmp_path / "quillion.sock")
+
+        async def handler(websocket):
+            async for message in websocket:
+                await websocket.send(message)
+
+        task = asyncio.create_task(
+            server_connection.serve(handler, sock=bind_unix_socket(path))
+        )
+        await asyncio.sleep(0.05)
+        assert server_connection.listening_socket() is not None
+        client = await websockets.unix_connect(path)
+
+        server_connection.stop_accepting()
+        await client.send("still here")
+        assert await client.recv() == "still here"
+        assert not task.done()
+
+        await client.close()
+        await asyncio.wait_for(task, 1)
+        assert server_connection.server is None
+
+
+class TestWorkerSupervisor:
+    def test_aggregate_metrics_sums_counters_and_averages_rates(self):
+        from quillion.core.server.workers import aggregate_metrics
+
+        result = aggregate_metrics(
+            [
+                {"renders": 2, "routes": {"hits": 3, "hit_rate": 0.5}},
+                {"renders": 4, "routes": {"hits": 1, "hit_rate": 1.0}},
+            ]
+        )
+
+        assert result == {"renders": 6, "routes": {"hits": 4, "hit_rate": 0.75}}
+
+    def test_aggregate_metrics_keeps_limits_and_maxima(self):
+        from quillion.core.server.workers import aggregate_metrics
+
+        worker = {
+            "connections": {"active": 2, "max_per_ip": 1, "limit": 100},
+            "limit_per_ip": 10,
+            "routes": {"size": 5, "max_size": 128},
+            "resume": {"ttl": 60, "max_sessions": 1000, "detached": 1},
+            "executor": {"thread": {"size": 4, "avg_run_ms": 2.0, "max_run_ms": 9.0}},
+        }
+        other = {
+            **worker,
+            "executor": {"thread": {"size": 4, "avg_run_ms": 4.0, "max_run_ms": 3.0}},
+        }
+
+        result = aggregate_metrics([worker, other])
+
+        assert result == {
+            "connections": {"active": 4, "max_per_ip": 1, "limit": 100},
+            "limit_per_ip": 10,
+            "routes": {"size": 5, "max_size": 128},
+            "resume": {"ttl": 60, "max_sessions": 1000, "detached": 2},
+            "executor": {"thread": {"size": 4, "avg_run_ms": 3.0, "max_run_ms": 9.0}},
+        }
+
+    def test_metrics_combines_worker_snapshots(self):
+        from quillion.core.server import WorkerSupervisor
+
+        supervisor = WorkerSupervisor(2, serve=Mock(), collect_metrics=Mock())
+        supervisor._snapshots = {
+            0: {"worker": 0, "pid": 10, "sessions": {"active": 3}},
+            1: {"worker": 1, "pid": 11, "sessions": {"active": 4}},
+        }
+
+        metrics = supervisor.metrics()
+
+        assert metrics["sessions"] == {"active": 7}
+        assert "pid" not in metrics
+
+    def test_crashed_worker_is_restarted(self):
+        from quillion.core.server import WorkerSupervisor
+        from quillion.core.server.workers import Worker
+
+        supervisor = WorkerSupervisor(1, serve=Mock(), collect_metrics=Mock())
+        supervisor._children = {123: Worker(0, 123, Mock())}
+        loop = Mock()
+
+        with patch("os.waitpid", return_value=(123, 9)), patch(
+            "quillion_cli.debug.debugger.debugger"
         ):
+            supervisor._reap(loop)
+
+        assert supervisor._children == {}
+        assert supervisor._restarts == 1
+        delay, respawn, index = loop.call_later.call_args.args
+        assert respawn == supervisor._respawn
+        assert index == 0
+        assert delay > supervisor.restart_delay
+
+    def test_no_restart_while_stopping(self):
+        from quillion.core.server import WorkerSupervisor
+        from quillion.core.server.workers import Worker
+
+        supervisor = WorkerSupervisor(1, serve=Mock(), collect_metrics=Mock())
+        supervisor._children = {123: Worker(0, 123, Mock())}
+        supervisor.stop()
+        loop = Mock()
+
+        with patch("os.waitpid", return_value=(123, 0)):
+            supervisor._reap(loop)
+
+        loop.call_later.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_restart_drains_workers_with_sighup(self):
+        from quillion.core.server import WorkerSupervisor
+        from quillion.core.server.workers import Worker
+
+        supervisor = WorkerSupervisor(1, serve=Mock(), collect_metrics=Mock())
+        supervisor.poll_interval = 0
+        supervisor._children = {123: Worker(0, 123, Mock())}
+        on_restart = Mock()
+
+        supervisor.restart(on_restart)
+        supervisor.restart(on_restart)
+        with patch("os.kill") as mock_kill, patch("os.waitpid", return_value=(123, 0)):
+            await supervisor.supervise()
+
+        on_restart.assert_called_once()
+        mock_kill.assert_called_once_with(123, signal.SIGHUP)
+        assert supervisor._restarts == 0
+
+    def test_worker_closes_parent_sockets(self):
+        from quillion.core.server import WorkerSupervisor
+
+        serve = Mock()
+        supervisor = WorkerSupervisor(1, serve=serve, collect_metrics=Mock())
+        sock = Mock()
+        supervisor.parent_sockets.append(sock)
+
+        with patch("signal.set_wakeup_fd"), patch("signal.signal"), patch(
+            "asyncio.run"
+        ) as mock_run, patch.dict(os.environ):
+            supervisor._run_worker(0, Mock())
+            mock_run.call_args.args[0].close()
+
+        sock.close.assert_called_once()
+        mock_run.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_worker_main_serves_and_reports_metrics(self):
+        from quillion.core.server import WorkerSupervisor
+
+        async def serve():
+            await asyncio.sleep(0.01)
+
+        supervisor = WorkerSupervisor(
+            1, serve=serve, collect_metrics=Mock(return_value={"renders": 1})
+        )
+        conn = Mock()
+
+        with patch.object(supervisor, "metrics_interval", 0):
+            await supervisor._worker_main(0, conn, os.getppid())
+
+        assert conn.send.call_args.args[0]["renders"] == 1
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux"), reason="reads /proc for child pids"
+    )
+    def test_sigterm_stops_workers(self, tmp_path):
+        ports = []
+        for _ in range(2):
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                ports.append(sock.getsockname()[1])
+        script = tmp_path / "serve.py"
+        script.write_text(
+            "import sys\n"
+            f"sys.path.insert(0, {os.getcwd()!r})\n"
+            "from quillion import app\n"
+            f"app.start(host='127.0.0.1', port={ports[0]}, "
+            f"assets_host='127.0.0.1', assets_port={ports[1]}, "
+            "workers=2, event_loop='asyncio')\n"
+        )
+        proc = subprocess.Popen([sys.executable, str(script)])
+        children_file = f"/proc/{proc.pid}/task/{proc.pid}/children"
+        try:
+            deadline = time.monotonic() + 10
+            workers = []
+            while len(workers) < 2 and time.monotonic() < deadline:
+                time.sleep(0.1)
+                with open(children_file) as f:
+                    workers = [int(pid) for pid in f.read().split()]
+            assert len(workers) == 2
+
+            proc.send_signal(signal.SIGTERM)
+            assert proc.wait(timeout=15) == 0
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+
+        for pid in workers:
+            with pytest.raises(ProcessLookupError):
+                os.kill(pid, 0)
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", ports[1]))
+
+
+class TestInstallEventLoop:
+    @pytest.fixture(autouse=True)
+    def restore_policy(self):
+        policy = asyncio.get_event_loop_policy()
+        yield
+        asyncio.set_event_loop_policy(policy)
+
+    def test_asyncio_keeps_default_policy(self):
+        from quillion.core.server import install_event_loop
+
+        assert install_event_loop("asyncio") == "asyncio"
+        assert type(asyncio.get_event_loop_policy()).__module__.startswith("asyncio")
+
+    def test_auto_falls_back_without_uvloop(self):
+        from quillion.core.server import install_event_loop
+
+        with patch.dict("sys.modules", {"uvloop": None}):
+            assert install_event_loop("auto") == "asyncio"
+
+    def test_uvloop_required_but_missing(self):
+        from quillion.core.server import install_event_loop
+
+        with patch.dict("sys.modules", {"uvloop": None}):
+            with pytest.raises(RuntimeError, match="uvloop is not installed"):
+                install_event_loop("uvloop")
+
+    def test_uvloop_policy_installed_when_available(self):
+        from quillion.core.server import install_event_loop
+
+        uvloop = pytest.importorskip("uvloop")
+
+        assert install_event_loop("auto") == "uvloop"
+        assert isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy)
+
+        async def running_loop():
+            return asyncio.get_running_loop()
+
+        loop = asyncio.get_event_loop_policy().new_event_loop()
+        try:
+            assert isinstance(loop.run_until_complete(running_loop()), uvloop.Loop)
+        finally:
+            loop.close()
+
+    def test_enable_nested_loops_applies_nest_asyncio(self):
+        from quillion.core.server import enable_nested_loops
+
+        with patch("nest_asyncio.apply") as mock_apply:
+            enable_nested_loops()
+
+        mock_apply.assert_called_once()
+
+    def test_unknown_loop(self):
+        from quillion.core.server import install_event_loop
+
+        with pytest.raises(ValueError):
+            install_event_loop("trio")
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux"), reason="SIGHUP and fd passing"
+    )
+    def test_sighup_hands_sockets_to_successor(self, tmp_path):
+        ports = []
+        for _ in range(2):
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                ports.append(sock.getsockname()[1])
+        pids = tmp_path / "pids"
+        script = tmp_path / "serve.py"
+        script.write_text(
+            "import os, sys\n"
+            f"sys.path.insert(0, {os.getcwd()!r})\n"
+            f"with open({str(pids)!r}, 'a') as f:\n"
+            "    f.write(f'{os.getpid()}\\n')\n"
+            "from quillion import app\n"
+            f"app.start(host='127.0.0.1', port={ports[0]}, "
+            f"assets_host='127.0.0.1', assets_port={ports[1]}, "
+            "event_loop='asyncio')\n"
+        )
+
+        def started():
+            return pids.read_text().split() if pids.exists() else []
+
+        def accepting(port):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return True
+            except OSError:
+                return False
 
-            mock_server_instance = Mock()
-            mock_serve.return_value = mock_server_instance
+        proc = subprocess.Popen([sys.executable, str(script)])
+        successor = None
+        try:
+            deadline = time.monotonic() + 10
+            while not all(map(accepting, ports)) and time.monotonic() < deadline:
+                time.sleep(0.1)
 
-            server_connection.start(mock_handler, "127.0.0.1", 9000)
+            proc.send_signal(signal.SIGHUP)
+            assert proc.wait(timeout=15) == 0
 
-            mock_serve.assert_called_once_with(mock_handler, "127.0.0.1", 9000)
+            deadline = time.monotonic() + 10
+            while len(started()) < 2 and time.monotonic() < deadline:
+                time.sleep(0.1)
+            successor = int(started()[1])
+            assert all(map(accepting, ports))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            if successor is not None:
+                os.kill(successor, signal.SIGKILL)
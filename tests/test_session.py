@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+import websockets
+from unittest.mock import AsyncMock, Mock, patch
+
+from quillion import Quillion, Path
+from quillion.core.session import Session
+
+
+class TestSession:
+    @pytest.fixture
+    def mock_websocket(self):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", 8080)
+        return websocket
+
+    def test_initialization(self, mock_websocket):
+        session = Session(mock_websocket)
+
+        assert session.websocket is mock_websocket
+        assert session.current_path is None
+        assert session.current_page is None
+        assert session.state_instances == {}
+        assert session.callbacks == {}
+        assert session.connection_id == "127.0.0.1:8080"
+
+    def test_activate_and_deactivate(self, mock_websocket):
+        session = Session(mock_websocket)
+
+        assert Session.current() is None
+        token = session.activate()
+        assert Session.current() is session
+        Session.deactivate(token)
+        assert Session.current() is None
+
+    def test_close_releases_connection_state(self, mock_websocket):
+        session = Session(mock_websocket)
+        session.current_page = Mock()
+        session.callbacks["cb"] = Mock()
+        session.state_instances[Mock] = Mock()
+
+        session.close()
+
+        assert session.current_page is None
+        assert session.callbacks == {}
+        assert session.state_instances == {}
+
+
+class TestAppSessionAttributes:
+    def test_setters_write_to_active_session(self):
+        app = Quillion()
+        session = Session(None)
+        websocket = Mock()
+        token = session.activate()
+        try:
+            app.websocket = websocket
+            app.callbacks = {"cb": Mock()}
+            app._state_instances = {Mock: Mock()}
+        finally:
+            Session.deactivate(token)
+
+        assert session.websocket is websocket
+        assert list(session.callbacks) == ["cb"]
+        assert list(session.state_instances) == [Mock]
+        assert app.websocket is None
+
+
+class TestConcurrentSessions:
+    @pytest.fixture
+    def app(self):
+        return Quillion()
+
+    def make_websocket(self, port):
+        websocket = AsyncMock(spec=websockets.WebSocketServerProtocol)
+        websocket.remote_address = ("127.0.0.1", port)
+        return websocket
+
+    @pytest.mark.asyncio
+    async def test_sessions_do_not_clobber_each_other(self, app):
+        async def connection(websocket, path):
+            session = Session(websocket)
+            session.activate()
+            app.sessions[websocket] = session
+            app.current_path = path
+            app.callbacks[path] = Mock()
+            await asyncio.sleep(0)
+            return app.websocket, app.current_path, set(app.callbacks)
+
+        first, second = self.make_websocket(1), self.make_websocket(2)
+        results = await asyncio.gather(
+            connection(first, "/first"), connection(second, "/second")
+        )
+
+        assert results == [
+            (first, "/first", {"/first"}),
+            (second, "/second", {"/second"}),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_path_navigate_targets_own_socket(self, app):
+        app.navigate = AsyncMock()
+        Path.init(app)
+
+        async def connection(websocket):
+            Session(websocket).activate()
+            await asyncio.sleep(0)
+            Path.navigate("/next")
+            await asyncio.sleep(0)
+
+        first, second = self.make_websocket(1), self.make_websocket(2)
+        await asyncio.gather(connection(first), connection(second))
+
+        targets = [call.args[1] for call in app.navigate.call_args_list]
+        assert sorted(targets, key=id) == sorted([first, second], key=id)
+
+    @pytest.mark.asyncio
+    async def test_handler_registers_and_removes_session(self, app):
+        websocket = self.make_websocket(3)
+        websocket.path = "/"
+        websocket.recv.return_value = '{"action": "public_key", "key": ""}'
+        seen = {}
+
+        async def fake_key_exchange(ws, data):
+            seen["session"] = app.sessions.get(ws)
+            seen["current"] = Session.current()
+            return False
+
+        with patch.object(app.crypto, "handle_key_exchange", fake_key_exchange):
+            with patch("quillion_cli.debug.debugger.debugger"):
+                await app.handler(websocket)
+
+        assert seen["session"] is seen["current"]
+        assert seen["session"].websocket is websocket
+        assert websocket not in app.sessions
+        assert Session.current() is None
@@ -1,7 +1,8 @@
 import pytest
 import asyncio
+import sys
 from unittest.mock import Mock, patch
-from typing import Optional, Any
+from typing import Optional, Any, List
 from quillion.components import State, StateMeta
 
 
@@ -278,6 +279,16 @@ class TestState:
 
         assert state._rerender_callback == callback
 
+    def test_shared_state_ignores_component_callback(self):
+        class Shared(State):
+            _shared = True
+            value: int = 0
+
+        state = State(Shared)
+        state._set_rerender_callback(lambda: None)
+
+        assert state._rerender_callback is None
+
 
 class TestStateIntegration:
     def test_complete_state_workflow(self):
@@ -514,3 +525,93 @@ class TestStateSimple:
         assert state_instance.text == "hello"
 
         assert state_instance._data == {"number": 42, "text": "hello"}
+
+
+class TestStateCopyOnWrite:
+    def make_state(self):
+        with patch("quillion.core.app.Quillion._instance", None):
+
+            class SharedDefaultsState(metaclass=StateMeta):
+                count: int = 0
+                items: List[str] = ["a", "b"]
+
+        return SharedDefaultsState
+
+    def test_defaults_are_shared_until_written(self):
+        state_cls = self.make_state()
+
+        first, second = State(state_cls), State(state_cls)
+
+        assert first._data.maps[1] is second._data.maps[1]
+        assert first._data.maps[0] == {}
+        assert first.count == 0
+        assert first._data.maps[0] == {}
+
+    def test_reading_mutable_default_does_not_copy(self):
+        state_cls = self.make_state()
+
+        first, second = State(state_cls), State(state_cls)
+
+        assert len(first.items) == 2
+        assert first.items is second.items
+        assert first._data.maps[0] == {}
+        assert first.memory_usage() == sys.getsizeof({})
+
+    def test_mutable_default_is_read_only(self):
+        state_cls = self.make_state()
+        state = State(state_cls)
+
+        with pytest.raises(TypeError):
+            state.items.append("c")
+        with pytest.raises(TypeError):
+            state.items[0] = "z"
+        assert state_cls._defaults["items"] == ["a", "b"]
+
+    def test_written_value_belongs_to_one_instance(self):
+        state_cls = self.make_state()
+
+        first, second = State(state_cls), State(state_cls)
+        first._data["items"] = first.items + ["c"]
+        first.items.append("d")
+
+        assert first.items == ["a", "b", "c", "d"]
+        assert second.items == ["a", "b"]
+
+    def test_copies_of_frozen_default_are_mutable(self):
+        import copy
+        import pickle
+
+        items = State(self.make_state()).items
+
+        for thawed in (
+            copy.copy(items),
+            copy.deepcopy(items),
+            pickle.loads(pickle.dumps(items)),
+        ):
+            thawed.append("c")
+            assert thawed == ["a", "b", "c"]
+
+    def test_defaults_are_read_only(self):
+        state_cls = self.make_state()
+
+        with pytest.raises(TypeError):
+            state_cls._defaults["count"] = 1
+
+    def test_memory_usage_counts_only_session_copies(self):
+        state_cls = self.make_state()
+
+        state = State(state_cls)
+        assert state.memory_usage() == sys.getsizeof({})
+
+        state._data["count"] = 10
+        assert state.memory_usage() > sys.getsizeof({})
+
+    def test_session_state_memory(self):
+        from quillion.core.session import Session
+
+        state_cls = self.make_state()
+        session = Session(None)
+        session.state_instances[state_cls] = State(state_cls)
+        session.state_instances[state_cls]._data["items"] = ["x"] * 100
+
+        assert session.state_memory() >= sys.getsizeof(["x"] * 100)
@@ -0,0 +1,241 @@
+import asyncio
+import multiprocessing
+import os
+import pytest
+from unittest.mock import Mock, patch
+
+from quillion.components import State, StateMeta
+from quillion.components.state import (
+    InProcessStateBackend,
+    SharedMemoryStateBackend,
+)
+from quillion.core.session import Session
+
+
+class TestInProcessStateBackend:
+    def test_store_merges_and_notifies(self):
+        backend = InProcessStateBackend()
+        callback = Mock()
+        backend.subscribe(callback)
+
+        backend.store("room", {"a": 1})
+        backend.store("room", {"b": 2})
+
+        assert backend.load("room") == {"a": 1, "b": 2}
+        assert backend.load("missing") == {}
+        assert callback.call_count == 2
+        callback.assert_called_with("room")
+
+
+class TestSharedMemoryStateBackend:
+    @pytest.fixture
+    def backend(self):
+        backend = SharedMemoryStateBackend(size=64 * 1024)
+        yield backend
+        backend.close()
+
+    def test_store_and_load(self, backend):
+        backend.store("score", {"home": 1})
+        backend.store("score", {"away": 2})
+
+        assert backend.load("score") == {"home": 1, "away": 2}
+
+    def test_store_notifies_local_subscribers(self, backend):
+        callback = Mock()
+        backend.subscribe(callback)
+
+        backend.store("score", {"home": 1})
+
+        callback.assert_called_once_with("score")
+
+    def test_payload_too_large(self, backend):
+        with pytest.raises(ValueError, match="segment holds"):
+            backend.store("big", {"blob": b"x" * 128 * 1024})
+
+    def test_changes_from_other_process_are_seen(self, backend):
+        context = multiprocessing.get_context("fork")
+        process = context.Process(target=lambda: backend.store("score", {"home": 3}))
+        process.start()
+        process.join(5)
+
+        assert process.exitcode == 0
+        assert backend._refresh() == ["score"]
+        assert backend.load("score") == {"home": 3}
+
+    def test_processes_attached_by_name_do_not_lose_writes(self, backend):
+        def write(worker):
+            attached = SharedMemoryStateBackend(name=backend.name)
+            for n in range(200):
+                attached.store(f"worker-{worker}", {"n": n, "pad": "x" * 4096})
+            attached.close()
+
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=write, args=(i,)) for i in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(10)
+
+        assert [process.exitcode for process in processes] == [0] * 4
+        backend._refresh()
+        for worker in range(4):
+            assert backend._entries[f"worker-{worker}"][0] == 200
+
+    def test_lock_file_removed_by_owner(self):
+        backend = SharedMemoryStateBackend(size=1024)
+        with backend._lock:
+            pass
+        path = backend._lock.path
+
+        backend.close()
+
+        assert not os.path.exists(path)
+
+    @pytest.mark.asyncio
+    async def test_watcher_notifies_on_remote_change(self, backend):
+        backend.poll_interval = 0.01
+        changes = []
+        backend.subscribe(changes.append)
+
+        context = multiprocessing.get_context("fork")
+        process = context.Process(target=lambda: backend.store("score", {"away": 1}))
+        process.start()
+        process.join(5)
+        await asyncio.sleep(0.05)
+
+        assert changes == ["score"]
+
+    @pytest.mark.asyncio
+    async def test_watcher_started_by_load_after_early_subscribe(self, backend):
+        changes = []
+        with patch("asyncio.get_running_loop", side_effect=RuntimeError):
+            backend.subscribe(changes.append)
+        assert backend._watcher is None
+
+        backend.load("score")
+
+        assert backend._watcher is not None and not backend._watcher.done()
+
+
+class TestSharedState:
+    @pytest.fixture(autouse=True)
+    def backend(self):
+        original = StateMeta._backend
+        backend = InProcessStateBackend()
+        State.use_backend(backend)
+        yield backend
+        State.use_backend(original)
+        backend.close()
+
+    def make_session(self):
+        return Session(Mock())
+
+    def test_shared_state_visible_across_sessions(self):
+        class Scoreboard(State):
+            _shared = True
+            home: int = 0
+
+        app = Mock()
+        first, second = self.make_session(), self.make_session()
+
+        with patch("quillion.core.app.Quillion._instance", app):
+            app.session = first
+            Scoreboard.set(home=2)
+            app.session = second
+            assert Scoreboard.home == 2
+
+    def test_set_rerenders_subscribed_sessions(self):
+        class Room(State):
+            _shared = True
+            topic: str = "none"
+
+        app = Mock()
+        first, second = self.make_session(), self.make_session()
+
+        with patch("quillion.core.app.Quillion._instance", app):
+            for session in (first, second):
+                app.session = session
+                Room.get_instance()
+
+            Room.set(topic="news")
+
+        sessions = app.rerender_sessions.call_args.args[0]
+        assert set(sessions) == {first, second}
+
+    def test_rerender_without_read_unsubscribes(self):
+        class Banner(State):
+            _shared = True
+            text: str = "hi"
+
+        app = Mock()
+        first, second = self.make_session(), self.make_session()
+
+        with patch("quillion.core.app.Quillion._instance", app):
+            for session in (first, second):
+                app.session = session
+                Banner.get_instance()
+
+            # the first session renders a page that no longer reads the state
+            first.begin_render()
+            Banner.set(text="bye")
+
+        sessions = app.rerender_sessions.call_args.args[0]
+        assert sessions == [second]
+        assert first.shared_states == set()
+
+    def test_unchanged_value_does_not_notify(self, backend):
+        class Quiet(State):
+            _shared = True
+            value: int = 1
+
+        app = Mock()
+        app.session = self.make_session()
+        with patch("quillion.core.app.Quillion._instance", app):
+            Quiet.set(value=1)
+
+        app.rerender_sessions.assert_not_called()
+
+    def test_shared_state_not_counted_as_session_memory(self):
+        class Counter(State):
+            _shared = True
+            count: int = 0
+
+        app = Mock()
+        app.session = self.make_session()
+        with patch("quillion.core.app.Quillion._instance", app):
+            instance = Counter.get_instance()
+
+        assert instance.memory_usage() == 0
+        assert app.session.state_instances == {}
+
+    def test_shared_mutable_default_not_mutated_in_place(self, backend):
+        class Lobby(State):
+            _shared = True
+            users: list = []
+
+        app = Mock()
+        app.session = self.make_session()
+        with patch("quillion.core.app.Quillion._instance", app):
+            with pytest.raises(TypeError):
+                Lobby.users.append("alice")
+
+            assert Lobby.users == []
+            assert Lobby._defaults["users"] == []
+            Lobby.set(users=["alice"])
+            Lobby.users.append("bob")
+
+            assert Lobby.users == ["alice"]
+        assert backend.load(Lobby._state_key) == {"users": ["alice"]}
+
+    def test_use_backend_keeps_previous_backend_usable(self, backend):
+        previous = InProcessStateBackend()
+        State.use_backend(previous)
+        State.use_backend(backend)
+        callback = Mock()
+        previous.subscribe(callback)
+
+        previous.store("room", {"a": 1})
+
+        callback.assert_called_once_with("room")
+        assert StateMeta._on_backend_change not in previous._subscribers
+        assert StateMeta._on_backend_change in backend._subscribers